@@ -0,0 +1,180 @@
+"""
+Batch analysis of positions read from an EPD or FEN file, one position per line.
+
+Positions are streamed and searched in a pool of worker processes. Results are written as JSON lines,
+in input order, and flushed one by one: the output file doubles as a checkpoint, so running the same
+command again after an interruption skips the positions which already have a result.
+
+    python batch.py positions.epd -o results.jsonl -d 4 -w 8
+    cat positions.fen | python batch.py - -o results.jsonl --movetime 1000
+"""
+
+import argparse
+import chess
+import json
+import os
+import sys
+import search
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Deque, Dict, Iterable, Iterator, Optional, Tuple, TextIO
+from config import DEFAULT_DEPTH, MAX_DEPTH
+from time_manager import SearchLimits
+
+
+def read_positions(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Yield the position lines of an EPD/FEN stream, skipping blank lines and # comments.
+    """
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def parse_position(line: str) -> Tuple[chess.Board, Dict[str, Any]]:
+    """
+    Parse a FEN (six fields) or EPD (four fields followed by operations) line.
+
+    Returns:
+        Tuple[chess.Board, Dict[str, Any]]: the position and its EPD operations (empty for a FEN)
+    """
+    fields = line.split()
+    if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+        return chess.Board(" ".join(fields[:6])), {}
+    return chess.Board.from_epd(line)
+
+
+def analyse_position(
+    index: int, line: str, depth: int, movetime: Optional[int], options: search.SearchOptions
+) -> Dict[str, Any]:
+    """
+    Search a single position. Runs in a worker process, which starts from an empty
+    transposition table and history for every position so results do not depend on scheduling.
+    """
+    record: Dict[str, Any] = {"index": index, "position": line}
+    try:
+        board, operations = parse_position(line)
+    except ValueError as error:
+        record["error"] = str(error)
+        return record
+    if "id" in operations:
+        record["id"] = operations["id"]
+    if board.is_game_over():
+        record["error"] = f"game over: {board.result()}"
+        return record
+
+    search.options = options
+    search.transposition_table.clear()
+    search.history.clear()
+    result = search.iterative_deepening(board, depth, SearchLimits(movetime=movetime))
+    record.update(
+        bestmove=result.move.uci(),
+        score=result.score,
+        depth=result.depth,
+        nodes=result.nodes,
+        time=round(result.time, 4),
+    )
+    return record
+
+
+def count_checkpointed(output_path: str) -> int:
+    """
+    Number of complete results in an existing output file. A partially written last line,
+    left by an interrupted run, is truncated away.
+    """
+    if not os.path.exists(output_path):
+        return 0
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            f.truncate(complete)
+    return data[:complete].count(b"\n")
+
+
+def run_batch(
+    lines: Iterable[str],
+    output: TextIO,
+    depth: int = DEFAULT_DEPTH,
+    movetime: Optional[int] = None,
+    workers: int = 1,
+    skip: int = 0,
+    max_pending: Optional[int] = None,
+) -> int:
+    """
+    Analyse the positions in lines and write one JSON result per position to output, in input order.
+
+    At most max_pending positions (by default 4 per worker) are in flight at any time,
+    so memory use does not depend on the size of the input.
+
+    Parameters:
+        skip (int): number of positions at the start of the input which already have a result
+
+    Returns:
+        int: number of positions analysed
+    """
+    max_pending = max_pending or 4 * workers
+    pending: Deque[Future] = deque()
+    analysed = 0
+
+    def write_next() -> None:
+        output.write(json.dumps(pending.popleft().result()) + "\n")
+        output.flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for index, line in enumerate(read_positions(lines)):
+            if index < skip:
+                continue
+            if len(pending) >= max_pending:
+                write_next()
+            pending.append(
+                pool.submit(analyse_position, index, line, depth, movetime, search.options)
+            )
+            analysed += 1
+        while pending:
+            write_next()
+    return analysed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Analyse the positions of an EPD or FEN file")
+    parser.add_argument("input", help="EPD/FEN file, one position per line, or - for stdin")
+    parser.add_argument(
+        "-o", "--output", default="-", help="JSON lines output file (default stdout)"
+    )
+    parser.add_argument("-d", "--depth", type=int, help="search depth")
+    parser.add_argument("--movetime", type=int, help="time per position in milliseconds")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes"
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore existing results in the output file"
+    )
+    args = parser.parse_args()
+    depth = args.depth or (MAX_DEPTH if args.movetime else DEFAULT_DEPTH)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    skip = 0
+    if args.output == "-":
+        output = sys.stdout
+    else:
+        if args.restart and os.path.exists(args.output):
+            os.remove(args.output)
+        skip = count_checkpointed(args.output)
+        if skip:
+            print(f"resuming after {skip} analysed positions", file=sys.stderr)
+        output = open(args.output, "a")
+
+    try:
+        analysed = run_batch(input_file, output, depth, args.movetime, args.workers, skip)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+    print(f"analysed {analysed} positions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Search benchmark: searches a fixed set of reference positions to a fixed depth from a clean state.
+
+The total node count is deterministic for a given version of the engine, so it serves as a
+signature: a change which is meant to be a pure speedup must not change it, and a change to the
+search or evaluation shows up as a different signature. Nodes per second measure the speed.
+
+    python bench.py -d 4 --json bench.json
+    python bench.py -d 4 --instrument --profile bench.pstats --collapsed bench.folded
+"""
+
+import argparse
+import chess
+import evaluation
+import json
+import search
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+from config import BENCH_DEPTH
+from profiling import Counters, instrument, profile_call
+from search import SearchResult
+
+# Reference positions: opening, middlegame, tactical and endgame positions,
+# including the standard perft test positions.
+BENCH_POSITIONS = [
+    chess.STARTING_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "2Q4r/4prk1/ppp2p1p/8/2qP1R2/2P5/P5PP/5RK1 w - - 4 33",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+    "8/8/4k3/3p4/3P4/4K3/8/8 w - - 0 1",
+    "8/5pk1/6p1/7p/P6P/6P1/5PK1/8 w - - 0 1",
+]
+
+
+@dataclass
+class PositionBench:
+    """
+    Benchmark result for one position
+    """
+
+    fen: str
+    bestmove: str
+    score: int
+    nodes: int
+    time: float
+    # seconds at which each depth was completed, and nodes searched by each iteration
+    time_to_depth: List[float] = field(default_factory=list)
+    nodes_per_depth: List[int] = field(default_factory=list)
+    qnodes: int = 0
+    # beta cutoffs by the index of the move causing them
+    cutoffs_by_move: List[int] = field(default_factory=list)
+
+
+@dataclass
+class BenchResult:
+    """
+    Benchmark result over all the reference positions
+    """
+
+    depth: int
+    positions: List[PositionBench]
+    # detailed counters over all positions, if the benchmark was instrumented
+    counters: Optional[Counters] = None
+
+    @property
+    def signature(self) -> int:
+        return self.total_nodes
+
+    @property
+    def total_nodes(self) -> int:
+        return sum(position.nodes for position in self.positions)
+
+    @property
+    def total_time(self) -> float:
+        return sum(position.time for position in self.positions)
+
+    @property
+    def nps(self) -> int:
+        return int(self.total_nodes / self.total_time) if self.total_time else 0
+
+    @property
+    def effective_branching_factor(self) -> float:
+        """
+        Ratio of the nodes searched by the last iteration to those of the one before, over all positions.
+        """
+        last = sum(p.nodes_per_depth[-1] for p in self.positions if len(p.nodes_per_depth) > 1)
+        previous = sum(p.nodes_per_depth[-2] for p in self.positions if len(p.nodes_per_depth) > 1)
+        return last / previous if previous else 0.0
+
+    @property
+    def cutoffs_by_move(self) -> List[int]:
+        return [sum(counts) for counts in zip(*(position.cutoffs_by_move for position in self.positions))]
+
+    def to_dict(self) -> dict:
+        return {
+            "depth": self.depth,
+            "signature": self.signature,
+            "total_nodes": self.total_nodes,
+            "total_time": round(self.total_time, 4),
+            "nps": self.nps,
+            "effective_branching_factor": round(self.effective_branching_factor, 3),
+            "cutoffs_by_move": self.cutoffs_by_move,
+            "counters": asdict(self.counters) if self.counters else None,
+            "positions": [asdict(position) for position in self.positions],
+        }
+
+
+def reset_search_state() -> None:
+    """
+    Clear everything the search remembers between calls, so each position is searched from scratch.
+    """
+    search.transposition_table.clear()
+    search.killers.clear()
+    search.history.clear()
+    evaluation.eval_hash_table.clear()
+
+
+def run_bench(depth: int = BENCH_DEPTH, fens: Optional[List[str]] = None, instrumented: bool = False) -> BenchResult:
+    """
+    Search every reference position to the given depth, single-threaded.
+    If instrumented, the detailed counters of profiling.instrument are collected too, at some cost in speed.
+    """
+    positions = []
+    with instrument() if instrumented else nullcontext() as counters:
+        for fen in fens or BENCH_POSITIONS:
+            positions.append(bench_position(fen, depth))
+    return BenchResult(depth, positions, counters)
+
+
+def bench_position(fen: str, depth: int) -> PositionBench:
+    """
+    Search one position to the given depth from a clean state.
+    """
+    board = chess.Board(fen)
+    reset_search_state()
+    iterations: List[SearchResult] = []
+    result = search.iterative_deepening(board, depth, on_iteration=iterations.append)
+    cumulative_nodes = [0] + [iteration.nodes for iteration in iterations]
+    return PositionBench(
+        fen=fen,
+        bestmove=result.move.uci(),
+        score=result.score,
+        nodes=result.nodes,
+        time=result.time,
+        time_to_depth=[round(iteration.time, 4) for iteration in iterations],
+        nodes_per_depth=[b - a for a, b in zip(cumulative_nodes, cumulative_nodes[1:])],
+        qnodes=search.stats.qnodes,
+        cutoffs_by_move=list(search.stats.cutoffs_by_move),
+    )
+
+
+def format_bench(result: BenchResult) -> str:
+    """
+    Human readable summary of a benchmark run.
+    """
+    lines = []
+    for i, position in enumerate(result.positions, 1):
+        lines.append(
+            f"position {i}/{len(result.positions)}: bestmove {position.bestmove} "
+            f"nodes {position.nodes} time {position.time:.2f}s"
+        )
+    lines += [
+        "===========================",
+        f"Depth: {result.depth}",
+        f"Total time (s): {result.total_time:.2f}",
+        f"Nodes searched: {result.total_nodes}",
+        f"Nodes/second: {result.nps}",
+        f"Effective branching factor: {result.effective_branching_factor:.2f}",
+        f"Signature: {result.signature}",
+    ]
+    if counters := result.counters:
+        lines += [
+            f"Quiescence nodes: {sum(position.qnodes for position in result.positions)}",
+            f"Cutoffs by move: {' '.join(str(count) for count in result.cutoffs_by_move)}",
+            f"Evaluations: {counters.evaluations}",
+            f"Move generations: {counters.move_generations}",
+            f"TT hits: {counters.tt_hits}/{counters.tt_probes} ({counters.tt_hit_rate:.1%})",
+        ]
+        lines += [f"Time in {phase} (s): {seconds:.2f}" for phase, seconds in counters.phase_times.items()]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the search benchmark")
+    parser.add_argument("-d", "--depth", type=int, default=BENCH_DEPTH)
+    parser.add_argument("--json", help="write the results as JSON to this file")
+    parser.add_argument(
+        "--instrument", action="store_true", help="count evaluations, move generation and TT probes, and time phases"
+    )
+    parser.add_argument("--profile", help="run under cProfile and write the statistics to this file")
+    parser.add_argument("--collapsed", help="sample the stack and write collapsed stacks for flame graphs to this file")
+    args = parser.parse_args()
+
+    result = profile_call(lambda: run_bench(args.depth, instrumented=args.instrument), args.profile, args.collapsed)
+    print(format_bench(result))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result.to_dict(), f, indent=2)
@@ -0,0 +1,61 @@
+"""
+Polyglot opening book: http://hgm.nubati.net/book_format.html
+
+The book file is memory-mapped rather than read into memory, and the entries of a position are
+found by binary search on its Zobrist key (chess.polyglot.MemoryMappedReader), so opening a book
+is instant whatever its size, and probing costs a few page reads.
+"""
+
+import chess
+import chess.polyglot
+import random
+from enum import Enum
+from typing import Optional
+from config import BOOK_MAX_PLY
+
+
+class BookSelection(Enum):
+    """
+    How a move is chosen among the book moves of a position
+    """
+
+    BEST = "best"  # always the move with the highest weight
+    WEIGHTED = "weighted"  # at random, in proportion to the weights
+
+
+class OpeningBook:
+    """
+    A Polyglot opening book file, probed for moves up to max_ply plies into the game.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        selection: BookSelection = BookSelection.WEIGHTED,
+        max_ply: int = BOOK_MAX_PLY,
+        seed: Optional[int] = None,
+    ):
+        self.path = path
+        self.selection = selection
+        self.max_ply = max_ply
+        self.random = random.Random(seed)
+        self.reader = chess.polyglot.open_reader(path)
+
+    def probe(self, board: chess.Board) -> Optional[chess.Move]:
+        """
+        Book move for the position, or None if it is not in the book or too deep into the game.
+        Moves with a weight of 0 are never played.
+        """
+        # plies since the start of the game, also for positions set up from a FEN
+        ply = 2 * (board.fullmove_number - 1) + (board.turn == chess.BLACK)
+        if ply >= self.max_ply:
+            return None
+        try:
+            if self.selection == BookSelection.BEST:
+                return self.reader.find(board).move
+            return self.reader.weighted_choice(board, random=self.random).move
+        except IndexError:
+            return None
+
+    def close(self) -> None:
+        self.reader.close()
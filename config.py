@@ -1,36 +1,137 @@
-import chess
-
 # Default engine depth
 DEFAULT_DEPTH = 3
 
+# Maximum depth of iterative deepening when searching on a clock
+MAX_DEPTH = 64
+
+# Quiescence search: on/off switch, node cap for each quiescence search started at a leaf,
+# and the safety margin in centipawns for delta pruning
+QUIESCENCE_SEARCH = True
+QUIESCENCE_MAX_NODES = 2000
+DELTA_MARGIN = 200
+
+# Null-move pruning: on/off switch, depth reduction of the null move search,
+# and minimum remaining depth to try it
+NULL_MOVE_PRUNING = True
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+
+# Late move reductions: on/off switch, minimum remaining depth, and number of moves
+# searched to full depth before quiet moves are reduced
+LATE_MOVE_REDUCTIONS = True
+LMR_MIN_DEPTH = 3
+LMR_FULL_DEPTH_MOVES = 3
+
+# Futility pruning: on/off switch, maximum remaining depth, and margin in centipawns per ply of depth
+FUTILITY_PRUNING = True
+FUTILITY_MAX_DEPTH = 2
+FUTILITY_MARGIN = 100
+
+# History heuristic scores are halved once one of them exceeds this value
+HISTORY_MAX = 1_000_000
+
+# Opening book: whether to play from a Polyglot book, its path, how book moves are chosen
+# ("best" or "weighted"), and the number of plies from the start of the game after which it is not probed
+OWN_BOOK = False
+BOOK_FILE = None
+BOOK_SELECTION = "weighted"
+BOOK_MAX_PLY = 20
+
+# Syzygy endgame tablebases: directories of the table files (separated by os.pathsep, None to switch
+# probing off), maximum number of pieces of probed positions, and number of cached probe results
+SYZYGY_PATH = None
+SYZYGY_PROBE_LIMIT = 7
+SYZYGY_CACHE_SIZE = 100_000
+# Score of a tablebase win, below mate scores and above any evaluation
+TB_WIN_SCORE = 100_000
+
+# Self-play matches: SPRT hypotheses (Elo difference under H0 and H1) and error rates,
+# and the number of plies after which a game is adjudicated a draw
+SPRT_ELO0 = 0
+SPRT_ELO1 = 5
+SPRT_ALPHA = 0.05
+SPRT_BETA = 0.05
+MATCH_MAX_PLIES = 400
+
+# Depth of the search benchmark, and its signature (total node count) at that depth. A change which
+# alters the search or evaluation changes the signature, and must update it here.
+BENCH_DEPTH = 3
+BENCH_SIGNATURE = 26423
+
+# Instrumentation: beta cutoffs are counted by the index of the move causing them, up to this many moves,
+# and the stack sampler of the profiler takes a sample every PROFILE_SAMPLE_INTERVAL seconds of CPU time
+CUTOFF_MOVE_SLOTS = 8
+PROFILE_SAMPLE_INTERVAL = 0.001
+
+# Seconds between two uci "info" lines reporting the progress of a search within an iteration
+UCI_INFO_INTERVAL = 1.0
+
+# Default transposition table size in megabytes
+TT_SIZE_MB = 16
+
+# Parallel search: default number of search processes, and number of locks guarding
+# the buckets of the transposition table shared between them
+THREADS = 1
+TT_LOCK_STRIPES = 64
+# How worker processes are started. Forking a process with running threads (the UCI front end reads
+# its input while searching) can deadlock the child, so workers are started from a fork server
+# (or spawned where there is none), which also keeps the engine imported for fast worker starts.
+WORKER_START_METHOD = "forkserver"
+# Seconds to wait for workers to stop after the search is stopped, before terminating them
+WORKER_STOP_TIMEOUT = 2.0
+
+# Fixed-depth searches with several threads split the root moves across a process pool
+# instead of using lazy SMP
+ROOT_SPLIT = False
+
+# Time management: milliseconds kept in reserve per move for communication lag,
+# and number of moves assumed to be left when the time control does not say
+MOVE_OVERHEAD_MS = 50
+DEFAULT_MOVES_TO_GO = 30
+
+# Piece types, numbered as in python-chess (chess.PAWN ... chess.KING). config does not import chess,
+# so the UCI front end can read it without loading the engine.
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+
 # Material value - middlegame
 piece_type_to_value_mg = {
-    chess.PAWN: 82,
-    chess.KNIGHT: 337,
-    chess.BISHOP: 365,
-    chess.ROOK: 477,
-    chess.QUEEN: 1025,
-    chess.KING: 12000,	
+    PAWN: 82,
+    KNIGHT: 337,
+    BISHOP: 365,
+    ROOK: 477,
+    QUEEN: 1025,
+    KING: 12000,	
 }
 
 # Material value - endgame
 piece_type_to_value_eg = {
-    chess.PAWN: 94,
-    chess.KNIGHT: 281,
-    chess.BISHOP: 297,
-    chess.ROOK: 512,
-    chess.QUEEN: 936,
-    chess.KING: 12000,	
+    PAWN: 94,
+    KNIGHT: 281,
+    BISHOP: 297,
+    ROOK: 512,
+    QUEEN: 936,
+    KING: 12000,	
 }
 
 # Game phase bounds
 GAME_PHASE_MIN_EG = 518
 GAME_PHASE_MAX_MG = 6192
 GAME_PHASE_RANGE = GAME_PHASE_MAX_MG - GAME_PHASE_MIN_EG
+# Number of steps the game phase range is quantized into for tapered evaluation
+GAME_PHASE_STEPS = 64
 
 # Correction factor for pawn weaknesses
 PAWN_WEAKNESS_FACTOR = 30
+
+# Number of entries of the pawn structure cache (a power of two)
+PAWN_HASH_ENTRIES = 16384
+# Number of entries of the evaluation cache (a power of two)
+EVAL_HASH_ENTRIES = 65536
 MATE_EVAL = 1_000_000_000
+# Bound on all search scores, beyond any mate score
+INFINITY = MATE_EVAL + 1
+# Half width in centipawns of the first aspiration window around the score of the previous iteration
+ASPIRATION_WINDOW = 50
 
 # Piece square tables - a kind of 'second order correction' to material value depending on
 # where the piece is located, and the game stage.
@@ -38,6 +139,7 @@ MATE_EVAL = 1_000_000_000
 
 # Middlegame PSTs
 # note that the top row is square is A1, B1, C1, etc..
+# Tables for black are the white tables reversed (see pst.mirror_pst).
 white_pawn_mg = [
       0,   0,   0,   0,   0,   0,  0,   0,
       -35,  -1, -20, -23, -15,  24, 38, -22,
@@ -49,8 +151,6 @@ white_pawn_mg = [
       0,   0,   0,   0,   0,   0,  0,   0,
 ]
 
-black_pawn_mg = list(reversed(white_pawn_mg))
-
 white_knight_mg = [
     -105, -21, -58, -33, -17, -28, -19,  -23,
     -29, -53, -12,  -3,  -1,  18, -14,  -19,
@@ -62,9 +162,6 @@ white_knight_mg = [
     -167, -89, -34, -49,  61, -97, -15, -107,
 ]
 
-black_knight_mg = list(reversed(white_knight_mg))
-
-
 white_bishop_mg = [
     -33,  -3, -14, -21, -13, -12, -39, -21,
       4,  15,  16,   0,   7,  21,  33,   1,
@@ -76,8 +173,6 @@ white_bishop_mg = [
     -29,   4, -82, -37, -25, -42,   7,  -8,            
 ]
 
-black_bishop_mg = list(reversed(white_bishop_mg))
-
 white_rook_mg = [
     -19, -13,   1,  17, 16,  7, -37, -26,
     -44, -16, -20,  -9, -1, 11,  -6, -71, 
@@ -89,8 +184,6 @@ white_rook_mg = [
     32,  42,  32,  51, 63,  9,  31,  43,
 ]
 
-black_rook_mg = list(reversed(white_rook_mg))
-
 white_queen_mg = [
      -1, -18,  -9,  10, -15, -25, -31, -50,
     -35,  -8,  11,   2,   8,  15,  -3,   1,
@@ -102,8 +195,6 @@ white_queen_mg = [
     -28,   0,  29,  12,  59,  44,  43,  45,
 ]
 
-black_queen_mg = list(reversed(white_queen_mg))
-
 white_king_mg = [
     -15,  36,  12, -54,   8, -28,  24,  14,
       1,   7,  -8, -64, -43, -16,   9,   8,
@@ -115,7 +206,6 @@ white_king_mg = [
     -65,  23,  16, -15, -56, -34,   2,  13,
 ]
 
-black_king_mg = list(reversed(white_king_mg))
  
  # Endgame PST 
 white_pawn_eg = [
@@ -129,8 +219,6 @@ white_pawn_eg = [
       0,   0,   0,   0,   0,   0,   0,   0,
 ]
 
-black_pawn_eg = list(reversed(white_pawn_eg))
-
 white_knight_eg = [
     -29, -51, -23, -15, -22, -18, -50, -64,
     -42, -20, -10,  -5,  -2, -20, -23, -44,
@@ -142,8 +230,6 @@ white_knight_eg = [
     -58, -38, -13, -28, -31, -27, -63, -99,
 ]
 
-black_knight_eg = list(reversed(white_knight_eg))
-
 white_bishop_eg = [
     -23,  -9, -23,  -5, -9, -16,  -5, -17,
     -14, -18,  -7,  -1,  4,  -9, -15, -27,
@@ -155,8 +241,6 @@ white_bishop_eg = [
     -14, -21, -11,  -8, -7,  -9, -17, -24,
 ]
 
-black_bishop_eg = list(reversed(white_bishop_eg))
-
 white_rook_eg = [
     -9,  2,  3, -1, -5, -13,   4, -20,
     -6, -6,  0,  2, -9,  -9, -11,  -3,
@@ -168,8 +252,6 @@ white_rook_eg = [
     13, 10, 18, 15, 12,  12,   8,   5,
 ]
 
-black_rook_eg = list(reversed(white_rook_eg))
-
 white_queen_eg = [
     -33, -28, -22, -43,  -5, -32, -20, -41,
     -22, -23, -30, -16, -16, -23, -36, -32,
@@ -181,8 +263,6 @@ white_queen_eg = [
      -9,  22,  22,  27,  27,  19,  10,  20,
 ]
 
-black_queen_eg = list(reversed(white_queen_eg))
-
 white_king_eg = [
     -53, -34, -21, -11, -28, -14, -24, -43,
     -27, -11,   4,  13,  14,   4,  -5, -17,
@@ -194,8 +274,6 @@ white_king_eg = [
     -74, -35, -18, -18, -11,  15,   4, -17,
 ]
 
-black_king_eg = list(reversed(white_king_eg))
-
 # fen notation to unicode chess piece icons
 fen_to_icon = {
     "R": "♖",
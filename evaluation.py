@@ -1,10 +1,12 @@
 import chess
-from collections import Counter
-from typing import List, Tuple, Dict
-from config import (piece_type_to_value_mg, piece_type_to_value_eg, PAWN_WEAKNESS_FACTOR, MATE_EVAL, 
-                    GAME_PHASE_MIN_EG, GAME_PHASE_MAX_MG, GAME_PHASE_RANGE)
-from pst import PstFactory, GamePhase
-from enum import Enum
+import chess.polyglot
+from array import array
+from typing import List, Optional, Tuple
+from config import (piece_type_to_value_mg, PAWN_WEAKNESS_FACTOR,
+                    GAME_PHASE_MIN_EG, GAME_PHASE_MAX_MG, GAME_PHASE_RANGE, GAME_PHASE_STEPS,
+                    PAWN_HASH_ENTRIES, EVAL_HASH_ENTRIES)
+from position import AnyBoard
+from pst import CompiledPst, PST_SIZE, pst_index
 
 # ideas
 # piece value tables for opening and endgame: https://www.chessprogramming.org/Tapered_Eval
@@ -12,7 +14,7 @@ from enum import Enum
 
 
 
-def evaluate(board: chess.Board) -> float:
+def evaluate(board: AnyBoard) -> int:
     """
     Implementation of a basic tapered evaluation function.
 
@@ -21,85 +23,405 @@ def evaluate(board: chess.Board) -> float:
     - piece square tables for middlegame and endgame, weighted by game phase
     - correction factors for pawn weaknesses
 
+    Material and piece square table values are read from the compiled table blended
+    for the game phase of the position, so each piece costs a single lookup.
+    Scores of boards carrying their Zobrist key (position.Position) are cached in the evaluation hash table.
+
     Parameters:
         board (chess.Board): chess.Board object containing current state of the board
 
     Returns:
-        float: the approximate centipawn evaluation of the position (+100 ~ 1 pawn in favour of white)
-    """
-    # determine the game phase and weights to apply for tapered evaluation
-    game_phase = calculate_game_phase(board)
-    factor_mg = (game_phase - GAME_PHASE_MIN_EG) / GAME_PHASE_RANGE
-    factor_eg = 1 - factor_mg
-
-    eval: float = 0
-    # Sum the piece values
-    for square in chess.SQUARES:
-        if piece := board.piece_at(square):
-            piece_type, color = piece.piece_type, piece.color
-            material_mg = piece_type_to_value_mg[piece_type]
-            pst_mg = PstFactory.get_pst(piece_type, color, GamePhase.MIDDLEGAME)[square]
-            material_eg = piece_type_to_value_eg[piece_type]
-            pst_eg = PstFactory.get_pst(piece_type, color, GamePhase.ENDGAME)[square]
-            value = factor_mg * (material_mg + pst_mg) + factor_eg * (material_eg + pst_eg)
-            eval += value if piece.color == chess.WHITE else -value
-
-    # Factor in isolated and doubled pawns
-    white_pawns = board.pieces(chess.PAWN, chess.WHITE)
-    black_pawns = board.pieces(chess.PAWN, chess.BLACK)
-    eval -= PAWN_WEAKNESS_FACTOR * (
-        count_isolated_pawns(white_pawns) - count_isolated_pawns(black_pawns)
-    )
-    eval -= PAWN_WEAKNESS_FACTOR * (
-        count_doubled_pawns(white_pawns) - count_doubled_pawns(black_pawns)
+        int: the approximate centipawn evaluation of the position (+100 ~ 1 pawn in favour of white)
+    """
+    key = getattr(board, "key", None)
+    if key is not None and (score := eval_hash_table.probe(key)) is not None:
+        return score
+    step = game_phase_step(material_game_phase(board))
+    blended = BLENDED_VALUES
+    score = 0
+    for color in chess.COLORS:
+        occupied = board.occupied_co[color]
+        for piece_type, pieces in (
+            (chess.PAWN, board.pawns),
+            (chess.KNIGHT, board.knights),
+            (chess.BISHOP, board.bishops),
+            (chess.ROOK, board.rooks),
+            (chess.QUEEN, board.queens),
+            (chess.KING, board.kings),
+        ):
+            offset = step * PST_SIZE + pst_index(color, piece_type, 0)
+            for square in chess.scan_forward(pieces & occupied):
+                score += blended[offset + square]
+    score = score // GAME_PHASE_STEPS - pawn_structure_penalty(board)
+    if key is not None:
+        eval_hash_table.store(key, score)
+    return score
+
+
+def score_pieces(board: AnyBoard) -> Tuple[int, int, int]:
+    """
+    Sum the material and piece square table values of all the pieces on the board.
+
+    Returns:
+        Tuple[int, int, int]: middlegame score, endgame score (both from white's point of view)
+        and the unclamped game phase
+    """
+    score_mg = score_eg = 0
+    for color in chess.COLORS:
+        occupied = board.occupied_co[color]
+        for piece_type, pieces in (
+            (chess.PAWN, board.pawns),
+            (chess.KNIGHT, board.knights),
+            (chess.BISHOP, board.bishops),
+            (chess.ROOK, board.rooks),
+            (chess.QUEEN, board.queens),
+            (chess.KING, board.kings),
+        ):
+            offset = pst_index(color, piece_type, 0)
+            for square in chess.scan_forward(pieces & occupied):
+                score_mg += PIECE_SQUARE_VALUES_MG[offset + square]
+                score_eg += PIECE_SQUARE_VALUES_EG[offset + square]
+    return score_mg, score_eg, material_game_phase(board)
+
+
+def material_game_phase(board: AnyBoard) -> int:
+    """
+    Unclamped game phase: the sum of the middlegame values of all the pieces on the board.
+    """
+    return (
+        chess.popcount(board.pawns) * piece_type_to_value_mg[chess.PAWN]
+        + chess.popcount(board.knights) * piece_type_to_value_mg[chess.KNIGHT]
+        + chess.popcount(board.bishops) * piece_type_to_value_mg[chess.BISHOP]
+        + chess.popcount(board.rooks) * piece_type_to_value_mg[chess.ROOK]
+        + chess.popcount(board.queens) * piece_type_to_value_mg[chess.QUEEN]
+        + chess.popcount(board.kings) * piece_type_to_value_mg[chess.KING]
     )
 
-    return eval
+
+def game_phase_step(game_phase: int) -> int:
+    """
+    Quantize a game phase to one of GAME_PHASE_STEPS + 1 steps,
+    from 0 (endgame) to GAME_PHASE_STEPS (middlegame).
+    """
+    game_phase = max(GAME_PHASE_MIN_EG, min(GAME_PHASE_MAX_MG, game_phase))
+    return ((game_phase - GAME_PHASE_MIN_EG) * GAME_PHASE_STEPS + GAME_PHASE_RANGE // 2) // GAME_PHASE_RANGE
+
+
+def taper(score_mg: int, score_eg: int, game_phase: int) -> int:
+    """
+    Interpolate between the middlegame and endgame scores according to the (quantized) game phase,
+    rounded down to a whole centipawn.
+    """
+    step = game_phase_step(game_phase)
+    return (step * score_mg + (GAME_PHASE_STEPS - step) * score_eg) // GAME_PHASE_STEPS
 
 
-def calculate_game_phase(board: chess.Board) -> float:
+def pawn_structure_penalty(board: AnyBoard, pawn_key: Optional[int] = None) -> int:
     """
-    Calculates a float which represents the 'game phase' of the current position.
-    The lower the game phase, the closer we are to the endgame.
+    Penalty for pawn structure weaknesses, from white's point of view, read from the pawn hash table.
 
     Parameters:
-        board (chess.Board): chess.Board object containing current state of the board
+        pawn_key (Optional[int]): pawn-only Zobrist key of the board, computed from the board if not given
+    """
+    if pawn_key is None:
+        pawn_key = pawn_zobrist_key(board)
+    pawns = board.pawns
+    return pawn_hash_table.probe(
+        pawn_key, pawns & board.occupied_co[chess.WHITE], pawns & board.occupied_co[chess.BLACK]
+    )
 
-    Returns:
-        float: value of game phase bounded by GAME_PHASE_MAX_MG, and GAME_PHASE_MIN_EG
+
+def score_pawn_structure(white_pawns: int, black_pawns: int) -> int:
     """
-    # The game phase is defined as the sum of the middlegame values of all the pieces except pawns.
-    game_phase = 0
-    for square in chess.SQUARES:
-        if piece := board.piece_at(square):
-            game_phase += piece_type_to_value_mg[piece.piece_type]
-    game_phase = max(GAME_PHASE_MIN_EG, min(GAME_PHASE_MAX_MG, game_phase))
-    return game_phase
+    Pawn structure penalty for the given pawn bitboards: isolated and doubled pawns.
+    Only depends on the pawns, so the result can be cached in the pawn hash table.
+    """
+    return PAWN_WEAKNESS_FACTOR * (
+        isolated_pawns(white_pawns)
+        - isolated_pawns(black_pawns)
+        + doubled_pawns(white_pawns)
+        - doubled_pawns(black_pawns)
+    )
+
+
+def pawn_zobrist_key(board: AnyBoard) -> int:
+    """
+    Zobrist key of the pawns only, using the polyglot random numbers of the pawns.
+    """
+    key = 0
+    for color in chess.COLORS:
+        keys = PAWN_ZOBRIST_KEYS[color]
+        for square in chess.scan_forward(board.pawns & board.occupied_co[color]):
+            key ^= keys[square]
+    return key
+
+
+# pawn Zobrist keys indexed by [color][square]; polyglot numbers black pawns 0 and white pawns 1
+PAWN_ZOBRIST_KEYS = [
+    chess.polyglot.POLYGLOT_RANDOM_ARRAY[0:64],
+    chess.polyglot.POLYGLOT_RANDOM_ARRAY[64:128],
+]
+
+
+class PawnHashTable:
+    """
+    Fixed-size cache of pawn structure scores, indexed by the low bits of the pawn Zobrist key.
+    The pawn structure rarely changes between neighbouring nodes of the search, so most probes hit.
+    """
+
+    def __init__(self, entries: int = PAWN_HASH_ENTRIES):
+        if entries & (entries - 1):
+            raise ValueError(f"Number of pawn hash entries must be a power of two, got {entries}")
+        self.mask = entries - 1
+        self.keys: List[Optional[int]] = [None] * entries
+        self.scores: List[int] = [0] * entries
+        self.hits = self.misses = 0
+
+    def clear(self) -> None:
+        self.keys = [None] * len(self.keys)
+        self.hits = self.misses = 0
+
+    def probe(self, key: int, white_pawns: int, black_pawns: int) -> int:
+        """
+        Return the pawn structure score for the pawns with the given key, computing and storing it on a miss.
+        """
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        self.misses += 1
+        score = score_pawn_structure(white_pawns, black_pawns)
+        self.keys[index] = key
+        self.scores[index] = score
+        return score
 
 
-def count_isolated_pawns(pawn_squares: chess.SquareSet) -> int:
+pawn_hash_table = PawnHashTable()
+
+
+class EvalHashTable:
+    """
+    Fixed-size cache of static evaluations, indexed by the low bits of the Zobrist key of the position.
+    The same leaves are evaluated again through transpositions and in every iteration of iterative deepening.
+    Keys and scores are kept in two flat arrays, and a new score always replaces the one in its slot.
+
+    An evaluation only depends on the position, so a copy of the table is as good as the original:
+    worker processes forked from the main one start with its entries, and other workers fill their own.
+    An empty slot has the key 0, which a real position has a negligible chance of hashing to.
+    """
+
+    def __init__(self, entries: int = EVAL_HASH_ENTRIES):
+        if entries & (entries - 1):
+            raise ValueError(f"Number of evaluation hash entries must be a power of two, got {entries}")
+        self.mask = entries - 1
+        self.keys = array("Q", bytes(8 * entries))
+        self.scores = array("q", bytes(8 * entries))
+        self.hits = self.misses = 0
+
+    def clear(self) -> None:
+        self.keys = array("Q", bytes(8 * len(self.keys)))
+        self.hits = self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def probe(self, key: int) -> Optional[int]:
+        """
+        Return the cached score of the position with the given key, or None.
+        """
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        self.misses += 1
+        return None
+
+    def store(self, key: int, score: int) -> None:
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = score
+
+
+eval_hash_table = EvalHashTable()
+
+
+def clear_eval_hash() -> None:
+    eval_hash_table.clear()
+
+
+# cached scores are stale once the piece square tables change
+CompiledPst.on_compile.append(clear_eval_hash)
+
+
+# compiled tables, indexed with pst.pst_index; they are updated in place when a table is registered
+PIECE_SQUARE_VALUES_MG = CompiledPst.values_mg
+PIECE_SQUARE_VALUES_EG = CompiledPst.values_eg
+BLENDED_VALUES = CompiledPst.blended
+
+
+class IncrementalEvaluator:
+    """
+    Keeps the material + piece square table sums, the game phase and the pawn Zobrist key of a board up to date
+    as moves are made and unmade, so that a leaf evaluation does not have to rescan the board.
+
+    Usage during search:
+        evaluator.push(board, move)   # before board.push(move)
+        board.push(move)
+        ...
+        board.pop()
+        evaluator.pop()
+
+    evaluator.evaluate(board) returns exactly the same score as evaluate(board).
+    """
+
+    def __init__(self, board: AnyBoard):
+        self.refresh(board)
+
+    def refresh(self, board: AnyBoard) -> None:
+        """
+        Recompute all sums from scratch and forget any pushed moves.
+        """
+        self.score_mg, self.score_eg, self.game_phase = score_pieces(board)
+        self.pawn_key = pawn_zobrist_key(board)
+        self._stack: List[Tuple[int, int, int, int]] = []
+
+    def push(self, board: AnyBoard, move: chess.Move) -> None:
+        """
+        Update the sums for a pseudo-legal move. Must be called before the move is pushed to the board.
+        """
+        self._stack.append((self.score_mg, self.score_eg, self.game_phase, self.pawn_key))
+        if not move:
+            return
+
+        color = board.turn
+        from_square, to_square = move.from_square, move.to_square
+        piece_type = board.piece_type_at(from_square)
+        assert piece_type is not None, "no piece on the from square"
+        values_mg, values_eg = PIECE_SQUARE_VALUES_MG, PIECE_SQUARE_VALUES_EG
+        index = pst_index(color, piece_type, from_square)
+        score_mg = self.score_mg - values_mg[index]
+        score_eg = self.score_eg - values_eg[index]
+
+        if board.is_castling(move):
+            back_rank = chess.square_rank(from_square)
+            if board.is_kingside_castling(move):
+                king_to, rook_to, rook_file = chess.G1, chess.F1, 7
+            else:
+                king_to, rook_to, rook_file = chess.C1, chess.D1, 0
+            king_to, rook_to = king_to + 8 * back_rank, rook_to + 8 * back_rank
+            # chess960-style castling moves encode the king capturing its own rook
+            rook_from = (
+                to_square
+                if board.piece_type_at(to_square) == chess.ROOK
+                else chess.square(rook_file, back_rank)
+            )
+            king, rook = pst_index(color, chess.KING, 0), pst_index(color, chess.ROOK, 0)
+            score_mg += values_mg[king + king_to] + values_mg[rook + rook_to] - values_mg[rook + rook_from]
+            score_eg += values_eg[king + king_to] + values_eg[rook + rook_to] - values_eg[rook + rook_from]
+            self.score_mg, self.score_eg = score_mg, score_eg
+            return
+
+        captured_square = to_square
+        if board.is_en_passant(move):
+            captured_square = to_square - 8 if color == chess.WHITE else to_square + 8
+        if captured_type := board.piece_type_at(captured_square):
+            index = pst_index(not color, captured_type, captured_square)
+            score_mg -= values_mg[index]
+            score_eg -= values_eg[index]
+            self.game_phase -= piece_type_to_value_mg[captured_type]
+            if captured_type == chess.PAWN:
+                self.pawn_key ^= PAWN_ZOBRIST_KEYS[not color][captured_square]
+
+        if piece_type == chess.PAWN:
+            self.pawn_key ^= PAWN_ZOBRIST_KEYS[color][from_square]
+            if not move.promotion:
+                self.pawn_key ^= PAWN_ZOBRIST_KEYS[color][to_square]
+        if move.promotion:
+            self.game_phase += piece_type_to_value_mg[move.promotion] - piece_type_to_value_mg[piece_type]
+            piece_type = move.promotion
+        index = pst_index(color, piece_type, to_square)
+        self.score_mg = score_mg + values_mg[index]
+        self.score_eg = score_eg + values_eg[index]
+
+    def pop(self) -> None:
+        """
+        Restore the sums from before the last pushed move.
+        """
+        self.score_mg, self.score_eg, self.game_phase, self.pawn_key = self._stack.pop()
+
+    def evaluate(self, board: AnyBoard) -> int:
+        """
+        Evaluate the board the evaluator is tracking. Only the pawn structure term is computed from the board,
+        and only when it is not in the pawn hash table. Like evaluate, scores are cached in the evaluation
+        hash table when the board carries its Zobrist key.
+        """
+        key = getattr(board, "key", None)
+        if key is not None and (score := eval_hash_table.probe(key)) is not None:
+            return score
+        score = taper(self.score_mg, self.score_eg, self.game_phase) - pawn_structure_penalty(
+            board, self.pawn_key
+        )
+        if key is not None:
+            eval_hash_table.store(key, score)
+        return score
+
+
+def count_isolated_pawns(pawn_squares: chess.IntoSquareSet) -> int:
     """
     Count the number of isolated pawns.
     """
-    files = [chess.square_file(square) for square in pawn_squares]
-    file_set = set(files)
-    count = 0
-    for f in files:
-        if (f - 1) not in file_set and (f + 1) not in file_set:
-            count += 1
-    return count
+    return isolated_pawns(chess.SquareSet(pawn_squares).mask)
 
 
-def count_doubled_pawns(pawn_squares: chess.SquareSet) -> int:
+def count_doubled_pawns(pawn_squares: chess.IntoSquareSet) -> int:
     """
     Count the number of doubled pawns. Tripled pawns are counted twice.
     """
-    files = Counter([chess.square_file(square) for square in pawn_squares])
-    count = 0
-    for f in files:
-        pawns_on_file = files.get(f, 0)
-        if pawns_on_file == 2:
-            count += 1
-        elif pawns_on_file > 2:
-            count += 2
-    return count
+    return doubled_pawns(chess.SquareSet(pawn_squares).mask)
+
+
+def isolated_pawns(pawns: chess.Bitboard) -> int:
+    """
+    Number of pawns with no pawn of the same color on an adjacent file.
+    """
+    files = pawn_files(pawns)
+    isolated_files = files & ~((files << 1) | (files >> 1))
+    return chess.popcount(pawns & isolated_files * FIRST_SQUARE_OF_FILES)
+
+
+def doubled_pawns(pawns: chess.Bitboard) -> int:
+    """
+    Doubled pawn count: one for a file with two pawns, two for a file with three or more.
+    """
+    # pawns with at least one, two and three pawns of the same color behind them on their file
+    behind_one = pawns & fill_north(pawns << 8)
+    behind_two = pawns & fill_north(behind_one << 8)
+    behind_three = pawns & fill_north(behind_two << 8)
+    # per file with n pawns: (n - 1) - max(n - 3, 0) = min(n - 1, 2)
+    return chess.popcount(behind_one) - chess.popcount(behind_three)
+
+
+def pawn_files(pawns: chess.Bitboard) -> int:
+    """
+    8-bit mask of the files with at least one pawn, bit i standing for file i.
+    """
+    pawns |= pawns >> 32
+    pawns |= pawns >> 16
+    pawns |= pawns >> 8
+    return pawns & 0xFF
+
+
+def fill_north(bitboard: chess.Bitboard) -> chess.Bitboard:
+    """
+    Bitboard with all the squares on or north of a set square.
+    """
+    bitboard |= bitboard << 8
+    bitboard |= bitboard << 16
+    bitboard |= bitboard << 32
+    return bitboard & chess.BB_ALL
+
+
+# bit i of a file mask times this gives the bitboard of file i
+FIRST_SQUARE_OF_FILES = 0x0101010101010101
@@ -1,7 +1,8 @@
 import argparse
 import chess
 from chess import InvalidMoveError, IllegalMoveError, AmbiguousMoveError
-from config import fen_to_icon, DEFAULT_DEPTH
+import search
+from config import fen_to_icon, DEFAULT_DEPTH, THREADS
 from search import next_move
 from dataclasses import dataclass
 
@@ -120,8 +121,15 @@ if __name__ == "__main__":
     # get engine depth
     parser = argparse.ArgumentParser(description="Get desired engine depth")
     parser.add_argument("-d", "--depth", type=int)
+    parser.add_argument(
+        "-t", "--threads", type=int, default=THREADS, help="number of search processes"
+    )
+    parser.add_argument("-b", "--book", help="Polyglot opening book (.bin) to play the opening from")
     args = parser.parse_args()
     depth = args.depth if args.depth else DEFAULT_DEPTH
+    search.options.threads = max(1, args.threads)
+    if args.book:
+        search.options.own_book, search.options.book_file = True, args.book
 
     user, bot = Player("User", False), Player("Quark", True)
     in_play = True
@@ -0,0 +1,70 @@
+import chess
+from typing import List, Optional
+from config import HISTORY_MAX
+
+# ideas
+# killer heuristic: https://www.chessprogramming.org/Killer_Heuristic
+# history heuristic: https://www.chessprogramming.org/History_Heuristic
+
+
+class KillerMoves:
+    """
+    Two killer slots per ply: the most recent quiet moves which caused a beta cutoff at that ply.
+    Sibling positions at the same ply are often refuted by the same move.
+    """
+
+    def __init__(self, max_ply: int):
+        self.max_ply = max_ply
+        self.clear()
+
+    def clear(self) -> None:
+        self.slots: List[List[Optional[chess.Move]]] = [
+            [None, None] for _ in range(self.max_ply + 1)
+        ]
+
+    def get(self, ply: int) -> List[chess.Move]:
+        """
+        Killer moves stored for the given ply, most recent first.
+        """
+        if ply > self.max_ply:
+            return []
+        return [move for move in self.slots[ply] if move]
+
+    def add(self, ply: int, move: chess.Move) -> None:
+        if ply > self.max_ply:
+            return
+        slots = self.slots[ply]
+        if slots[0] != move:
+            slots[1] = slots[0]
+            slots[0] = move
+
+
+class HistoryTable:
+    """
+    Butterfly history table: for each side, a score per (from square, to square) pair,
+    increased every time a quiet move causes a beta cutoff, by more the deeper the cutoff.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.scores: List[List[int]] = [[0] * 64 * 64, [0] * 64 * 64]
+
+    def age(self) -> None:
+        """
+        Halve all the scores, so that older searches weigh less than the current one.
+        """
+        for side in self.scores:
+            for i, score in enumerate(side):
+                if score:
+                    side[i] = score // 2
+
+    def score(self, color: chess.Color, move: chess.Move) -> int:
+        return self.scores[color][move.from_square * 64 + move.to_square]
+
+    def update(self, color: chess.Color, move: chess.Move, depth: int) -> None:
+        index = move.from_square * 64 + move.to_square
+        self.scores[color][index] += depth * depth
+        if self.scores[color][index] > HISTORY_MAX:
+            self.age()
@@ -0,0 +1,487 @@
+"""
+Self-play matches between two configurations of the engine, to check that a change does not lose strength.
+
+Each opening is played twice, once with each engine as white. Games run concurrently in a process pool,
+and are appended to a PGN file as they finish. The result is reported as wins, draws and losses,
+an Elo difference with its 95% error margin, and a sequential probability ratio test (SPRT)
+of H0: elo = elo0 against H1: elo = elo1. https://www.chessprogramming.org/Sequential_Probability_Ratio_Test
+
+    python match.py --engine "name=new" --engine "name=base null_move=false" --tc 10+0.1 -c 8 --pgn match.pgn
+    python match.py --engine "name=lmr" --engine "name=nolmr late_move_reductions=false" --nodes 5000 --sprt
+
+An engine is given as space separated key=value pairs: name, tc (seconds+increment), nodes, depth,
+hash (megabytes), and any field of search.SearchOptions.
+"""
+
+import argparse
+import chess
+import chess.pgn
+import math
+import time
+import search
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, fields
+from typing import Callable, List, Optional, get_args
+from config import (DEFAULT_DEPTH, MAX_DEPTH, TT_SIZE_MB, SPRT_ELO0, SPRT_ELO1, SPRT_ALPHA, SPRT_BETA,
+                    MATCH_MAX_PLIES)
+from heuristics import KillerMoves, HistoryTable
+from parallel import process_context
+from search import SearchOptions
+from time_manager import SearchLimits
+from transposition import SharedTranspositionTable, TranspositionTable
+
+# Openings played by default: a few plies of common openings, as SAN moves
+OPENING_LINES = [
+    "e4 e5 Nf3 Nc6 Bb5",
+    "e4 e5 Nf3 Nc6 Bc4",
+    "e4 c5 Nf3 d6 d4",
+    "e4 c5 Nc3 Nc6 g3",
+    "e4 e6 d4 d5 Nc3",
+    "e4 c6 d4 d5 e5",
+    "d4 d5 c4 e6 Nc3",
+    "d4 d5 c4 c6 Nf3",
+    "d4 Nf6 c4 g6 Nc3",
+    "d4 Nf6 c4 e6 Nf3",
+    "c4 e5 Nc3 Nf6 g3",
+    "Nf3 d5 g3 Nf6 Bg2",
+]
+
+
+@dataclass
+class EngineConfig:
+    """
+    One side of a match: search options, transposition table size and limits per move.
+    A clock (time in seconds, with an increment) takes precedence over a node limit, and both over a fixed depth.
+    """
+
+    name: str
+    options: SearchOptions = field(default_factory=SearchOptions)
+    hash_mb: int = TT_SIZE_MB
+    time: Optional[float] = None
+    increment: float = 0.0
+    nodes: Optional[int] = None
+    depth: Optional[int] = None
+
+
+@dataclass
+class GameResult:
+    """
+    A finished game, with its PGN
+    """
+
+    number: int
+    white: str
+    black: str
+    result: str
+    termination: str
+    plies: int
+    pgn: str
+
+
+@dataclass
+class MatchResult:
+    """
+    Running totals of a match, from the point of view of the first engine
+    """
+
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+
+    @property
+    def games(self) -> int:
+        return self.wins + self.draws + self.losses
+
+    @property
+    def score(self) -> float:
+        return (self.wins + 0.5 * self.draws) / self.games if self.games else 0.5
+
+    @property
+    def elo(self) -> float:
+        return elo_difference(self.score)
+
+    @property
+    def elo_error(self) -> float:
+        """
+        Half width of the 95% confidence interval of the Elo difference.
+        """
+        variance = score_variance(self.wins, self.draws, self.losses)
+        if not variance:
+            return math.inf
+        margin = 1.96 * math.sqrt(variance / self.games)
+        return (elo_difference(self.score + margin) - elo_difference(self.score - margin)) / 2
+
+    def add(self, result: str, first_engine_white: bool) -> None:
+        if result == "1/2-1/2":
+            self.draws += 1
+        elif (result == "1-0") == first_engine_white:
+            self.wins += 1
+        else:
+            self.losses += 1
+
+
+def expected_score(elo: float) -> float:
+    """
+    Expected score against an opponent rated elo points lower, with the logistic Elo model.
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_difference(score: float) -> float:
+    """
+    Inverse of expected_score.
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+def score_variance(wins: int, draws: int, losses: int) -> float:
+    """
+    Variance of the score of a single game, with the observed win, draw and loss frequencies.
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score = (wins + 0.5 * draws) / games
+    return (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score**2) / games
+
+
+def log_likelihood_ratio(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    """
+    Log-likelihood ratio of H1: elo = elo1 against H0: elo = elo0, with the normal approximation
+    of the score distribution used by Fishtest.
+    """
+    games = wins + draws + losses
+    variance = score_variance(wins, draws, losses)
+    if not games or not variance:
+        return 0.0
+    score = (wins + 0.5 * draws) / games
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    return games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+
+def sprt(
+    result: MatchResult,
+    elo0: float = SPRT_ELO0,
+    elo1: float = SPRT_ELO1,
+    alpha: float = SPRT_ALPHA,
+    beta: float = SPRT_BETA,
+) -> Optional[str]:
+    """
+    Verdict of the SPRT: "H1" if the first engine is elo1 stronger, "H0" if it is only elo0 stronger,
+    or None if more games are needed.
+    """
+    llr = log_likelihood_ratio(result.wins, result.draws, result.losses, elo0, elo1)
+    if llr >= math.log((1 - beta) / alpha):
+        return "H1"
+    if llr <= math.log(beta / (1 - alpha)):
+        return "H0"
+    return None
+
+
+def parse_engine(spec: str, defaults: Optional[EngineConfig] = None) -> EngineConfig:
+    """
+    Engine configuration from space separated key=value pairs, on top of the given defaults.
+    """
+    base = defaults or EngineConfig("engine")
+    config = EngineConfig(
+        base.name, SearchOptions(**vars(base.options)), base.hash_mb, base.time, base.increment, base.nodes, base.depth
+    )
+    option_types = {option.name: option.type for option in fields(SearchOptions)}
+    for pair in spec.split():
+        key, _, value = pair.partition("=")
+        if key == "name":
+            config.name = value
+        elif key == "tc":
+            config.time, config.increment = parse_time_control(value)
+        elif key in ("nodes", "depth"):
+            setattr(config, key, int(value))
+        elif key == "hash":
+            config.hash_mb = int(value)
+        elif key in option_types:
+            setattr(config.options, key, _parse_value(option_types[key], value))
+        else:
+            raise ValueError(f"Unknown engine setting {key!r}")
+    return config
+
+
+def parse_time_control(time_control: str) -> tuple:
+    """
+    "10+0.1" -> (10.0, 0.1): seconds for the game, and increment per move.
+    """
+    base, _, increment = time_control.partition("+")
+    return float(base), float(increment or 0)
+
+
+def _parse_value(type_, value: str):
+    if get_args(type_):  # Optional[...]
+        if value.lower() in ("", "none"):
+            return None
+        type_ = get_args(type_)[0]
+    if type_ is bool:
+        return value.lower() in ("true", "1", "yes", "on")
+    return type_(value)
+
+
+class EngineState:
+    """
+    Search state of one engine in a game: its options, and its own transposition table,
+    killer moves and history, which are swapped into the search module before each of its moves.
+    An engine searching with several threads gets a table shared with its worker processes,
+    which must be freed with close at the end of the game.
+    """
+
+    def __init__(self, config: EngineConfig):
+        self.config = config
+        self.transposition_table: TranspositionTable
+        if config.options.threads > 1:
+            self.transposition_table = SharedTranspositionTable(config.hash_mb, process_context())
+        else:
+            self.transposition_table = TranspositionTable(config.hash_mb)
+        self.killers = KillerMoves(MAX_DEPTH)
+        self.history = HistoryTable()
+
+    def activate(self) -> None:
+        search.options = self.config.options
+        search.transposition_table = self.transposition_table
+        search.killers = self.killers
+        search.history = self.history
+
+    def deactivate(self) -> None:
+        # lazy SMP replaces the shared table if it had to terminate its workers
+        self.transposition_table = search.transposition_table
+
+    def close(self) -> None:
+        if isinstance(self.transposition_table, SharedTranspositionTable):
+            self.transposition_table.close()
+
+
+def play_game(
+    number: int,
+    fen: str,
+    white: EngineConfig,
+    black: EngineConfig,
+    max_plies: int = MATCH_MAX_PLIES,
+) -> GameResult:
+    """
+    Play a game between two engine configurations from the given position.
+    The game is adjudicated a draw after max_plies plies, and lost by an engine whose clock runs out.
+    """
+    saved = search.options, search.transposition_table, search.killers, search.history
+    board = chess.Board(fen)
+    engines = {chess.WHITE: EngineState(white), chess.BLACK: EngineState(black)}
+    clocks = {color: engines[color].config.time for color in chess.COLORS}
+    try:
+        while True:
+            if outcome := board.outcome(claim_draw=True):
+                result, termination = outcome.result(), outcome.termination.name.lower()
+                break
+            if board.ply() >= max_plies:
+                result, termination = "1/2-1/2", "adjudication"
+                break
+            turn = board.turn
+            engine = engines[turn]
+            config = engine.config
+            if config.time is not None:
+                limits = SearchLimits(
+                    wtime=_clock_ms(clocks[chess.WHITE]),
+                    btime=_clock_ms(clocks[chess.BLACK]),
+                    winc=int(engines[chess.WHITE].config.increment * 1000),
+                    binc=int(engines[chess.BLACK].config.increment * 1000),
+                )
+                depth = config.depth or MAX_DEPTH
+            else:
+                limits = SearchLimits(nodes=config.nodes)
+                depth = config.depth or (MAX_DEPTH if config.nodes else DEFAULT_DEPTH)
+            engine.activate()
+            t0 = time.perf_counter()
+            move = search.run_search(board, depth, limits).move
+            engine.deactivate()
+            clock = clocks[turn]
+            if clock is not None:
+                clock -= time.perf_counter() - t0
+                if clock < 0:
+                    result, termination = ("0-1" if turn == chess.WHITE else "1-0"), "time forfeit"
+                    break
+                clocks[turn] = clock + config.increment
+            board.push(move)
+    finally:
+        search.options, search.transposition_table, search.killers, search.history = saved
+        for engine in engines.values():
+            engine.close()
+
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "Quark self-play"
+    game.headers["Round"] = str(number)
+    game.headers["White"] = white.name
+    game.headers["Black"] = black.name
+    game.headers["Result"] = result
+    game.headers["Termination"] = termination
+    return GameResult(number, white.name, black.name, result, termination, board.ply(), str(game))
+
+
+def _clock_ms(seconds: Optional[float]) -> Optional[int]:
+    return None if seconds is None else max(int(seconds * 1000), 1)
+
+
+def opening_fens(path: Optional[str] = None) -> List[str]:
+    """
+    Start positions of the games: one FEN or EPD per line of the file, or the default opening lines.
+    """
+    if path is None:
+        fens = []
+        for line in OPENING_LINES:
+            board = chess.Board()
+            for san in line.split():
+                board.push_san(san)
+            fens.append(board.fen())
+        return fens
+    fens = []
+    with open(path) as openings:
+        for line in openings:
+            parts = line.split()
+            if not parts or line.startswith("#"):
+                continue
+            if len(parts) >= 6 and parts[4].isdigit() and parts[5].isdigit():
+                fens.append(chess.Board(" ".join(parts[:6])).fen())
+            else:
+                fens.append(chess.Board.from_epd(line)[0].fen())
+    return fens
+
+
+def run_match(
+    first: EngineConfig,
+    second: EngineConfig,
+    games: int,
+    openings: Optional[List[str]] = None,
+    concurrency: int = 1,
+    pgn_path: Optional[str] = None,
+    stop_on_sprt: bool = False,
+    sprt_bounds: tuple = (SPRT_ELO0, SPRT_ELO1, SPRT_ALPHA, SPRT_BETA),
+    max_plies: int = MATCH_MAX_PLIES,
+    on_game: Optional[Callable[[GameResult, MatchResult], None]] = None,
+) -> MatchResult:
+    """
+    Play a match of the given number of games between two engine configurations.
+
+    Parameters:
+        openings (List[str], optional): start positions, each played with both colors in turn
+        concurrency (int): number of games played at the same time, each in its own process
+        pgn_path (str, optional): PGN file the games are appended to as they finish
+        stop_on_sprt (bool): end the match as soon as the SPRT accepts either hypothesis
+        on_game (Callable, optional): called with each finished game and the running totals
+
+    Returns:
+        MatchResult: wins, draws and losses of the first engine
+    """
+    openings = openings or opening_fens()
+    schedule = []
+    for i in range(games):
+        fen = openings[(i // 2) % len(openings)]
+        white, black = (first, second) if i % 2 == 0 else (second, first)
+        schedule.append((i + 1, fen, white, black, max_plies))
+
+    match = MatchResult()
+    pgn_file = open(pgn_path, "a") if pgn_path else None
+
+    def record(game: GameResult) -> bool:
+        match.add(game.result, game.white == first.name)
+        if pgn_file:
+            pgn_file.write(game.pgn + "\n\n")
+            pgn_file.flush()
+        if on_game:
+            on_game(game, match)
+        return stop_on_sprt and sprt(match, *sprt_bounds) is not None
+
+    try:
+        if concurrency <= 1:
+            for args in schedule:
+                if record(play_game(*args)):
+                    break
+        else:
+            with ProcessPoolExecutor(max_workers=concurrency, mp_context=process_context()) as pool:
+                futures = [pool.submit(play_game, *args) for args in schedule]
+                for future in as_completed(futures):
+                    if record(future.result()):
+                        for pending in futures:
+                            pending.cancel()
+                        break
+    finally:
+        if pgn_file:
+            pgn_file.close()
+    return match
+
+
+def format_match(match: MatchResult, first: str, second: str, sprt_bounds: Optional[tuple] = None) -> str:
+    """
+    One line summary of the running totals of a match.
+    """
+    line = (
+        f"{first} vs {second}: {match.wins}-{match.draws}-{match.losses} (W-D-L) "
+        f"score {match.score:.3f} elo {match.elo:+.1f} +/- {match.elo_error:.1f}"
+    )
+    if sprt_bounds:
+        elo0, elo1, alpha, beta = sprt_bounds
+        llr = log_likelihood_ratio(match.wins, match.draws, match.losses, elo0, elo1)
+        lower, upper = math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+        line += f" LLR {llr:.2f} ({lower:.2f}, {upper:.2f})"
+        if verdict := sprt(match, elo0, elo1, alpha, beta):
+            line += f" {verdict} accepted"
+    return line
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Play a self-play match between two engine configurations")
+    parser.add_argument(
+        "--engine", action="append", required=True, help='engine settings, e.g. "name=new nodes=5000", twice'
+    )
+    parser.add_argument("--tc", help="time control for both engines, seconds+increment, e.g. 10+0.1")
+    parser.add_argument("--nodes", type=int, help="nodes per move for both engines")
+    parser.add_argument("--depth", type=int, help="fixed depth for both engines")
+    parser.add_argument("-g", "--games", type=int, default=100)
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="number of games played at once")
+    parser.add_argument("--openings", help="file with one FEN or EPD per line")
+    parser.add_argument("--pgn", help="PGN file the games are appended to")
+    parser.add_argument("--sprt", action="store_true", help="stop once the SPRT accepts a hypothesis")
+    parser.add_argument("--elo0", type=float, default=SPRT_ELO0)
+    parser.add_argument("--elo1", type=float, default=SPRT_ELO1)
+    parser.add_argument("--alpha", type=float, default=SPRT_ALPHA)
+    parser.add_argument("--beta", type=float, default=SPRT_BETA)
+    args = parser.parse_args()
+    if len(args.engine) != 2:
+        parser.error("give exactly two --engine settings")
+
+    defaults = EngineConfig("engine", nodes=args.nodes, depth=args.depth)
+    if args.tc:
+        defaults.time, defaults.increment = parse_time_control(args.tc)
+    first, second = (parse_engine(spec, defaults) for spec in args.engine)
+    if first.name == second.name:
+        second.name += "-2"
+    bounds = (args.elo0, args.elo1, args.alpha, args.beta)
+
+    def report(game: GameResult, match: MatchResult) -> None:
+        print(
+            f"game {game.number}: {game.white} - {game.black} {game.result} ({game.termination}) | "
+            + format_match(match, first.name, second.name, bounds),
+            flush=True,
+        )
+
+    match = run_match(
+        first,
+        second,
+        args.games,
+        opening_fens(args.openings),
+        args.concurrency,
+        args.pgn,
+        args.sprt,
+        bounds,
+        on_game=report,
+    )
+    print(format_match(match, first.name, second.name, bounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Parallel search across several processes, to get around the GIL.
+
+Lazy SMP: https://www.chessprogramming.org/Lazy_SMP
+Every worker process runs its own iterative deepening on the same root position.
+They only communicate through the shared transposition table: entries written by one
+worker let the others skip or better order parts of the tree.
+
+Root splitting: for fixed-depth analysis, the first root move is searched serially to get
+an alpha bound, then the other root moves are searched in parallel in a persistent process pool.
+It searches without the window-dependent selective search, to return the same result as a serial search.
+"""
+
+import atexit
+import chess
+import multiprocessing
+import queue
+import search
+from concurrent.futures import ProcessPoolExecutor, wait
+from dataclasses import replace
+from multiprocessing.synchronize import Event
+from typing import TYPE_CHECKING, Callable, Dict, List, Literal, Optional, Tuple, Union
+from config import INFINITY, WORKER_START_METHOD, WORKER_STOP_TIMEOUT
+from evaluation import IncrementalEvaluator
+from position import Position
+from search import SearchOptions, SearchResult
+from time_manager import SearchAborted, SearchLimits
+from transposition import SharedTranspositionTable
+
+if TYPE_CHECKING:
+    # the fork contexts only exist on POSIX platforms
+    from multiprocessing.context import ForkContext, ForkServerContext, SpawnContext
+
+# process pool for root splitting, kept alive between searches so that
+# starting the processes and importing the engine is only paid once
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+# set to stop the root moves being searched in the pool
+_pool_stop: Optional[Event] = None
+
+
+def process_context() -> "Union[ForkContext, ForkServerContext, SpawnContext]":
+    """
+    Multiprocessing context the worker processes are started from: WORKER_START_METHOD if the platform
+    has it, otherwise spawn. The fork server imports the engine once, so forking a worker from it is cheap.
+    """
+    method = WORKER_START_METHOD if WORKER_START_METHOD in multiprocessing.get_all_start_methods() else "spawn"
+    if method == "forkserver":
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["parallel", "perft"])
+        return context
+    if method == "fork":
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+
+def lazy_smp_search(
+    board: chess.Board,
+    depth: int,
+    limits: Optional[SearchLimits],
+    threads: int,
+    on_iteration: Optional[Callable[[SearchResult], None]] = None,
+) -> SearchResult:
+    """
+    Search the position with the given number of worker processes sharing a transposition table.
+    Half of the workers start at depth 2 rather than 1, so they stay one iteration out of step
+    with the others and explore different parts of the tree at the same time.
+
+    Once worker 0 finishes, the others are stopped, and the result of the deepest completed
+    iteration across all workers is returned. on_iteration, if given, is called whenever
+    a worker completes an iteration deeper than any before.
+
+    The clock and the node limit are kept by this process, which stops the workers once the clock
+    runs out or the workers searched that many nodes together, so that a "ponderhit" only needs
+    to reach this process. Workers which do not stop within
+    WORKER_STOP_TIMEOUT seconds are terminated, and the table they shared is replaced,
+    since a terminated worker may hold one of its locks.
+    """
+    context = process_context()
+    if not isinstance(search.transposition_table, SharedTranspositionTable):
+        search.transposition_table = SharedTranspositionTable(search.transposition_table.size_mb, context)
+    table = search.transposition_table
+    table.new_search()
+    search.time_manager.start(limits or SearchLimits(), board.turn)
+
+    stop_event = context.Event()
+    results = context.Queue()
+    root_fen = board.root().fen()
+    moves = [move.uci() for move in board.move_stack]
+    worker_limits = limits
+    if limits and limits.ponder:
+        worker_limits = replace(limits, movetime=None, wtime=None, btime=None, ponder=False, infinite=True)
+    node_limit = limits.nodes if limits else None
+    if worker_limits and node_limit is not None:
+        worker_limits = replace(worker_limits, nodes=None)
+    # nodes searched so far by each worker, which count towards the node limit together
+    node_counters = [context.Value("q", 0, lock=False) for _ in range(threads)]
+    workers = [
+        context.Process(
+            target=_search_worker,
+            args=(
+                worker_id,
+                root_fen,
+                moves,
+                depth,
+                worker_limits,
+                search.options,
+                table,
+                stop_event,
+                node_counters[worker_id],
+                results,
+            ),
+            daemon=True,
+        )
+        for worker_id in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+
+    best: Optional[SearchResult] = None
+    best_worker = threads
+    finished: List[int] = []
+    nodes: Dict[int, int] = {}
+    stopped_at: Optional[float] = None
+    while len(finished) < threads:
+        if search.time_manager.stop_requested() or search.time_manager.out_of_time():
+            stop_event.set()
+        if node_limit is not None and sum(counter.value for counter in node_counters) >= node_limit:
+            stop_event.set()
+        if stop_event.is_set():
+            if stopped_at is None:
+                stopped_at = search.time_manager.elapsed()
+            elif search.time_manager.elapsed() - stopped_at > WORKER_STOP_TIMEOUT:
+                break
+        try:
+            worker_id, result, worker_nodes = results.get(timeout=0.05)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        nodes[worker_id] = worker_nodes
+        if result is None:
+            finished.append(worker_id)
+            if worker_id == 0:
+                stop_event.set()
+        elif best is None or (result.depth, -worker_id) > (best.depth, -best_worker):
+            if on_iteration and (best is None or result.depth > best.depth):
+                elapsed = search.time_manager.elapsed()
+                on_iteration(replace(result, nodes=sum(nodes.values()), time=elapsed))
+            best, best_worker = result, worker_id
+
+    stop_event.set()
+    terminated = False
+    for worker in workers:
+        worker.join(WORKER_STOP_TIMEOUT)
+        if worker.is_alive():
+            worker.terminate()
+            worker.join()
+            terminated = True
+    if terminated:
+        table.close()
+        search.transposition_table = SharedTranspositionTable(table.size_mb, context)
+    if best is None:
+        raise RuntimeError("Parallel search failed: no worker completed an iteration")
+    return replace(best, nodes=sum(nodes.values()), time=search.time_manager.elapsed())
+
+
+def _search_worker(
+    worker_id: int,
+    root_fen: str,
+    moves: List[str],
+    depth: int,
+    limits: Optional[SearchLimits],
+    options: SearchOptions,
+    table: SharedTranspositionTable,
+    stop_event,
+    node_counter,
+    results,
+) -> None:
+    """
+    Entry point of a worker process. Sends (worker_id, result, nodes) for every completed iteration,
+    then (worker_id, None, nodes) when done.
+    """
+    board = chess.Board(root_fen)
+    for move in moves:
+        board.push_uci(move)
+    search.transposition_table = table
+    search.options = options
+    search.time_manager.stop_event = stop_event
+    search.time_manager.node_counter = node_counter
+    try:
+        search.iterative_deepening(
+            board,
+            depth,
+            limits,
+            start_depth=min(1 + worker_id % 2, depth),
+            on_iteration=lambda result: results.put((worker_id, result, result.nodes)),
+        )
+    finally:
+        results.put((worker_id, None, search.stats.nodes))
+        table.close()
+
+
+def root_split_search(board: chess.Board, depth: int, workers: int) -> SearchResult:
+    """
+    Fixed-depth search which splits the root moves across a pool of worker processes.
+
+    The position is first searched serially to depth - 1, to order the root moves and find the
+    most likely best move. That move is searched to full depth in this process, which gives an
+    alpha bound for the remaining root moves; those are then searched in the pool with the window
+    (alpha, inf). As with the serial search, a later move only replaces the best move if it
+    scores strictly higher. If the search is stopped before all root moves are searched,
+    the depth - 1 result is returned.
+
+    Null-move pruning, late move reductions and futility pruning depend on the search window,
+    which differs between the split and the serial search, so the split search runs without them.
+    It returns the same move and score as a serial search with that selective search switched off,
+    which may differ from the result of the default serial search.
+    """
+    options = search.options
+    search.options = exact_options(options)
+    try:
+        return _root_split_search(board, depth, workers)
+    finally:
+        search.options = options
+
+
+def exact_options(options: SearchOptions) -> SearchOptions:
+    """
+    The options without the selective search whose result depends on the search window.
+    """
+    return replace(options, null_move=False, late_move_reductions=False, futility=False)
+
+
+def _root_split_search(board: chess.Board, depth: int, workers: int) -> SearchResult:
+    if depth <= 1:
+        return search.iterative_deepening(board, depth)
+    shallow = search.iterative_deepening(board, depth - 1)
+    # same order as negamax_root uses for the last iteration of the serial search
+    root_moves = list(search.staged_moves(board, shallow.move))
+    if len(root_moves) == 1:
+        return search.iterative_deepening(board, depth)
+
+    if search.time_manager.stop_requested():
+        return shallow
+
+    # search the first move here to establish the alpha bound
+    search.stats.nodes = 0
+    position = Position.from_board(board)
+    color: Literal[1, -1] = 1 if position.turn == chess.WHITE else -1
+    evaluator = IncrementalEvaluator(position)
+    best_move = root_moves[0]
+    evaluator.push(position, best_move)
+    position.push(best_move)
+    try:
+        best_score = -search.negamax(position, depth - 1, -INFINITY, INFINITY, -color, evaluator, 1)
+    except SearchAborted:
+        # stopped: fall back on the last completed depth
+        return replace(shallow, nodes=shallow.nodes + search.stats.nodes, time=search.time_manager.elapsed())
+    nodes = shallow.nodes + search.stats.nodes
+
+    pool = get_pool(workers)
+    assert _pool_stop is not None
+    _pool_stop.clear()
+    root_fen = board.root().fen()
+    moves = [move.uci() for move in board.move_stack]
+    futures = [
+        pool.submit(
+            _search_root_move, root_fen, moves, move.uci(), depth, best_score, search.options
+        )
+        for move in root_moves[1:]
+    ]
+    pending = set(futures)
+    while pending:
+        if search.time_manager.stop_requested():
+            # stop the moves being searched, and drop those not started yet
+            _pool_stop.set()
+            for future in pending:
+                future.cancel()
+            nodes += sum(future.result()[1] for future in futures if future not in pending)
+            return replace(shallow, nodes=nodes, time=search.time_manager.elapsed())
+        _, pending = wait(pending, timeout=0.05)
+
+    for move, future in zip(root_moves[1:], futures):
+        score, move_nodes = future.result()
+        nodes += move_nodes
+        if score > best_score:
+            best_move, best_score = move, score
+
+    return SearchResult(best_move, best_score, depth, nodes, search.time_manager.elapsed())
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Return the root splitting process pool, creating it if it does not exist or has a different size.
+    """
+    global _pool, _pool_workers, _pool_stop
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        context = process_context()
+        _pool_stop = context.Event()
+        _pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=context, initializer=_init_pool_worker, initargs=(_pool_stop,)
+        )
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool, _pool_workers, _pool_stop
+    if _pool is not None:
+        _pool.shutdown()
+        _pool, _pool_workers, _pool_stop = None, 0, None
+
+
+def _init_pool_worker(stop_event: Event) -> None:
+    search.time_manager.stop_event = stop_event
+
+
+atexit.register(shutdown_pool)
+
+
+def _search_root_move(
+    root_fen: str,
+    moves: List[str],
+    root_move: str,
+    depth: int,
+    alpha: int,
+    options: SearchOptions,
+) -> Tuple[int, int]:
+    """
+    Task run in a pool process: search a single root move with the window (alpha, inf).
+    The process keeps its own transposition table, killers and history between tasks.
+
+    Returns
+        Tuple[int, int]: score of the root move, from the point of view of the side to move
+        at the root, and the number of nodes searched
+    """
+    board = chess.Board(root_fen)
+    for uci in moves:
+        board.push_uci(uci)
+    position = Position.from_board(board)
+    search.options = options
+    search.update_tablebase()
+    search.time_manager.start(SearchLimits(), position.turn)
+    # the result is dropped if the search is stopped, so it may abort at once
+    search.time_manager.can_abort = True
+    search.stats.nodes = search.stats.qnodes = 0
+    color: Literal[1, -1] = 1 if position.turn == chess.WHITE else -1
+    evaluator = IncrementalEvaluator(position)
+    move = chess.Move.from_uci(root_move)
+    evaluator.push(position, move)
+    position.push(move)
+    score = -search.negamax(position, depth - 1, -INFINITY, -alpha, -color, evaluator, 1)
+    return score, search.stats.nodes
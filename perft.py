@@ -0,0 +1,213 @@
+"""
+Perft: count the leaf nodes of the legal move tree to a given depth, to validate move generation
+and measure move generation and make/unmake throughput independently of the search.
+https://www.chessprogramming.org/Perft
+
+    python perft.py -d 5                      # starting position
+    python perft.py -d 4 --fen "<fen>" --divide
+    python perft.py --check -w 8              # reference positions, in 8 processes
+    python perft.py -d 4 --python-chess       # count with chess.Board, for comparison
+"""
+
+import argparse
+import chess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from position import AnyBoard, Position
+from parallel import process_context
+
+# Reference positions with their node counts at depth 1, 2, 3, ...
+# https://www.chessprogramming.org/Perft_Results
+PERFT_POSITIONS: List[Tuple[str, List[int]]] = [
+    (chess.STARTING_FEN, [20, 400, 8902, 197281, 4865609]),
+    (
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        [48, 2039, 97862, 4085603],
+    ),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    (
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        [6, 264, 9467, 422333],
+    ),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    (
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        [46, 2079, 89890, 3894594],
+    ),
+]
+
+
+@dataclass
+class PerftResult:
+    """
+    Node count of a perft run, with the count below each root move
+    """
+
+    fen: str
+    depth: int
+    nodes: int
+    time: float
+    divide: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def nps(self) -> int:
+        return int(self.nodes / self.time) if self.time else 0
+
+
+def perft(board: AnyBoard, depth: int) -> int:
+    """
+    Number of leaf nodes of the legal move tree of the given depth.
+    The moves of the last ply are counted without being made.
+    """
+    if depth <= 1:
+        return sum(1 for _ in board.generate_legal_moves()) if depth == 1 else 1
+    nodes = 0
+    for move in list(board.generate_legal_moves()):
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def divide(board: AnyBoard, depth: int) -> Dict[str, int]:
+    """
+    Perft of each root move, keyed by the move in uci notation.
+    """
+    counts = {}
+    for move in list(board.generate_legal_moves()):
+        board.push(move)
+        counts[move.uci()] = perft(board, depth - 1)
+        board.pop()
+    return counts
+
+
+def make_board(fen: str, python_chess: bool = False) -> AnyBoard:
+    return chess.Board(fen) if python_chess else Position(fen)
+
+
+def _perft_root_move(fen: str, move: str, depth: int, python_chess: bool) -> int:
+    """
+    Task run in a worker process: perft below a single root move.
+    """
+    board = make_board(fen, python_chess)
+    board.push(chess.Move.from_uci(move))
+    return perft(board, depth - 1)
+
+
+def run_perft(
+    fen: str = chess.STARTING_FEN,
+    depth: int = 1,
+    workers: int = 1,
+    python_chess: bool = False,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> PerftResult:
+    """
+    Perft of the position with a divide breakdown, timed.
+
+    Parameters:
+        workers (int): number of processes the root moves are split across
+        python_chess (bool): count with chess.Board rather than Position
+        pool (ProcessPoolExecutor, optional): pool to use instead of starting one for this run
+    """
+    t0 = time.perf_counter()
+    board = make_board(fen, python_chess)
+    if depth < 1:
+        counts: Dict[str, int] = {}
+        nodes = 1
+    elif workers > 1 or pool:
+        moves = [move.uci() for move in board.generate_legal_moves()]
+        if pool:
+            counts = _split_root_moves(pool, fen, moves, depth, python_chess)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as own_pool:
+                counts = _split_root_moves(own_pool, fen, moves, depth, python_chess)
+        nodes = sum(counts.values())
+    else:
+        counts = divide(board, depth)
+        nodes = sum(counts.values())
+    return PerftResult(fen, depth, nodes, time.perf_counter() - t0, counts)
+
+
+def _split_root_moves(
+    pool: ProcessPoolExecutor, fen: str, moves: List[str], depth: int, python_chess: bool
+) -> Dict[str, int]:
+    futures = [pool.submit(_perft_root_move, fen, move, depth, python_chess) for move in moves]
+    return {move: future.result() for move, future in zip(moves, futures)}
+
+
+def check_reference_positions(
+    max_nodes: int = 10_000_000, workers: int = 1, python_chess: bool = False
+) -> List[Tuple[PerftResult, int]]:
+    """
+    Run perft on the reference positions, at every depth with an expected count of at most max_nodes.
+
+    Returns:
+        List[Tuple[PerftResult, int]]: each result with the expected node count
+    """
+    results = []
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) if workers > 1 else None
+    try:
+        for fen, counts in PERFT_POSITIONS:
+            for depth, expected in enumerate(counts, 1):
+                if expected > max_nodes:
+                    break
+                results.append((run_perft(fen, depth, python_chess=python_chess, pool=pool), expected))
+    finally:
+        if pool:
+            pool.shutdown()
+    return results
+
+
+def format_divide(result: PerftResult) -> str:
+    """
+    Divide output in the usual format: one "move: nodes" line per root move, then the total.
+    """
+    lines = [f"{move}: {nodes}" for move, nodes in result.divide.items()]
+    lines += ["", f"Nodes searched: {result.nodes}"]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Count the leaf nodes of the legal move tree")
+    parser.add_argument("-d", "--depth", type=int, default=4)
+    parser.add_argument("--fen", default=chess.STARTING_FEN)
+    parser.add_argument("--divide", action="store_true", help="print the node count of each root move")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument(
+        "--python-chess", action="store_true", help="count with chess.Board rather than Position"
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="check the node counts of the reference positions"
+    )
+    parser.add_argument(
+        "--max-nodes",
+        type=int,
+        default=10_000_000,
+        help="with --check, skip depths with more nodes than this",
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        failed = 0
+        for result, expected in check_reference_positions(args.max_nodes, args.workers, args.python_chess):
+            status = "ok" if result.nodes == expected else f"FAILED (expected {expected})"
+            failed += result.nodes != expected
+            print(
+                f"depth {result.depth} nodes {result.nodes} time {result.time:.2f}s "
+                f"nps {result.nps} {status}  {result.fen}"
+            )
+        raise SystemExit(1 if failed else 0)
+
+    result = run_perft(args.fen, args.depth, args.workers, args.python_chess)
+    if args.divide:
+        print(format_divide(result))
+    else:
+        print(f"Nodes searched: {result.nodes}")
+    print(f"Time (s): {result.time:.2f}")
+    print(f"Nodes/second: {result.nps}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,838 @@
+"""
+Compact position representation used inside the search.
+
+chess.Board keeps a lot of state the search does not need (a full board state snapshot object per
+move, promoted pieces, variant hooks) and recomputes everything else on demand: outcome() replays
+the move stack to look for repetitions, and the Zobrist key is computed from scratch for every
+transposition table probe. Position only keeps the piece bitboards, side to move, castling rights,
+en passant square and move counters, and maintains:
+
+- the polyglot Zobrist key of the position, updated incrementally by push
+- the keys of the previous positions, for repetition detection without replaying moves
+- a stack of the previous states, so pop restores a state instead of undoing a move
+
+It provides the part of the chess.Board interface used by the search and evaluation with the same
+semantics, including the order in which moves are generated, so the engine searches the same tree
+with either. Only standard chess is supported. Boards are converted at the search boundary:
+
+    position = Position.from_board(board)
+    ...
+    board = position.to_board()
+"""
+
+import chess
+import chess.polyglot
+from typing import Iterator, List, Optional, Tuple, Union
+from chess import (
+    BB_ALL,
+    BB_SQUARES,
+    BB_RANK_MASKS,
+    BB_FILE_MASKS,
+    BB_DIAG_MASKS,
+    BB_RANK_ATTACKS,
+    BB_FILE_ATTACKS,
+    BB_DIAG_ATTACKS,
+    BB_KNIGHT_ATTACKS,
+    BB_KING_ATTACKS,
+    BB_PAWN_ATTACKS,
+    BB_DARK_SQUARES,
+    BB_LIGHT_SQUARES,
+    Bitboard,
+    Move,
+    between,
+    msb,
+    ray,
+    scan_reversed,
+)
+
+# castling rights, as bits of Position.castling
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+# castling rights kept when a piece moves from or to a square
+CASTLING_MASKS = [0b1111] * 64
+CASTLING_MASKS[chess.E1] = ~(WHITE_KINGSIDE | WHITE_QUEENSIDE) & 0b1111
+CASTLING_MASKS[chess.H1] = ~WHITE_KINGSIDE & 0b1111
+CASTLING_MASKS[chess.A1] = ~WHITE_QUEENSIDE & 0b1111
+CASTLING_MASKS[chess.E8] = ~(BLACK_KINGSIDE | BLACK_QUEENSIDE) & 0b1111
+CASTLING_MASKS[chess.H8] = ~BLACK_KINGSIDE & 0b1111
+CASTLING_MASKS[chess.A8] = ~BLACK_QUEENSIDE & 0b1111
+
+# rook move of each castling move, keyed by the king's destination square
+CASTLING_ROOK_MOVES = {
+    chess.G1: (chess.H1, chess.F1),
+    chess.C1: (chess.A1, chess.D1),
+    chess.G8: (chess.H8, chess.F8),
+    chess.C8: (chess.A8, chess.D8),
+}
+
+# Zobrist keys, from the polyglot random numbers so keys match chess.polyglot.zobrist_hash
+_RANDOM = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+# ZOBRIST_PIECES[color][piece_type][square]
+ZOBRIST_PIECES = [
+    [[0] * 64]
+    + [
+        [_RANDOM[64 * ((piece_type - 1) * 2 + color) + square] for square in chess.SQUARES]
+        for piece_type in chess.PIECE_TYPES
+    ]
+    for color in (chess.BLACK, chess.WHITE)
+]
+ZOBRIST_CASTLING = [
+    (_RANDOM[768] if rights & WHITE_KINGSIDE else 0)
+    ^ (_RANDOM[769] if rights & WHITE_QUEENSIDE else 0)
+    ^ (_RANDOM[770] if rights & BLACK_KINGSIDE else 0)
+    ^ (_RANDOM[771] if rights & BLACK_QUEENSIDE else 0)
+    for rights in range(16)
+]
+ZOBRIST_EP_FILES = _RANDOM[772:780]
+ZOBRIST_TURN = _RANDOM[780]
+
+# Move objects are immutable, so the search shares one per (from, to) pair instead of creating them
+MOVES = [[Move(from_square, to_square) for to_square in chess.SQUARES] for from_square in chess.SQUARES]
+# promotions to queen, rook, bishop and knight, in the order chess.Board generates them
+PROMOTIONS = {
+    (from_square, to_square): tuple(
+        Move(from_square, to_square, piece_type)
+        for piece_type in (chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT)
+    )
+    for from_square in chess.SQUARES
+    for to_square in chess.SQUARES
+    if abs(from_square - to_square) in (7, 8, 9)
+    and (
+        (chess.square_rank(from_square) == 6 and chess.square_rank(to_square) == 7)
+        or (chess.square_rank(from_square) == 1 and chess.square_rank(to_square) == 0)
+    )
+}
+BACKRANKS = chess.BB_RANK_1 | chess.BB_RANK_8
+
+State = Tuple[List[int], List[int], int, int, Optional[int], int, int, int]
+
+
+class Position:
+    """
+    Search-only position with integer bitboards and an incrementally updated Zobrist key.
+
+    The lists pieces (bitboards indexed by piece type, 0 unused) and occupied_co (indexed by color)
+    are never modified in place: push builds new ones, so the previous lists can be kept on the
+    state stack as they are.
+    """
+
+    __slots__ = (
+        "pieces",
+        "occupied_co",
+        "occupied",
+        "turn",
+        "castling",
+        "ep_square",
+        "halfmove_clock",
+        "fullmove_number",
+        "key",
+        "move_stack",
+        "key_history",
+        "_stack",
+        "_root",
+    )
+
+    def __init__(self, fen: str = chess.STARTING_FEN):
+        self._set_board(chess.Board(fen))
+
+    @classmethod
+    def from_board(cls, board: chess.Board) -> "Position":
+        """
+        Position of a board, including the keys of the earlier positions of the game
+        which can still be repeated.
+        """
+        position = cls.__new__(cls)
+        position._set_board(board)
+        return position
+
+    def _set_board(self, board: chess.Board) -> None:
+        if board.chess960 or type(board).uci_variant != "chess":
+            raise ValueError("Position only supports standard chess")
+        self._root = board.copy()
+        self.pieces = [0, board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings]
+        self.occupied_co = list(board.occupied_co)
+        self.occupied = board.occupied
+        self.turn = board.turn
+        rights = board.clean_castling_rights()
+        self.castling = (
+            (WHITE_KINGSIDE if rights & chess.BB_H1 else 0)
+            | (WHITE_QUEENSIDE if rights & chess.BB_A1 else 0)
+            | (BLACK_KINGSIDE if rights & chess.BB_H8 else 0)
+            | (BLACK_QUEENSIDE if rights & chess.BB_A8 else 0)
+        )
+        self.ep_square = board.ep_square
+        self.halfmove_clock = board.halfmove_clock
+        self.fullmove_number = board.fullmove_number
+        self.key = self.zobrist_key()
+        self.move_stack: List[Move] = []
+        self._stack: List[State] = []
+
+        # keys of the earlier positions since the last capture or pawn move
+        history = board.copy()
+        self.key_history: List[int] = []
+        while history.move_stack and len(self.key_history) < board.halfmove_clock:
+            history.pop()
+            self.key_history.append(chess.polyglot.zobrist_hash(history))
+        self.key_history.reverse()
+
+    def to_board(self) -> chess.Board:
+        """
+        chess.Board of the position, with the move stack of the original board and the moves pushed since.
+        """
+        board = self._root.copy()
+        for move in self.move_stack:
+            board.push(move)
+        return board
+
+    def copy(self) -> "Position":
+        position = Position.from_board(self._root)
+        for move in self.move_stack:
+            position.push(move)
+        return position
+
+    def fen(self) -> str:
+        return self.to_board().fen()
+
+    def __repr__(self) -> str:
+        return f"Position({self.fen()!r})"
+
+    def zobrist_key(self) -> int:
+        """
+        Zobrist key of the position computed from scratch, as chess.polyglot.zobrist_hash.
+        """
+        key = ZOBRIST_CASTLING[self.castling] ^ self._ep_key(self.ep_square, self.turn)
+        if self.turn == chess.WHITE:
+            key ^= ZOBRIST_TURN
+        for color in chess.COLORS:
+            for piece_type in chess.PIECE_TYPES:
+                keys = ZOBRIST_PIECES[color][piece_type]
+                for square in scan_reversed(self.pieces[piece_type] & self.occupied_co[color]):
+                    key ^= keys[square]
+        return key
+
+    def _ep_key(self, ep_square: Optional[int], turn: chess.Color) -> int:
+        # as in polyglot, the en passant file is only hashed when a pawn can capture en passant
+        if ep_square is not None and (
+            self.pieces[chess.PAWN] & self.occupied_co[turn] & BB_PAWN_ATTACKS[not turn][ep_square]
+        ):
+            return ZOBRIST_EP_FILES[ep_square & 7]
+        return 0
+
+    # piece bitboards under the names chess.Board uses
+
+    @property
+    def pawns(self) -> Bitboard:
+        return self.pieces[chess.PAWN]
+
+    @property
+    def knights(self) -> Bitboard:
+        return self.pieces[chess.KNIGHT]
+
+    @property
+    def bishops(self) -> Bitboard:
+        return self.pieces[chess.BISHOP]
+
+    @property
+    def rooks(self) -> Bitboard:
+        return self.pieces[chess.ROOK]
+
+    @property
+    def queens(self) -> Bitboard:
+        return self.pieces[chess.QUEEN]
+
+    @property
+    def kings(self) -> Bitboard:
+        return self.pieces[chess.KING]
+
+    @property
+    def castling_rights(self) -> Bitboard:
+        """
+        Castling rights as the mask of the rooks which may still castle, as chess.Board.castling_rights.
+        """
+        castling = self.castling
+        return (
+            (chess.BB_H1 if castling & WHITE_KINGSIDE else 0)
+            | (chess.BB_A1 if castling & WHITE_QUEENSIDE else 0)
+            | (chess.BB_H8 if castling & BLACK_KINGSIDE else 0)
+            | (chess.BB_A8 if castling & BLACK_QUEENSIDE else 0)
+        )
+
+    def piece_type_at(self, square: chess.Square) -> Optional[chess.PieceType]:
+        mask = BB_SQUARES[square]
+        if not self.occupied & mask:
+            return None
+        pieces = self.pieces
+        if pieces[chess.PAWN] & mask:
+            return chess.PAWN
+        if pieces[chess.KNIGHT] & mask:
+            return chess.KNIGHT
+        if pieces[chess.BISHOP] & mask:
+            return chess.BISHOP
+        if pieces[chess.ROOK] & mask:
+            return chess.ROOK
+        if pieces[chess.QUEEN] & mask:
+            return chess.QUEEN
+        return chess.KING
+
+    def pieces_mask(self, piece_type: chess.PieceType, color: chess.Color) -> Bitboard:
+        return self.pieces[piece_type] & self.occupied_co[color]
+
+    def king(self, color: chess.Color) -> Optional[chess.Square]:
+        kings = self.pieces[chess.KING] & self.occupied_co[color]
+        return msb(kings) if kings else None
+
+    # making and unmaking moves
+
+    def push(self, move: Move) -> None:
+        """
+        Make a pseudo-legal move, or a null move.
+        """
+        turn = self.turn
+        self._stack.append(
+            (
+                self.pieces,
+                self.occupied_co,
+                self.occupied,
+                self.castling,
+                self.ep_square,
+                self.halfmove_clock,
+                self.fullmove_number,
+                self.key,
+            )
+        )
+        self.key_history.append(self.key)
+        self.move_stack.append(move)
+
+        key = self.key ^ ZOBRIST_TURN ^ self._ep_key(self.ep_square, turn)
+        ep_square = self.ep_square
+        self.ep_square = None
+        self.halfmove_clock += 1
+        if turn == chess.BLACK:
+            self.fullmove_number += 1
+        if not move:
+            self.turn = not turn
+            self.key = key
+            return
+
+        from_square, to_square = move.from_square, move.to_square
+        from_mask, to_mask = BB_SQUARES[from_square], BB_SQUARES[to_square]
+        pieces = self.pieces[:]
+        occupied_co = self.occupied_co[:]
+        zobrist_us, zobrist_them = ZOBRIST_PIECES[turn], ZOBRIST_PIECES[not turn]
+
+        piece_type = self.piece_type_at(from_square)
+        assert piece_type is not None, "no piece on the from square"
+        pieces[piece_type] ^= from_mask
+        occupied_co[turn] ^= from_mask
+        key ^= zobrist_us[piece_type][from_square]
+
+        if occupied_co[not turn] & to_mask:
+            captured_type = self.piece_type_at(to_square)
+            assert captured_type is not None
+            pieces[captured_type] ^= to_mask
+            occupied_co[not turn] ^= to_mask
+            key ^= zobrist_them[captured_type][to_square]
+            self.halfmove_clock = 0
+
+        if piece_type == chess.PAWN:
+            self.halfmove_clock = 0
+            if to_square == ep_square and not self.occupied & to_mask:
+                captured_square = to_square - 8 if turn == chess.WHITE else to_square + 8
+                pieces[chess.PAWN] ^= BB_SQUARES[captured_square]
+                occupied_co[not turn] ^= BB_SQUARES[captured_square]
+                key ^= zobrist_them[chess.PAWN][captured_square]
+            elif to_square - from_square in (16, -16):
+                self.ep_square = (from_square + to_square) // 2
+            if move.promotion:
+                piece_type = move.promotion
+        elif piece_type == chess.KING and to_square - from_square in (2, -2):
+            rook_from, rook_to = CASTLING_ROOK_MOVES[to_square]
+            rook_mask = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+            pieces[chess.ROOK] ^= rook_mask
+            occupied_co[turn] ^= rook_mask
+            key ^= zobrist_us[chess.ROOK][rook_from] ^ zobrist_us[chess.ROOK][rook_to]
+
+        pieces[piece_type] |= to_mask
+        occupied_co[turn] |= to_mask
+        key ^= zobrist_us[piece_type][to_square]
+
+        castling = self.castling & CASTLING_MASKS[from_square] & CASTLING_MASKS[to_square]
+        key ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+
+        self.pieces = pieces
+        self.occupied_co = occupied_co
+        self.occupied = occupied_co[chess.WHITE] | occupied_co[chess.BLACK]
+        self.castling = castling
+        self.turn = not turn
+        self.key = key ^ self._ep_key(self.ep_square, self.turn)
+
+    def pop(self) -> Move:
+        """
+        Unmake the last move.
+        """
+        (
+            self.pieces,
+            self.occupied_co,
+            self.occupied,
+            self.castling,
+            self.ep_square,
+            self.halfmove_clock,
+            self.fullmove_number,
+            self.key,
+        ) = self._stack.pop()
+        self.key_history.pop()
+        self.turn = not self.turn
+        return self.move_stack.pop()
+
+    def push_uci(self, uci: str) -> Move:
+        move = Move.from_uci(uci)
+        if not self.is_legal(move):
+            raise ValueError(f"illegal move: {uci} in {self.fen()}")
+        self.push(move)
+        return move
+
+    # move classification
+
+    def is_capture(self, move: Move) -> bool:
+        touched = BB_SQUARES[move.from_square] ^ BB_SQUARES[move.to_square]
+        return bool(touched & self.occupied_co[not self.turn]) or self.is_en_passant(move)
+
+    def is_en_passant(self, move: Move) -> bool:
+        return (
+            self.ep_square == move.to_square
+            and bool(self.pieces[chess.PAWN] & BB_SQUARES[move.from_square])
+            and abs(move.to_square - move.from_square) in (7, 9)
+            and not self.occupied & BB_SQUARES[move.to_square]
+        )
+
+    def is_castling(self, move: Move) -> bool:
+        return bool(self.pieces[chess.KING] & BB_SQUARES[move.from_square]) and abs(
+            move.to_square - move.from_square
+        ) == 2
+
+    def is_kingside_castling(self, move: Move) -> bool:
+        return self.is_castling(move) and move.to_square > move.from_square
+
+    def is_zeroing(self, move: Move) -> bool:
+        touched = BB_SQUARES[move.from_square] ^ BB_SQUARES[move.to_square]
+        return bool(touched & self.pieces[chess.PAWN] or touched & self.occupied_co[not self.turn])
+
+    # attacks
+
+    def attacks_mask(self, square: chess.Square) -> Bitboard:
+        mask = BB_SQUARES[square]
+        pieces = self.pieces
+        if mask & pieces[chess.PAWN]:
+            return BB_PAWN_ATTACKS[bool(mask & self.occupied_co[chess.WHITE])][square]
+        if mask & pieces[chess.KNIGHT]:
+            return BB_KNIGHT_ATTACKS[square]
+        if mask & pieces[chess.KING]:
+            return BB_KING_ATTACKS[square]
+        attacks = 0
+        occupied = self.occupied
+        if mask & (pieces[chess.BISHOP] | pieces[chess.QUEEN]):
+            attacks = BB_DIAG_ATTACKS[square][BB_DIAG_MASKS[square] & occupied]
+        if mask & (pieces[chess.ROOK] | pieces[chess.QUEEN]):
+            attacks |= (
+                BB_RANK_ATTACKS[square][BB_RANK_MASKS[square] & occupied]
+                | BB_FILE_ATTACKS[square][BB_FILE_MASKS[square] & occupied]
+            )
+        return attacks
+
+    def attackers_mask(
+        self, color: chess.Color, square: chess.Square, occupied: Optional[Bitboard] = None
+    ) -> Bitboard:
+        if occupied is None:
+            occupied = self.occupied
+        pieces = self.pieces
+        queens_and_rooks = pieces[chess.QUEEN] | pieces[chess.ROOK]
+        queens_and_bishops = pieces[chess.QUEEN] | pieces[chess.BISHOP]
+        attackers = (
+            (BB_KING_ATTACKS[square] & pieces[chess.KING])
+            | (BB_KNIGHT_ATTACKS[square] & pieces[chess.KNIGHT])
+            | (BB_RANK_ATTACKS[square][BB_RANK_MASKS[square] & occupied] & queens_and_rooks)
+            | (BB_FILE_ATTACKS[square][BB_FILE_MASKS[square] & occupied] & queens_and_rooks)
+            | (BB_DIAG_ATTACKS[square][BB_DIAG_MASKS[square] & occupied] & queens_and_bishops)
+            | (BB_PAWN_ATTACKS[not color][square] & pieces[chess.PAWN])
+        )
+        return attackers & self.occupied_co[color]
+
+    def is_attacked_by(self, color: chess.Color, square: chess.Square) -> bool:
+        return bool(self.attackers_mask(color, square))
+
+    def checkers_mask(self) -> Bitboard:
+        king = self.king(self.turn)
+        return 0 if king is None else self.attackers_mask(not self.turn, king)
+
+    def is_check(self) -> bool:
+        return bool(self.checkers_mask())
+
+    # move generation, in the same order as chess.Board
+
+    def generate_pseudo_legal_moves(
+        self, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL
+    ) -> Iterator[Move]:
+        turn = self.turn
+        pieces = self.pieces
+        our_pieces = self.occupied_co[turn]
+        occupied = self.occupied
+
+        # attacks_mask and scan_reversed inlined, as this loop dominates move generation
+        knights, kings = pieces[chess.KNIGHT], pieces[chess.KING]
+        diagonal_sliders = pieces[chess.BISHOP] | pieces[chess.QUEEN]
+        straight_sliders = pieces[chess.ROOK] | pieces[chess.QUEEN]
+        targets_mask = ~our_pieces & to_mask
+        non_pawns = our_pieces & ~pieces[chess.PAWN] & from_mask
+        while non_pawns:
+            from_square = non_pawns.bit_length() - 1
+            square_mask = BB_SQUARES[from_square]
+            non_pawns ^= square_mask
+            if square_mask & knights:
+                targets = BB_KNIGHT_ATTACKS[from_square] & targets_mask
+            elif square_mask & kings:
+                targets = BB_KING_ATTACKS[from_square] & targets_mask
+            else:
+                attacks = 0
+                if square_mask & diagonal_sliders:
+                    attacks = BB_DIAG_ATTACKS[from_square][BB_DIAG_MASKS[from_square] & occupied]
+                if square_mask & straight_sliders:
+                    attacks |= (
+                        BB_RANK_ATTACKS[from_square][BB_RANK_MASKS[from_square] & occupied]
+                        | BB_FILE_ATTACKS[from_square][BB_FILE_MASKS[from_square] & occupied]
+                    )
+                targets = attacks & targets_mask
+            moves = MOVES[from_square]
+            while targets:
+                to_square = targets.bit_length() - 1
+                targets ^= BB_SQUARES[to_square]
+                yield moves[to_square]
+
+        if from_mask & pieces[chess.KING]:
+            yield from self.generate_castling_moves(from_mask, to_mask)
+
+        pawns = pieces[chess.PAWN] & our_pieces & from_mask
+        if not pawns:
+            return
+
+        pawn_attacks = BB_PAWN_ATTACKS[turn]
+        targets_mask = self.occupied_co[not turn] & to_mask
+        for from_square in scan_reversed(pawns):
+            for to_square in scan_reversed(pawn_attacks[from_square] & targets_mask):
+                if BB_SQUARES[to_square] & BACKRANKS:
+                    yield from PROMOTIONS[from_square, to_square]
+                else:
+                    yield MOVES[from_square][to_square]
+
+        if turn == chess.WHITE:
+            single_moves = pawns << 8 & ~occupied
+            double_moves = single_moves << 8 & ~occupied & (chess.BB_RANK_3 | chess.BB_RANK_4)
+            step = -8
+        else:
+            single_moves = pawns >> 8 & ~occupied
+            double_moves = single_moves >> 8 & ~occupied & (chess.BB_RANK_6 | chess.BB_RANK_5)
+            step = 8
+
+        for to_square in scan_reversed(single_moves & to_mask):
+            from_square = to_square + step
+            if BB_SQUARES[to_square] & BACKRANKS:
+                yield from PROMOTIONS[from_square, to_square]
+            else:
+                yield MOVES[from_square][to_square]
+
+        for to_square in scan_reversed(double_moves & to_mask):
+            yield MOVES[to_square + 2 * step][to_square]
+
+        if self.ep_square is not None:
+            yield from self.generate_pseudo_legal_ep(from_mask, to_mask)
+
+    def generate_castling_moves(
+        self, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL
+    ) -> Iterator[Move]:
+        turn = self.turn
+        if turn == chess.WHITE:
+            king, rights = chess.E1, self.castling & (WHITE_KINGSIDE | WHITE_QUEENSIDE)
+        else:
+            king, rights = chess.E8, self.castling & (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+        if not rights or not from_mask & BB_SQUARES[king]:
+            return
+        occupied = self.occupied
+        # the rook squares, in the order chess.Board generates them: h-file rook first
+        for kingside in (True, False):
+            if not rights & (WHITE_KINGSIDE | BLACK_KINGSIDE if kingside else WHITE_QUEENSIDE | BLACK_QUEENSIDE):
+                continue
+            rook = king + 3 if kingside else king - 4
+            if not to_mask & BB_SQUARES[rook]:
+                continue
+            king_to = king + 2 if kingside else king - 2
+            rook_to = king + 1 if kingside else king - 1
+            king_path = between(king, king_to)
+            rook_path = between(rook, rook_to)
+            king_mask, rook_mask = BB_SQUARES[king], BB_SQUARES[rook]
+            if (occupied ^ king_mask ^ rook_mask) & (
+                king_path | rook_path | BB_SQUARES[king_to] | BB_SQUARES[rook_to]
+            ):
+                continue
+            if self._attacked_for_king(king_path | king_mask, occupied ^ king_mask):
+                continue
+            if self._attacked_for_king(
+                BB_SQUARES[king_to], occupied ^ king_mask ^ rook_mask ^ BB_SQUARES[rook_to]
+            ):
+                continue
+            yield MOVES[king][king_to]
+
+    def _attacked_for_king(self, path: Bitboard, occupied: Bitboard) -> bool:
+        return any(
+            self.attackers_mask(not self.turn, square, occupied) for square in scan_reversed(path)
+        )
+
+    def generate_pseudo_legal_ep(
+        self, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL
+    ) -> Iterator[Move]:
+        ep_square = self.ep_square
+        if ep_square is None or not BB_SQUARES[ep_square] & to_mask or BB_SQUARES[ep_square] & self.occupied:
+            return
+        capturers = (
+            self.pieces[chess.PAWN]
+            & self.occupied_co[self.turn]
+            & from_mask
+            & BB_PAWN_ATTACKS[not self.turn][ep_square]
+            & chess.BB_RANKS[4 if self.turn else 3]
+        )
+        for capturer in scan_reversed(capturers):
+            yield MOVES[capturer][ep_square]
+
+    def _slider_blockers(self, king: chess.Square) -> Bitboard:
+        pieces = self.pieces
+        rooks_and_queens = pieces[chess.ROOK] | pieces[chess.QUEEN]
+        bishops_and_queens = pieces[chess.BISHOP] | pieces[chess.QUEEN]
+        snipers = (
+            (BB_RANK_ATTACKS[king][0] & rooks_and_queens)
+            | (BB_FILE_ATTACKS[king][0] & rooks_and_queens)
+            | (BB_DIAG_ATTACKS[king][0] & bishops_and_queens)
+        )
+        blockers = 0
+        for sniper in scan_reversed(snipers & self.occupied_co[not self.turn]):
+            b = between(king, sniper) & self.occupied
+            # a blocker if it is the only piece in between
+            if b and BB_SQUARES[msb(b)] == b:
+                blockers |= b
+        return blockers & self.occupied_co[self.turn]
+
+    def _is_safe(self, king: chess.Square, blockers: Bitboard, move: Move) -> bool:
+        if move.from_square == king:
+            if self.is_castling(move):
+                return True
+            return not self.is_attacked_by(not self.turn, move.to_square)
+        if self.is_en_passant(move):
+            return bool(
+                self._pin_mask(king, move.from_square) & BB_SQUARES[move.to_square]
+                and not self._ep_skewered(king, move.from_square, move.to_square)
+            )
+        return bool(
+            not blockers & BB_SQUARES[move.from_square]
+            or ray(move.from_square, move.to_square) & BB_SQUARES[king]
+        )
+
+    def _pin_mask(self, king: chess.Square, square: chess.Square) -> Bitboard:
+        """
+        Squares a piece of the side to move on the given square can move to without exposing its king.
+        """
+        square_mask = BB_SQUARES[square]
+        pieces = self.pieces
+        for attacks, sliders in (
+            (BB_FILE_ATTACKS, pieces[chess.ROOK] | pieces[chess.QUEEN]),
+            (BB_RANK_ATTACKS, pieces[chess.ROOK] | pieces[chess.QUEEN]),
+            (BB_DIAG_ATTACKS, pieces[chess.BISHOP] | pieces[chess.QUEEN]),
+        ):
+            rays = attacks[king][0]
+            if rays & square_mask:
+                snipers = rays & sliders & self.occupied_co[not self.turn]
+                for sniper in scan_reversed(snipers):
+                    if between(sniper, king) & (self.occupied | square_mask) == square_mask:
+                        return ray(king, sniper)
+                break
+        return BB_ALL
+
+    def _ep_skewered(self, king: chess.Square, capturer: chess.Square, ep_square: chess.Square) -> bool:
+        # the king would be in check along the rank once both pawns leave it
+        last_double = ep_square + (-8 if self.turn == chess.WHITE else 8)
+        occupancy = self.occupied & ~BB_SQUARES[last_double] & ~BB_SQUARES[capturer] | BB_SQUARES[ep_square]
+        pieces = self.pieces
+        them = self.occupied_co[not self.turn]
+        if BB_RANK_ATTACKS[king][BB_RANK_MASKS[king] & occupancy] & them & (
+            pieces[chess.ROOK] | pieces[chess.QUEEN]
+        ):
+            return True
+        return bool(
+            BB_DIAG_ATTACKS[king][BB_DIAG_MASKS[king] & occupancy]
+            & them
+            & (pieces[chess.BISHOP] | pieces[chess.QUEEN])
+        )
+
+    def _generate_evasions(
+        self, king: chess.Square, checkers: Bitboard, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL
+    ) -> Iterator[Move]:
+        pieces = self.pieces
+        sliders = checkers & (pieces[chess.BISHOP] | pieces[chess.ROOK] | pieces[chess.QUEEN])
+        attacked = 0
+        for checker in scan_reversed(sliders):
+            attacked |= ray(king, checker) & ~BB_SQUARES[checker]
+
+        if BB_SQUARES[king] & from_mask:
+            moves = MOVES[king]
+            for to_square in scan_reversed(
+                BB_KING_ATTACKS[king] & ~self.occupied_co[self.turn] & ~attacked & to_mask
+            ):
+                yield moves[to_square]
+
+        checker = msb(checkers)
+        if BB_SQUARES[checker] == checkers:
+            # capture or block a single checker
+            target = between(king, checker) | checkers
+            yield from self.generate_pseudo_legal_moves(~pieces[chess.KING] & from_mask, target & to_mask)
+            # capture the checking pawn en passant
+            if self.ep_square is not None and not BB_SQUARES[self.ep_square] & target:
+                last_double = self.ep_square + (-8 if self.turn == chess.WHITE else 8)
+                if last_double == checker:
+                    yield from self.generate_pseudo_legal_ep(from_mask, to_mask)
+
+    def generate_legal_moves(
+        self, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL
+    ) -> Iterator[Move]:
+        king_mask = self.pieces[chess.KING] & self.occupied_co[self.turn]
+        if not king_mask:
+            yield from self.generate_pseudo_legal_moves(from_mask, to_mask)
+            return
+        king = msb(king_mask)
+        blockers = self._slider_blockers(king)
+        checkers = self.attackers_mask(not self.turn, king)
+        if checkers:
+            moves = self._generate_evasions(king, checkers, from_mask, to_mask)
+        else:
+            moves = self.generate_pseudo_legal_moves(from_mask, to_mask)
+        ep_square = self.ep_square
+        for move in moves:
+            from_square = move.from_square
+            # most moves are neither king moves, nor moves of a pinned piece, nor en passant captures
+            if (
+                from_square != king and not blockers & BB_SQUARES[from_square] and move.to_square != ep_square
+            ) or self._is_safe(king, blockers, move):
+                yield move
+
+    def generate_legal_ep(self, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL) -> Iterator[Move]:
+        for move in self.generate_pseudo_legal_ep(from_mask, to_mask):
+            if not self.is_into_check(move):
+                yield move
+
+    def generate_legal_captures(
+        self, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL
+    ) -> Iterator[Move]:
+        yield from self.generate_legal_moves(from_mask, to_mask & self.occupied_co[not self.turn])
+        yield from self.generate_legal_ep(from_mask, to_mask)
+
+    @property
+    def legal_moves(self) -> List[Move]:
+        return list(self.generate_legal_moves())
+
+    def is_into_check(self, move: Move) -> bool:
+        king = self.king(self.turn)
+        if king is None:
+            return False
+        checkers = self.attackers_mask(not self.turn, king)
+        if checkers and move not in self._generate_evasions(
+            king, checkers, BB_SQUARES[move.from_square], BB_SQUARES[move.to_square]
+        ):
+            return True
+        return not self._is_safe(king, self._slider_blockers(king), move)
+
+    def is_pseudo_legal(self, move: Move) -> bool:
+        if not move:
+            return False
+        piece_type = self.piece_type_at(move.from_square)
+        if not piece_type:
+            return False
+        from_mask, to_mask = BB_SQUARES[move.from_square], BB_SQUARES[move.to_square]
+        if not self.occupied_co[self.turn] & from_mask:
+            return False
+        if move.promotion:
+            if piece_type != chess.PAWN or not to_mask & (chess.BB_RANK_8 if self.turn else chess.BB_RANK_1):
+                return False
+        if piece_type == chess.KING and self.is_castling(move):
+            return move in self.generate_castling_moves()
+        if self.occupied_co[self.turn] & to_mask:
+            return False
+        if piece_type == chess.PAWN:
+            return move in self.generate_pseudo_legal_moves(from_mask, to_mask)
+        return bool(self.attacks_mask(move.from_square) & to_mask)
+
+    def is_legal(self, move: Move) -> bool:
+        return self.is_pseudo_legal(move) and not self.is_into_check(move)
+
+    # end of the game
+
+    def is_repetition(self, count: int = 3) -> bool:
+        """
+        Whether the position occurred count times, counting this one. Only the positions since the
+        last capture or pawn move are compared, as earlier ones cannot be repeated, and since the last
+        null move, as reaching a position again by passing a move is no repetition.
+        """
+        key = self.key
+        keys = self.key_history
+        stop = max(len(keys) - self.halfmove_clock, 0)
+        moves = self.move_stack
+        for ply in range(1, min(len(moves), len(keys) - stop) + 1):
+            if not moves[-ply]:
+                stop = len(keys) - ply + 1
+                break
+        for index in range(len(keys) - 2, stop - 1, -2):
+            if keys[index] == key:
+                count -= 1
+                if count <= 1:
+                    return True
+        return False
+
+    def has_insufficient_material(self, color: chess.Color) -> bool:
+        pieces = self.pieces
+        ours = self.occupied_co[color]
+        if ours & (pieces[chess.PAWN] | pieces[chess.ROOK] | pieces[chess.QUEEN]):
+            return False
+        if ours & pieces[chess.KNIGHT]:
+            return chess.popcount(ours) <= 2 and not (
+                self.occupied_co[not color] & ~pieces[chess.KING] & ~pieces[chess.QUEEN]
+            )
+        if ours & pieces[chess.BISHOP]:
+            bishops = pieces[chess.BISHOP]
+            same_color = not bishops & BB_DARK_SQUARES or not bishops & BB_LIGHT_SQUARES
+            return same_color and not pieces[chess.PAWN] and not pieces[chess.KNIGHT]
+        return True
+
+    def is_insufficient_material(self) -> bool:
+        return self.has_insufficient_material(chess.WHITE) and self.has_insufficient_material(chess.BLACK)
+
+    def outcome(self) -> Optional[chess.Outcome]:
+        """
+        Outcome of the game, if it is over, with the same rules as chess.Board.outcome():
+        checkmate, insufficient material, stalemate, the seventyfive-move rule and fivefold repetition.
+        """
+        has_moves = any(self.generate_legal_moves())
+        if not has_moves and self.is_check():
+            return chess.Outcome(chess.Termination.CHECKMATE, not self.turn)
+        if self.is_insufficient_material():
+            return chess.Outcome(chess.Termination.INSUFFICIENT_MATERIAL, None)
+        if not has_moves:
+            return chess.Outcome(chess.Termination.STALEMATE, None)
+        if self.halfmove_clock >= 150:
+            return chess.Outcome(chess.Termination.SEVENTYFIVE_MOVES, None)
+        if self.is_repetition(5):
+            return chess.Outcome(chess.Termination.FIVEFOLD_REPETITION, None)
+        return None
+
+    def is_game_over(self) -> bool:
+        return self.outcome() is not None
+
+
+# the engine functions which only use the interface shared by both accept either
+AnyBoard = Union[chess.Board, Position]
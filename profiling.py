@@ -0,0 +1,209 @@
+"""
+Instrumentation and profiling of the search.
+
+The search always counts its nodes, cutoffs (by the index of the move causing them) and pruning in
+search.stats. instrument() collects the more detailed counters below by swapping counting versions of
+the evaluator, the move generators, the quiescence search and the transposition table probe into the
+search module while it is active. Outside of it the search runs the plain functions, so the counters
+cost nothing unless asked for. Only searches in this process are instrumented, not parallel workers.
+
+    with instrument() as counters:
+        search.run_search(board, 4)
+    print(format_counters(counters, search.stats))
+
+profile_call() runs a function under cProfile, writing pstats, and/or under a stack sampler writing
+collapsed stacks, the input format of flamegraph.pl and speedscope:
+
+    python bench.py -d 4 --profile bench.pstats --collapsed bench.folded
+    python -m pstats bench.pstats
+    flamegraph.pl bench.folded > bench.svg
+"""
+
+import cProfile
+import os
+import signal
+import time
+import search
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, Optional, Set, Type, TypeVar
+from config import PROFILE_SAMPLE_INTERVAL
+from evaluation import IncrementalEvaluator, eval_hash_table
+from search import SearchStats
+
+T = TypeVar("T")
+
+
+@dataclass
+class Counters:
+    """
+    Counters collected by instrument(). Phase times are inclusive: the quiescence search time includes
+    the evaluations and move generation it does, and the search time everything else.
+    """
+
+    evaluations: int = 0
+    # calls to the staged move generator, and to the capture generator of the quiescence search
+    move_generations: int = 0
+    tt_probes: int = 0
+    tt_hits: int = 0
+    # seconds spent in each phase: book, search, quiescence, evaluation, move generation
+    phase_times: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def tt_hit_rate(self) -> float:
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def instrument(counters: Optional[Counters] = None) -> Iterator[Counters]:
+    """
+    Count evaluations, move generation, transposition table probes and the time of each search phase
+    while the context is active. The counters accumulate over all the searches run inside it.
+    """
+    counters = counters or Counters()
+    # phases being timed, so nested and recursive calls are only timed once
+    active: Set[str] = set()
+
+    def timed(phase: str, function: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            if phase in active:
+                return function(*args, **kwargs)
+            active.add(phase)
+            t0 = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                counters.add_time(phase, time.perf_counter() - t0)
+                active.discard(phase)
+
+        return wrapper
+
+    saved = {
+        name: getattr(search, name)
+        for name in ("IncrementalEvaluator", "staged_moves", "sort_captures", "quiescence", "book_move",
+                     "iterative_deepening")
+    }
+    evaluator_class: Type[IncrementalEvaluator] = saved["IncrementalEvaluator"]
+    staged_moves, sort_captures = saved["staged_moves"], saved["sort_captures"]
+    timed_evaluate = timed("evaluation", evaluator_class.evaluate)
+    timed_sort_captures = timed("move generation", sort_captures)
+    timed_next = timed("move generation", next)
+    timed_search = timed("search", saved["iterative_deepening"])
+
+    # only evaluate is replaced, and it calls the evaluate of the evaluator in use
+    class CountingEvaluator(IncrementalEvaluator):
+        def evaluate(self, board):
+            counters.evaluations += 1
+            return timed_evaluate(self, board)
+
+    def counting_staged_moves(*args, **kwargs):
+        counters.move_generations += 1
+        moves = staged_moves(*args, **kwargs)
+        while (move := timed_next(moves, None)) is not None:
+            yield move
+
+    def counting_sort_captures(board):
+        # the capture stage of the staged generator is not a separate call
+        if "move generation" not in active:
+            counters.move_generations += 1
+        return timed_sort_captures(board)
+
+    def counting_iterative_deepening(*args, **kwargs):
+        table = search.transposition_table
+        probe = table.probe
+
+        def counting_probe(key):
+            counters.tt_probes += 1
+            entry = probe(key)
+            if entry:
+                counters.tt_hits += 1
+            return entry
+
+        table.probe = counting_probe
+        try:
+            return timed_search(*args, **kwargs)
+        finally:
+            del table.probe
+
+    setattr(search, "IncrementalEvaluator", CountingEvaluator)
+    search.staged_moves = counting_staged_moves
+    search.sort_captures = counting_sort_captures
+    search.quiescence = timed("quiescence", saved["quiescence"])
+    search.book_move = timed("book", saved["book_move"])
+    search.iterative_deepening = counting_iterative_deepening
+    try:
+        yield counters
+    finally:
+        for name, value in saved.items():
+            setattr(search, name, value)
+
+
+def format_counters(counters: Counters, stats: SearchStats) -> str:
+    """
+    Counters of the last search and of instrument(), on one line, as sent in a uci "info string".
+    """
+    cutoffs = " ".join(str(count) for count in stats.cutoffs_by_move)
+    phases = " ".join(f"{phase.replace(' ', '_')} {seconds:.3f}" for phase, seconds in counters.phase_times.items())
+    return (
+        f"nodes {stats.nodes} qnodes {stats.qnodes} evaluations {counters.evaluations} "
+        f"movegen {counters.move_generations} tthits {counters.tt_hits}/{counters.tt_probes} "
+        f"cutoffs {stats.cutoffs} bymove {cutoffs} nullmove {stats.null_move_cutoffs} "
+        f"reduced {stats.reduced_moves} futility {stats.futility_prunes} tbhits {stats.tb_hits} "
+        f"evalhash {eval_hash_table.hits}/{eval_hash_table.hits + eval_hash_table.misses} time {phases}"
+    ).rstrip()
+
+
+def profile_call(
+    function: Callable[[], T],
+    pstats_path: Optional[str] = None,
+    collapsed_path: Optional[str] = None,
+    interval: float = PROFILE_SAMPLE_INTERVAL,
+) -> T:
+    """
+    Call a function under cProfile and/or a stack sampler.
+
+    Parameters:
+        function (Callable): called without arguments
+        pstats_path (str, optional): where to write the cProfile statistics, readable with pstats
+        collapsed_path (str, optional): where to write the sampled stacks, one "frame;frame;... count" per line
+        interval (float): seconds of CPU time between two stack samples
+
+    Returns:
+        the return value of the function
+    """
+    profiler = cProfile.Profile() if pstats_path else None
+    samples: Counter = Counter()
+    if collapsed_path:
+        if not hasattr(signal, "setitimer"):
+            raise RuntimeError("stack sampling needs signal.setitimer, which this platform does not have")
+        previous_handler = signal.signal(signal.SIGPROF, lambda signum, frame: samples.update([stack(frame)]))
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+    try:
+        if profiler:
+            return profiler.runcall(function)
+        return function()
+    finally:
+        if collapsed_path:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, previous_handler)
+            with open(collapsed_path, "w") as collapsed:
+                for line, count in sorted(samples.items()):
+                    collapsed.write(f"{line} {count}\n")
+        if profiler and pstats_path:
+            profiler.dump_stats(pstats_path)
+
+
+def stack(frame) -> str:
+    """
+    Collapsed stack of a frame, outermost frame first: "module:function;module:function;..."
+    """
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
@@ -1,5 +1,6 @@
 import chess
-from typing import List, Tuple, Dict
+from array import array
+from typing import Callable, List, Tuple, Dict
 from enum import Enum
 from config import *
 
@@ -12,6 +13,10 @@ class GamePhase(Enum):
 class PstFactory:
     """
     Factory pattern to register and get piece square tables depending on piece type, color, and game phase
+
+    Only the white tables need to be registered: unless a table is registered for black explicitly,
+    the black table is the mirror image of the white one.
+    Registering a table rebuilds the compiled tables used by the evaluation.
     """
 
     piece_square_tables: Dict[Tuple, List[int]] = {}
@@ -22,6 +27,8 @@ class PstFactory:
     ) -> List[int]:
         if pst := cls.piece_square_tables.get((piece_type, color, phase)):
             return pst
+        if color == chess.BLACK and (pst := cls.piece_square_tables.get((piece_type, chess.WHITE, phase))):
+            return mirror_pst(pst)
         raise ValueError(
             f"Piece square table not yet registered for {piece_type}, {color}, {phase} combination"
         )
@@ -33,11 +40,80 @@ class PstFactory:
         piece_type: chess.PieceType,
         color: chess.Color,
         phase: GamePhase,
+        replace: bool = False,
     ):
         key = (piece_type, color, phase)
-        if key in cls.piece_square_tables:
+        if key in cls.piece_square_tables and not replace:
             raise ValueError(f"Piece square table for {key} already registered")
+        if len(pst) != 64:
+            raise ValueError(f"Piece square table for {key} must have 64 entries, got {len(pst)}")
         cls.piece_square_tables[(piece_type, color, phase)] = pst
+        if CompiledPst.is_compiled:
+            CompiledPst.compile()
+
+
+def mirror_pst(pst: List[int]) -> List[int]:
+    """
+    Piece square table for black, given the table for white.
+    """
+    return list(reversed(pst))
+
+
+def pst_index(color: chess.Color, piece_type: chess.PieceType, square: chess.Square) -> int:
+    """
+    Index of a [color][piece_type][square] entry in the flat compiled tables.
+    """
+    return (color * 7 + piece_type) * 64 + square
+
+
+# number of entries in one compiled table, including the unused piece type 0
+PST_SIZE = 2 * 7 * 64
+
+
+class CompiledPst:
+    """
+    Tables compiled from the registered piece square tables and the material values, for fast evaluation.
+    All of them are flat arrays indexed with pst_index, and count black pieces negatively.
+
+    - values_mg, values_eg: material + piece square table value in the middlegame and endgame
+    - blended: for each of the GAME_PHASE_STEPS + 1 quantized game phases q, the table
+      q * values_mg + (GAME_PHASE_STEPS - q) * values_eg, starting at offset q * PST_SIZE.
+      Summing these over the pieces on the board and dividing by GAME_PHASE_STEPS gives
+      the tapered evaluation of the material and piece placement.
+
+    The arrays are allocated once and updated in place, so references to them stay valid
+    when a new table is registered. The functions in on_compile are called after every compilation,
+    to clear caches of scores computed with the previous tables.
+    """
+
+    values_mg = array("l", bytes(PST_SIZE * array("l").itemsize))
+    values_eg = array("l", bytes(PST_SIZE * array("l").itemsize))
+    blended = array("l", bytes((GAME_PHASE_STEPS + 1) * PST_SIZE * array("l").itemsize))
+    is_compiled = False
+    on_compile: List[Callable[[], None]] = []
+
+    @classmethod
+    def compile(cls) -> None:
+        for color in chess.COLORS:
+            sign = 1 if color == chess.WHITE else -1
+            for piece_type in chess.PIECE_TYPES:
+                pst_mg = PstFactory.get_pst(piece_type, color, GamePhase.MIDDLEGAME)
+                pst_eg = PstFactory.get_pst(piece_type, color, GamePhase.ENDGAME)
+                for square in chess.SQUARES:
+                    index = pst_index(color, piece_type, square)
+                    cls.values_mg[index] = sign * (piece_type_to_value_mg[piece_type] + pst_mg[square])
+                    cls.values_eg[index] = sign * (piece_type_to_value_eg[piece_type] + pst_eg[square])
+
+        values_mg, values_eg = cls.values_mg, cls.values_eg
+        for q in range(GAME_PHASE_STEPS + 1):
+            offset = q * PST_SIZE
+            cls.blended[offset : offset + PST_SIZE] = array(
+                "l",
+                [q * mg + (GAME_PHASE_STEPS - q) * eg for mg, eg in zip(values_mg, values_eg)],
+            )
+        cls.is_compiled = True
+        for callback in cls.on_compile:
+            callback()
 
 
 PstFactory.register_pst(white_pawn_mg, chess.PAWN, chess.WHITE, GamePhase.MIDDLEGAME)
@@ -51,17 +127,6 @@ PstFactory.register_pst(white_rook_mg, chess.ROOK, chess.WHITE, GamePhase.MIDDLE
 PstFactory.register_pst(white_queen_mg, chess.QUEEN, chess.WHITE, GamePhase.MIDDLEGAME)
 PstFactory.register_pst(white_king_mg, chess.KING, chess.WHITE, GamePhase.MIDDLEGAME)
 
-PstFactory.register_pst(black_pawn_mg, chess.PAWN, chess.BLACK, GamePhase.MIDDLEGAME)
-PstFactory.register_pst(
-    black_knight_mg, chess.KNIGHT, chess.BLACK, GamePhase.MIDDLEGAME
-)
-PstFactory.register_pst(
-    black_bishop_mg, chess.BISHOP, chess.BLACK, GamePhase.MIDDLEGAME
-)
-PstFactory.register_pst(black_rook_mg, chess.ROOK, chess.BLACK, GamePhase.MIDDLEGAME)
-PstFactory.register_pst(black_queen_mg, chess.QUEEN, chess.BLACK, GamePhase.MIDDLEGAME)
-PstFactory.register_pst(black_king_mg, chess.KING, chess.BLACK, GamePhase.MIDDLEGAME)
-
 PstFactory.register_pst(white_pawn_eg, chess.PAWN, chess.WHITE, GamePhase.ENDGAME)
 PstFactory.register_pst(white_knight_eg, chess.KNIGHT, chess.WHITE, GamePhase.ENDGAME)
 PstFactory.register_pst(white_bishop_eg, chess.BISHOP, chess.WHITE, GamePhase.ENDGAME)
@@ -69,9 +134,4 @@ PstFactory.register_pst(white_rook_eg, chess.ROOK, chess.WHITE, GamePhase.ENDGAM
 PstFactory.register_pst(white_queen_eg, chess.QUEEN, chess.WHITE, GamePhase.ENDGAME)
 PstFactory.register_pst(white_king_eg, chess.KING, chess.WHITE, GamePhase.ENDGAME)
 
-PstFactory.register_pst(black_pawn_eg, chess.PAWN, chess.BLACK, GamePhase.ENDGAME)
-PstFactory.register_pst(black_knight_eg, chess.KNIGHT, chess.BLACK, GamePhase.ENDGAME)
-PstFactory.register_pst(black_bishop_eg, chess.BISHOP, chess.BLACK, GamePhase.ENDGAME)
-PstFactory.register_pst(black_rook_eg, chess.ROOK, chess.BLACK, GamePhase.ENDGAME)
-PstFactory.register_pst(black_queen_eg, chess.QUEEN, chess.BLACK, GamePhase.ENDGAME)
-PstFactory.register_pst(black_king_eg, chess.KING, chess.BLACK, GamePhase.ENDGAME)
+CompiledPst.compile()
@@ -1,121 +1,724 @@
 import chess
-import time
-from evaluation import evaluate
-from typing import List, Literal
-from config import piece_type_to_value_mg, MATE_EVAL
+from dataclasses import dataclass, field
+from book import BookSelection, OpeningBook
+from evaluation import IncrementalEvaluator
+from tablebase import Tablebase, wdl_score
+from position import AnyBoard, Position
+from typing import Callable, Iterator, List, Literal, Optional, Sequence, Tuple
+from config import (piece_type_to_value_mg, MATE_EVAL, INFINITY, ASPIRATION_WINDOW, TT_SIZE_MB,
+                    QUIESCENCE_SEARCH, QUIESCENCE_MAX_NODES, DELTA_MARGIN, MAX_DEPTH, THREADS, ROOT_SPLIT,
+                    NULL_MOVE_PRUNING, NULL_MOVE_REDUCTION, NULL_MOVE_MIN_DEPTH, LATE_MOVE_REDUCTIONS,
+                    LMR_MIN_DEPTH, LMR_FULL_DEPTH_MOVES, FUTILITY_PRUNING, FUTILITY_MAX_DEPTH, FUTILITY_MARGIN,
+                    OWN_BOOK, BOOK_FILE, BOOK_SELECTION, BOOK_MAX_PLY, SYZYGY_PATH, SYZYGY_PROBE_LIMIT,
+                    TB_WIN_SCORE, CUTOFF_MOVE_SLOTS)
+from transposition import TranspositionTable, Bound
+from heuristics import KillerMoves, HistoryTable
+from time_manager import TimeManager, SearchLimits, SearchAborted
 
 
-def next_move(board: chess.Board, depth: int, debug=True) -> chess.Move:
+@dataclass
+class SearchResult:
+    """
+    Outcome of a search: the best move from the deepest completed iteration
+    and its score from the point of view of the side to move
+    """
+
+    move: chess.Move
+    score: int
+    depth: int
+    nodes: int
+    time: float
+    # principal variation, starting with move
+    pv: List[chess.Move] = field(default_factory=list)
+
+
+@dataclass
+class SearchStats:
+    """
+    Counters collected while searching
+    """
+
+    nodes: int = 0
+    qnodes: int = 0
+    # beta cutoffs in the main search, and how many came from the first, second, ... move searched
+    # (the last slot counts every later move)
+    cutoffs: int = 0
+    cutoffs_by_move: List[int] = field(default_factory=lambda: [0] * CUTOFF_MOVE_SLOTS)
+    # selective search: null move searches failing high, moves searched with reduced depth,
+    # and nodes or moves cut by futility pruning
+    null_move_cutoffs: int = 0
+    reduced_moves: int = 0
+    futility_prunes: int = 0
+    # nodes resolved by a tablebase probe
+    tb_hits: int = 0
+
+    @property
+    def first_move_cutoffs(self) -> int:
+        return self.cutoffs_by_move[0]
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def reset(self) -> None:
+        for name, value in vars(SearchStats()).items():
+            setattr(self, name, value)
+
+
+@dataclass
+class SearchOptions:
+    """
+    Switches and parameters of optional search features, so they can be turned off or tuned
+    for benchmarking. Defaults are taken from config.py.
+    """
+
+    threads: int = THREADS
+    root_split: bool = ROOT_SPLIT
+    quiescence: bool = QUIESCENCE_SEARCH
+    quiescence_max_nodes: int = QUIESCENCE_MAX_NODES
+    delta_margin: int = DELTA_MARGIN
+    null_move: bool = NULL_MOVE_PRUNING
+    null_move_reduction: int = NULL_MOVE_REDUCTION
+    null_move_min_depth: int = NULL_MOVE_MIN_DEPTH
+    late_move_reductions: bool = LATE_MOVE_REDUCTIONS
+    lmr_min_depth: int = LMR_MIN_DEPTH
+    lmr_full_depth_moves: int = LMR_FULL_DEPTH_MOVES
+    futility: bool = FUTILITY_PRUNING
+    futility_max_depth: int = FUTILITY_MAX_DEPTH
+    futility_margin: int = FUTILITY_MARGIN
+    own_book: bool = OWN_BOOK
+    book_file: Optional[str] = BOOK_FILE
+    book_selection: str = BOOK_SELECTION
+    book_max_ply: int = BOOK_MAX_PLY
+    syzygy_path: Optional[str] = SYZYGY_PATH
+    syzygy_probe_limit: int = SYZYGY_PROBE_LIMIT
+
+
+# The transposition table is kept between calls to next_move, so later moves of a game
+# can reuse the work done while searching earlier ones.
+transposition_table = TranspositionTable(TT_SIZE_MB)
+time_manager = TimeManager()
+killers = KillerMoves(MAX_DEPTH)
+history = HistoryTable()
+stats = SearchStats()
+options = SearchOptions()
+# opened on first use from options.book_file and options.syzygy_path
+book: Optional[OpeningBook] = None
+tablebase: Optional[Tablebase] = None
+
+# how many nodes are searched between two checks of the clock
+TIME_CHECK_INTERVAL = 1024
+
+# Mate scores are MATE_EVAL minus the distance to mate in plies, so faster mates score higher.
+# Any score beyond MATE_THRESHOLD is a mate score.
+MATE_THRESHOLD = MATE_EVAL - 1000
+# Tablebase wins are TB_WIN_SCORE minus the distance to the tablebase position in plies, and like mate
+# scores depend on the ply. Any score beyond TB_THRESHOLD is a tablebase or mate score.
+TB_THRESHOLD = TB_WIN_SCORE - 1000
+
+
+def next_move(
+    board: chess.Board, depth: int, debug=False, limits: Optional[SearchLimits] = None
+) -> chess.Move:
     """
     Parameters:
         board (chess.Board): chess.Board object representing current state of board
-        depth (int): tree depth of negamax search algorithm
+        depth (int): maximum tree depth of negamax search algorithm
+        debug (bool): print the time taken
+        limits (SearchLimits, optional): time limits for the search
 
     Returns:
         chess.Move: optimal move found
     """
-    t0 = time.time()
-    if board.turn == chess.WHITE:
-        move = negamax_root(board, depth, -float("inf"), float("inf"), 1)
-    else:
-        move = negamax_root(board, depth, -float("inf"), float("inf"), -1)
+    result = run_search(board, depth, limits)
     if debug:
-        print(f"elapsed time: {(time.time() - t0):.2f} seconds")
-    return move
+        print(f"elapsed time: {result.time:.2f} seconds")
+    return result.move
 
 
-def negamax_root(
+def run_search(
     board: chess.Board,
     depth: int,
-    alpha: float,
-    beta: float,
+    limits: Optional[SearchLimits] = None,
+    on_iteration: Optional[Callable[[SearchResult], None]] = None,
+) -> SearchResult:
+    """
+    Search the position, with the search mode set by the options.
+
+    If options.threads is more than 1, the search runs in parallel worker processes: with lazy SMP,
+    or by splitting the root moves across a process pool if options.root_split is set and the search
+    has no time limits.
+
+    on_iteration, if given, is called with the result of every completed iteration
+    (with root splitting, only with the final result).
+
+    If options.own_book is set, a move from the opening book is played without searching, and with
+    options.syzygy_path set, positions in the tablebases are answered from the DTZ tables, except
+    in infinite analysis. Such results have depth 0.
+    """
+    # opened here rather than in each worker process, so a path which cannot be opened is reported once
+    update_tablebase()
+    if not (limits and limits.infinite):
+        if move := book_move(board):
+            return SearchResult(move, 0, 0, 0, 0.0, [move])
+        if tablebase is not None and (root := tablebase.root_move(board)):
+            move, wdl = root
+            return SearchResult(move, wdl_score(wdl, 0), 0, 0, 0.0, [move])
+    if options.threads > 1:
+        # imported here as the parallel module itself builds on this one
+        from parallel import lazy_smp_search, root_split_search
+
+        limited = limits and (limits.is_timed or limits.infinite or limits.ponder or limits.nodes)
+        if options.root_split and not limited:
+            result = root_split_search(board, depth, options.threads)
+            if on_iteration:
+                on_iteration(result)
+            return result
+        return lazy_smp_search(board, depth, limits, options.threads, on_iteration)
+    return iterative_deepening(board, depth, limits, on_iteration=on_iteration)
+
+
+def book_move(board: chess.Board) -> Optional[chess.Move]:
+    """
+    Move from the opening book set in the options, or None if the position is not in the book
+    or the book is switched off. A book which cannot be opened is reported, and switched off.
+    """
+    global book
+    if not options.own_book or not options.book_file:
+        return None
+    if book is None or book.path != options.book_file:
+        if book is not None:
+            book.close()
+            book = None
+        try:
+            book = OpeningBook(options.book_file)
+        except OSError as error:
+            print(f"info string cannot open book {options.book_file}: {error}", flush=True)
+            options.own_book = False
+            return None
+    book.selection = BookSelection(options.book_selection)
+    book.max_ply = options.book_max_ply
+    return book.probe(board)
+
+
+def update_tablebase() -> None:
+    """
+    Open, close or reopen the tablebases to match options.syzygy_path.
+    A path which cannot be opened is reported, and probing switched off.
+    """
+    global tablebase
+    if tablebase is not None and tablebase.path != options.syzygy_path:
+        tablebase.close()
+        tablebase = None
+    if tablebase is None and options.syzygy_path:
+        try:
+            tablebase = Tablebase(options.syzygy_path)
+        except OSError as error:
+            print(f"info string cannot open tablebases {options.syzygy_path}: {error}", flush=True)
+            options.syzygy_path = None
+    if tablebase is not None:
+        tablebase.max_pieces = min(options.syzygy_probe_limit, tablebase.largest)
+
+
+def iterative_deepening(
+    board: AnyBoard,
+    depth: int,
+    limits: Optional[SearchLimits] = None,
+    start_depth: int = 1,
+    on_iteration: Optional[Callable[[SearchResult], None]] = None,
+) -> SearchResult:
+    """
+    Search to depth start_depth, start_depth + 1, ... up to the given depth, or until the time manager
+    runs out of time. The best move of each iteration is searched first in the next one.
+    If an iteration is aborted, the result of the last completed iteration is returned.
+
+    on_iteration, if given, is called with the result of every completed iteration.
+    The search runs on a Position converted from the board, so the board itself is left untouched.
+
+    From the second iteration on, the root is searched with an aspiration window around the score of the
+    previous iteration. A score outside the window is re-searched with the window widened on that side.
+    """
+    position = board if isinstance(board, Position) else Position.from_board(board)
+    transposition_table.new_search()
+    killers.clear()
+    history.age()
+    time_manager.start(limits or SearchLimits(), board.turn)
+    stats.reset()
+    update_tablebase()
+    color: Literal[1, -1] = 1 if position.turn == chess.WHITE else -1
+    ply = len(position.move_stack)
+    result: Optional[SearchResult] = None
+
+    for current_depth in range(start_depth, depth + 1):
+        if result and not time_manager.can_start_iteration(stats.nodes):
+            break
+        evaluator = IncrementalEvaluator(position)
+        window = ASPIRATION_WINDOW
+        if result and abs(result.score) < MATE_THRESHOLD:
+            alpha, beta = result.score - window, result.score + window
+        else:
+            alpha, beta = -INFINITY, INFINITY
+        pv_move = result.move if result else None
+        try:
+            while True:
+                move, score = negamax_root(position, current_depth, alpha, beta, color, evaluator, pv_move)
+                if alpha < score < beta:
+                    break
+                window *= 4
+                if score <= alpha:
+                    alpha = max(score - window, -INFINITY)
+                else:
+                    beta = min(score + window, INFINITY)
+                    pv_move = move
+        except SearchAborted:
+            while len(position.move_stack) > ply:
+                position.pop()
+            break
+        pv = principal_variation(position, move, current_depth)
+        result = SearchResult(move, score, current_depth, stats.nodes, time_manager.elapsed(), pv)
+        time_manager.can_abort = True
+        if on_iteration:
+            on_iteration(result)
+
+    if result is None:
+        raise ValueError(f"Cannot search to depth {depth}")
+    return result
+
+
+def principal_variation(board: Position, move: chess.Move, depth: int) -> List[chess.Move]:
+    """
+    The expected line of play from the root: the given root move, followed by the best moves
+    stored in the transposition table, up to depth moves.
+    """
+    pv = [move]
+    board.push(move)
+    while len(pv) < depth and not board.is_repetition(2):
+        entry = transposition_table.probe(board.key)
+        if not entry or not entry.move or not board.is_legal(entry.move):
+            break
+        pv.append(entry.move)
+        board.push(entry.move)
+    for _ in pv:
+        board.pop()
+    return pv
+
+
+def negamax_root(
+    board: Position,
+    depth: int,
+    alpha: int,
+    beta: int,
     color: Literal[1, -1],
-) -> chess.Move:
+    evaluator: IncrementalEvaluator,
+    pv_move: Optional[chess.Move] = None,
+) -> Tuple[chess.Move, int]:
     """
-    Root function for negamax algorithm
+    Root function for negamax algorithm.
+    The principal variation move from the previous iteration, if given, is searched first,
+    and the other moves as in negamax, with a null window first.
+
+    Returns
+        Tuple[chess.Move, int]: best move and its evaluation. An evaluation outside (alpha, beta)
+        is only a bound on the true value.
     """
-    optimal_value = -float("inf")
-    for move in sort_moves(board):
+    key = board.key
+    if pv_move is None and (entry := transposition_table.probe(key)):
+        pv_move = entry.move
+
+    alpha_orig = alpha
+    optimal_value = -INFINITY
+    for move_index, move in enumerate(staged_moves(board, pv_move)):
+        evaluator.push(board, move)
         board.push(move)
-        value = -negamax(board, depth - 1, -beta, -alpha, -color)
+        value = pvs_child(board, depth, alpha, beta, color, evaluator, 1, move_index)
         board.pop()
+        evaluator.pop()
         if value > optimal_value:
             optimal_value = value
             best_move = move
         alpha = max(optimal_value, alpha)
-        if alpha > beta:
+        if alpha >= beta:
             break
-    return best_move
+    transposition_table.store(key, depth, optimal_value, score_bound(optimal_value, alpha_orig, beta), best_move)
+    return best_move, optimal_value
 
 
 def negamax(
-    board: chess.Board,
+    board: Position,
     depth: int,
-    alpha: float,
-    beta: float,
+    alpha: int,
+    beta: int,
     color: Literal[1, -1],
-) -> float:
+    evaluator: IncrementalEvaluator,
+    ply: int,
+) -> int:
     """
-    Implementation of negamax algorithm with alpha-beta pruning
+    Implementation of negamax algorithm with alpha-beta pruning, as a principal variation search:
+    the first move is searched with the full window, the others only with a null window proving that
+    they are no better, and searched again with the full window if they are.
     https://en.wikipedia.org/wiki/Negamax
+    https://www.chessprogramming.org/Principal_Variation_Search
+
+    The evaluator must be kept in sync with the board: every board.push/pop
+    is paired with evaluator.push/pop. ply is the distance from the root.
+
+    Quiet moves causing a beta cutoff are recorded in the killer and history tables,
+    which order the quiet moves of later nodes.
+
+    A repeated position, the fifty-move rule and insufficient material score as draws. Being checkmated
+    scores -MATE_EVAL plus the distance to the root, so that the engine prefers the fastest mate.
+    Positions in the tablebases are scored from their WDL value.
+
+    Selective search, switched and tuned with options, and never applied when in check:
+    - reverse futility pruning: near the leaves and outside the principal variation, a static evaluation
+      far enough above beta is returned as is
+    - null-move pruning: if passing still fails high on a reduced search, a real move almost surely would.
+      Skipped when the side to move has only pawns, where passing may be better than any move (zugzwang)
+    - futility pruning: near the leaves, with a static evaluation far enough below alpha,
+      quiet moves which do not give check are skipped after the first move
+    - late move reductions: quiet moves late in the move order are searched with reduced depth first,
+      and only searched again to full depth if they beat alpha
 
     Returns
-        float: evaluation of position
+        int: evaluation of position
     """
-    if outcome := board.outcome():
-        if outcome.termination == chess.Termination.CHECKMATE:
-            if outcome.winner == chess.WHITE:
-                return color * MATE_EVAL
-            else:
-                return -color * MATE_EVAL
-        else:
-            return 0
+    stats.nodes += 1
+    if stats.nodes % TIME_CHECK_INTERVAL == 0 and time_manager.time_up(stats.nodes):
+        raise SearchAborted
+
+    # draws which need no move generation; checkmate and stalemate are found below,
+    # when the move generator has no legal move to yield
+    if board.halfmove_clock >= 100 or board.is_repetition(2) or board.is_insufficient_material():
+        return 0
+
+    # WDL values are only exact right after a capture or pawn move
+    if tablebase is not None and board.halfmove_clock == 0 and tablebase.can_probe(board):
+        wdl = tablebase.probe_wdl(board, board.key)
+        if wdl is not None:
+            stats.tb_hits += 1
+            return wdl_score(wdl, ply)
 
     if depth == 0:
-        return color * evaluate(board)
+        if options.quiescence:
+            stats.nodes -= 1  # counted again as a quiescence node
+            node_limit = stats.qnodes + options.quiescence_max_nodes
+            return quiescence(board, alpha, beta, color, evaluator, node_limit, ply)
+        if not any(board.generate_legal_moves()):
+            return -MATE_EVAL + ply if board.is_check() else 0
+        return color * evaluator.evaluate(board)
+
+    # probe the transposition table: a deep enough entry can narrow the window or end the search,
+    # and a stored best move is searched first
+    alpha_orig = alpha
+    key = board.key
+    hash_move = None
+    if entry := transposition_table.probe(key):
+        hash_move = entry.move
+        if entry.depth >= depth:
+            score = score_from_tt(entry.score, ply)
+            if entry.bound == Bound.EXACT:
+                return score
+            elif entry.bound == Bound.LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score
 
-    value = -float("inf")
-    for move in sort_moves(board):
+    in_check = board.is_check()
+    near_leaves = options.futility and depth <= options.futility_max_depth
+    static_eval: Optional[int] = None
+    if (
+        not in_check
+        and abs(beta) < MATE_THRESHOLD
+        and (near_leaves or (options.null_move and depth >= options.null_move_min_depth))
+    ):
+        static_eval = color * evaluator.evaluate(board)
+        if near_leaves and beta - alpha == 1 and static_eval - options.futility_margin * depth >= beta:
+            stats.futility_prunes += 1
+            return static_eval
+        if (
+            options.null_move
+            and depth >= options.null_move_min_depth
+            and static_eval >= beta
+            and board.move_stack
+            and board.move_stack[-1]
+            and board.occupied_co[board.turn] & ~(board.pawns | board.kings)
+        ):
+            evaluator.push(board, chess.Move.null())
+            board.push(chess.Move.null())
+            null_depth = max(depth - 1 - options.null_move_reduction, 0)
+            score = -negamax(board, null_depth, -beta, -beta + 1, -color, evaluator, ply + 1)
+            board.pop()
+            evaluator.pop()
+            if score >= beta:
+                stats.null_move_cutoffs += 1
+                # a mate found after passing is not a proven mate
+                return beta if score >= MATE_THRESHOLD else score
+
+    futility_value = -INFINITY
+    if near_leaves and static_eval is not None and static_eval + options.futility_margin * depth <= alpha:
+        futility_value = static_eval + options.futility_margin * depth
+    reduce = options.late_move_reductions and depth >= options.lmr_min_depth and not in_check
+
+    value = -INFINITY
+    best_move = None
+    searched = 0
+    moves = staged_moves(board, hash_move, killers.get(ply), history)
+    for move in moves:
+        quiet = not move.promotion and not board.is_capture(move)
+        evaluator.push(board, move)
         board.push(move)
-        value = max(value, -negamax(board, depth - 1, -beta, -alpha, -color))
+        gives_check = quiet and searched and (futility_value > -INFINITY or reduce) and board.is_check()
+        if quiet and searched and futility_value > -INFINITY and not gives_check:
+            board.pop()
+            evaluator.pop()
+            stats.futility_prunes += 1
+            value = max(value, futility_value)
+            continue
+        reduction = 0
+        if reduce and quiet and searched >= options.lmr_full_depth_moves and not gives_check:
+            reduction = 1
+            stats.reduced_moves += 1
+        score = pvs_child(board, depth, alpha, beta, color, evaluator, ply + 1, searched, reduction)
+        board.pop()
+        evaluator.pop()
+        searched += 1
+        if score > value:
+            value = score
+            best_move = move
         alpha = max(alpha, value)
+        if alpha >= beta:
+            stats.cutoffs += 1
+            stats.cutoffs_by_move[min(searched, CUTOFF_MOVE_SLOTS) - 1] += 1
+            if quiet:
+                killers.add(ply, move)
+                history.update(board.turn, move, depth)
+            break
+
+    if best_move is None:
+        # no legal move: checkmate or stalemate
+        return -MATE_EVAL + ply if board.is_check() else 0
+
+    bound = score_bound(value, alpha_orig, beta)
+    transposition_table.store(key, depth, score_to_tt(value, ply), bound, best_move)
+    return value
+
+
+def pvs_child(
+    board: Position,
+    depth: int,
+    alpha: int,
+    beta: int,
+    color: Literal[1, -1],
+    evaluator: IncrementalEvaluator,
+    ply: int,
+    move_index: int,
+    reduction: int = 0,
+) -> int:
+    """
+    Score of the move just pushed, which is the move_index-th move searched at a node of the given depth.
+    With a reduction, the null window search is first done that many plies shallower.
+
+    Returns
+        int: the score from the point of view of the side which made the move
+    """
+    if move_index == 0:
+        return -negamax(board, depth - 1, -beta, -alpha, -color, evaluator, ply)
+    score = -negamax(board, depth - 1 - reduction, -alpha - 1, -alpha, -color, evaluator, ply)
+    if reduction and score > alpha:
+        score = -negamax(board, depth - 1, -alpha - 1, -alpha, -color, evaluator, ply)
+    if alpha < score < beta:
+        score = -negamax(board, depth - 1, -beta, -alpha, -color, evaluator, ply)
+    return score
+
+
+def score_bound(score: int, alpha: int, beta: int) -> Bound:
+    """
+    How a score returned by a search with the window (alpha, beta) relates to the true value.
+    """
+    if score <= alpha:
+        return Bound.UPPER
+    if score >= beta:
+        return Bound.LOWER
+    return Bound.EXACT
+
+
+def score_to_tt(score: int, ply: int) -> int:
+    """
+    Mate and tablebase scores are stored in the transposition table as the distance to mate (or to the
+    tablebase position) from the stored node, rather than from the root, so they stay correct when the
+    node is reached at a different ply.
+    """
+    if score > TB_THRESHOLD:
+        return score + ply
+    if score < -TB_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int) -> int:
+    """
+    Inverse of score_to_tt: the distance to mate (or to the tablebase position) of a stored score,
+    seen from the root.
+    """
+    if score > TB_THRESHOLD:
+        return score - ply
+    if score < -TB_THRESHOLD:
+        return score + ply
+    return score
+
+
+def quiescence(
+    board: AnyBoard,
+    alpha: int,
+    beta: int,
+    color: Literal[1, -1],
+    evaluator: IncrementalEvaluator,
+    node_limit: int,
+    ply: int = 0,
+) -> int:
+    """
+    Quiescence search: at the leaves of the main search, keep searching captures and promotions
+    until the position is quiet, so that the static evaluation is not taken in the middle of an exchange.
+    https://www.chessprogramming.org/Quiescence_Search
+
+    - stand pat: the side to move can decline all captures, so the static evaluation is a lower bound
+    - delta pruning: captures which cannot raise the score to alpha even with a safety margin are skipped
+    - once node_limit quiescence nodes have been searched, the static evaluation is returned
+
+    When in check, all evasions are searched instead, as standing pat is not an option.
+    ply is the distance from the root, for the distance to mate.
+
+    Returns
+        int: evaluation of position
+    """
+    stats.nodes += 1
+    stats.qnodes += 1
+    if stats.nodes % TIME_CHECK_INTERVAL == 0 and time_manager.time_up(stats.nodes):
+        raise SearchAborted
+
+    if board.is_check():
+        moves = list(staged_moves(board))
+        if not moves:
+            return -MATE_EVAL + ply
+        stand_pat = -INFINITY
+    else:
+        stand_pat = color * evaluator.evaluate(board)
+        if stand_pat >= beta or stats.qnodes >= node_limit:
+            return stand_pat
+        # even winning a queen for free would not bring the score up to alpha
+        if stand_pat + piece_type_to_value_mg[chess.QUEEN] + options.delta_margin < alpha:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        moves = sort_captures(board)
+
+    value = stand_pat
+    for move in moves:
+        if stats.qnodes >= node_limit and value > -INFINITY:
+            break
+        if stand_pat > -INFINITY:
+            gain = capture_value(board, move)
+            if move.promotion:
+                gain += piece_type_to_value_mg[move.promotion] - piece_type_to_value_mg[chess.PAWN]
+            if stand_pat + gain + options.delta_margin < alpha:
+                continue
+        evaluator.push(board, move)
+        board.push(move)
+        score = -quiescence(board, -beta, -alpha, -color, evaluator, node_limit, ply + 1)
         board.pop()
+        evaluator.pop()
+        value = max(value, score)
+        alpha = max(alpha, value)
         if alpha >= beta:
             break
     return value
 
 
-def sort_moves(board: chess.Board) -> List[chess.Move]:
+def sort_captures(board: AnyBoard) -> List[chess.Move]:
     """
-    Sort all the legal moves given the current board.
-    Captures > non-captures.
-    To sort the captures, we use the Most Valuable Victim - Least Valuable Aggressor (MVV-LVA) heuristic.
+    Legal captures and queen promotions, for the quiescence search.
+    Promotions come first, then captures sorted with MVV-LVA.
     """
-    captures, non_captures = [], []
+    captures = sorted(
+        board.generate_legal_captures(), key=lambda x: mvv_lva(board, x), reverse=True
+    )
+    pawns = board.pawns & board.occupied_co[board.turn]
+    seventh_rank = chess.BB_RANK_7 if board.turn == chess.WHITE else chess.BB_RANK_2
+    promotions = [
+        move
+        for move in board.generate_legal_moves(pawns & seventh_rank, ~board.occupied)
+        if move.promotion == chess.QUEEN
+    ]
+    return promotions + captures
 
-    for move in board.legal_moves:
-        if board.is_capture(move):
-            captures.append(move)
-        else:
-            non_captures.append(move)
 
-    if captures:
-        captures = sorted(captures, key=lambda x: mvv_lva(board, x), reverse=True)
+def capture_value(board: AnyBoard, move: chess.Move) -> int:
+    """
+    Middlegame material value of the piece captured by a move, 0 for a non-capture.
+    """
+    if board.is_en_passant(move):
+        return piece_type_to_value_mg[chess.PAWN]
+    victim = board.piece_type_at(move.to_square)
+    return piece_type_to_value_mg[victim] if victim else 0
 
-    return captures + non_captures
 
+def staged_moves(
+    board: AnyBoard,
+    hash_move: Optional[chess.Move] = None,
+    killers: Sequence[chess.Move] = (),
+    history: Optional[HistoryTable] = None,
+) -> Iterator[chess.Move]:
+    """
+    Lazily yield all the legal moves given the current board, in stages:
+    1. the hash move (from the transposition table or the previous iteration)
+    2. captures and queen promotions, sorted with the Most Valuable Victim - Least Valuable Aggressor
+       (MVV-LVA) heuristic
+    3. killer moves
+    4. quiet moves, sorted by their history score if a history table is given
 
-def mvv_lva(board: chess.Board, move: chess.Move) -> int:
+    A stage is only generated once the search asks for its first move,
+    so a beta cutoff on an early move saves the cost of generating the rest.
+    """
+    if hash_move and board.is_legal(hash_move):
+        yield hash_move
+    else:
+        hash_move = None
+
+    for move in sort_captures(board):
+        if move != hash_move:
+            yield move
+
+    searched_killers = []
+    for move in killers:
+        if move != hash_move and not board.is_capture(move) and board.is_legal(move):
+            searched_killers.append(move)
+            yield move
+
+    ep_square = board.ep_square
+    quiets = []
+    for move in board.generate_legal_moves(chess.BB_ALL, ~board.occupied_co[not board.turn]):
+        if move == hash_move or move.promotion == chess.QUEEN or move in searched_killers:
+            continue
+        if move.to_square == ep_square and board.is_en_passant(move):
+            continue
+        quiets.append(move)
+    if history:
+        scores = history.scores[board.turn]
+        quiets.sort(key=lambda x: scores[x.from_square * 64 + x.to_square], reverse=True)
+    yield from quiets
+
+
+def mvv_lva(board: AnyBoard, move: chess.Move) -> int:
     """
     calculate the value of a capture using MVV-LVA
     the higher the value, the better
     """
     if board.is_en_passant(move):
         return 0
-    aggressor = board.piece_at(move.from_square)
-    victim = board.piece_at(move.to_square)
-    val = (
-        piece_type_to_value_mg[victim.piece_type]
-        - piece_type_to_value_mg[aggressor.piece_type]
-    )
+    aggressor = board.piece_type_at(move.from_square)
+    victim = board.piece_type_at(move.to_square)
+    if aggressor is None or victim is None:
+        return 0
+    val = piece_type_to_value_mg[victim] - piece_type_to_value_mg[aggressor]
     return val
@@ -0,0 +1,128 @@
+"""
+Syzygy endgame tablebase probing: https://www.chessprogramming.org/Syzygy_Bases
+
+WDL (win/draw/loss) tables are probed at interior nodes of the search, and DTZ (distance to
+zeroing move) tables at the root to pick a move which makes progress. Probing goes through
+chess.syzygy, which only works on a chess.Board, so results are cached by Zobrist key in an
+LRU cache: transpositions are common in endgames, and a cache hit skips the conversion.
+"""
+
+import chess
+import chess.syzygy
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+from config import SYZYGY_PROBE_LIMIT, SYZYGY_CACHE_SIZE, TB_WIN_SCORE
+from position import AnyBoard
+
+
+class Tablebase:
+    """
+    The Syzygy tables found in one or more directories (separated by os.pathsep),
+    probed for positions with at most probe_limit pieces.
+    """
+
+    def __init__(
+        self, path: str, probe_limit: int = SYZYGY_PROBE_LIMIT, cache_size: int = SYZYGY_CACHE_SIZE
+    ):
+        self.path = path
+        self.tablebase = chess.syzygy.Tablebase()
+        for directory in path.split(os.pathsep):
+            if directory:
+                self.tablebase.add_directory(directory)
+        # table names are the pieces of both sides, e.g. KQvK
+        self.largest = max((len(name) - 1 for name in self.tablebase.wdl), default=0)
+        self.max_pieces = min(probe_limit, self.largest)
+        self.cache_size = cache_size
+        self.cache: OrderedDict[int, Optional[int]] = OrderedDict()
+        self.hits = self.misses = 0
+
+    def can_probe(self, board: AnyBoard) -> bool:
+        """
+        Whether the position may be in the tables: few enough pieces and no castling rights.
+        """
+        return chess.popcount(board.occupied) <= self.max_pieces and not board.castling_rights
+
+    def probe_wdl(self, board: AnyBoard, key: int) -> Optional[int]:
+        """
+        WDL value of the position for the side to move, or None if it is not in the tables:
+        2 win, 1 win but drawn by the fifty-move rule, 0 draw, -1 loss but drawn by the fifty-move rule, -2 loss.
+        Only exact if the position was reached directly after a capture or pawn move.
+
+        Parameters:
+            key (int): Zobrist key of the position, which the result is cached under
+        """
+        cache = self.cache
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+        self.misses += 1
+        wdl = self.tablebase.get_wdl(to_board(board))
+        cache[key] = wdl
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return wdl
+
+    def root_move(self, board: AnyBoard) -> Optional[Tuple[chess.Move, int]]:
+        """
+        Best move at the root according to the DTZ tables, with its WDL value for the side to move.
+        A winning move is the one reaching the next capture or pawn move soonest, so the win is not lost
+        to the fifty-move rule; a losing move is the one delaying it the longest.
+
+        Returns None if the position or a position after a move is not in the tables.
+        """
+        if not self.can_probe(board):
+            return None
+        board = to_board(board)
+        best, best_rank = None, None
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                wdl = self.tablebase.get_wdl(board)
+                dtz = self.tablebase.get_dtz(board)
+            finally:
+                board.pop()
+            if wdl is None or dtz is None:
+                return None
+            # the values are for the opponent, who is to move after the move
+            wdl = -wdl
+            rank = (wdl, -abs(dtz) if wdl > 0 else abs(dtz))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (move, wdl), rank
+        return best
+
+    def close(self) -> None:
+        self.tablebase.close()
+
+
+def wdl_score(wdl: int, ply: int) -> int:
+    """
+    Search score of a WDL value: wins are scored below mate scores but above any evaluation,
+    sooner wins higher, and wins or losses drawn by the fifty-move rule as draws.
+    """
+    if wdl == 2:
+        return TB_WIN_SCORE - ply
+    if wdl == -2:
+        return -TB_WIN_SCORE + ply
+    return 0
+
+
+def to_board(board: AnyBoard) -> chess.Board:
+    """
+    chess.Board with the pieces, side to move and move counters of the position, without the move history,
+    which would take replaying every move of the game.
+    """
+    if isinstance(board, chess.Board):
+        return board
+    result = chess.Board(None)
+    for color in chess.COLORS:
+        for piece_type in chess.PIECE_TYPES:
+            for square in chess.scan_forward(board.pieces[piece_type] & board.occupied_co[color]):
+                result.set_piece_at(square, chess.Piece(piece_type, color))
+    result.turn = board.turn
+    result.castling_rights = board.castling_rights
+    result.ep_square = board.ep_square
+    result.halfmove_clock = board.halfmove_clock
+    result.fullmove_number = board.fullmove_number
+    return result
@@ -0,0 +1,52 @@
+import pytest
+import io
+import json
+import chess
+from batch import run_batch, parse_position, count_checkpointed
+
+POSITIONS = [
+    "# tactics",
+    "3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1",
+    "",
+    '3kr3/8/8/5n2/8/8/2R3K1/8 b - - id "fork.black";',
+    "rnbqkbnr/pppp1ppp/8/4p3/6P1/5P2/PPPPP2P/RNBQKBNR b KQkq - 0 2",
+    "not a position",
+    "7k/5QQ1/8/8/8/8/8/6K1 b - - 0 1",
+]
+
+
+class TestBatch:
+
+    def test_parse_position(self):
+        board, operations = parse_position("3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1")
+        assert board == chess.Board("3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1")
+        assert operations == {}
+        board, operations = parse_position('3kr3/8/8/5n2/8/8/2R3K1/8 b - - bm Ne3; id "fork";')
+        assert board.turn == chess.BLACK
+        assert operations["id"] == "fork"
+
+    def test_results_in_input_order(self):
+        output = io.StringIO()
+        assert run_batch(POSITIONS, output, depth=2, workers=2, max_pending=2) == 5
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert [record["index"] for record in records] == [0, 1, 2, 3, 4]
+        assert records[0]["bestmove"] == "g5f7"
+        assert records[1]["bestmove"] == "f5e3"
+        assert records[1]["id"] == "fork.black"
+        assert records[2]["bestmove"] == "d8h4"
+        assert "error" in records[3]
+        assert records[4]["error"].startswith("game over")
+        assert all(record["nodes"] > 0 and record["depth"] == 2 for record in records[:3])
+
+    def test_resume(self, tmp_path):
+        output_path = tmp_path / "results.jsonl"
+        with open(output_path, "w") as output:
+            run_batch(POSITIONS[:3], output, depth=1)
+            # simulate a run interrupted while writing a result
+            output.write('{"index": 1, "posi')
+        skip = count_checkpointed(str(output_path))
+        assert skip == 1
+        with open(output_path, "a") as output:
+            assert run_batch(POSITIONS, output, depth=1, skip=skip) == 4
+        records = [json.loads(line) for line in output_path.read_text().splitlines()]
+        assert [record["index"] for record in records] == [0, 1, 2, 3, 4]
@@ -0,0 +1,28 @@
+import chess
+import batch_evaluation
+from batch_evaluation import evaluate_batch, pack_boards
+from evaluation import evaluate
+from tests.test_evaluation import random_games
+
+
+class TestEvaluateBatch:
+
+    def test_matches_evaluate(self):
+        boards = [board.copy() for board, _ in random_games(num_games=20, max_plies=150, seed=2)]
+        scores = evaluate_batch(boards)
+        assert scores.shape == (len(boards),)
+        assert scores.tolist() == [evaluate(board) for board in boards]
+
+    def test_chunks(self, monkeypatch, starting_position):
+        monkeypatch.setattr(batch_evaluation, "CHUNK_SIZE", 3)
+        boards = [starting_position, chess.Board("2r1q3/1k6/8/8/8/8/3K4/3R4 w - - 0 1")] * 4
+        assert evaluate_batch(boards).tolist() == [evaluate(board) for board in boards]
+
+    def test_empty(self):
+        assert evaluate_batch([]).shape == (0,)
+
+    def test_pack_boards(self, starting_position):
+        packed = pack_boards([starting_position])
+        assert packed.shape == (1, 2, 6)
+        assert int(packed[0, 1, chess.PAWN - 1]) == chess.BB_RANK_2
+        assert int(packed[0, 0, chess.KING - 1]) == chess.BB_E8
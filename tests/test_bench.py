@@ -0,0 +1,37 @@
+import pytest
+import json
+from bench import run_bench, format_bench, BENCH_POSITIONS
+from config import BENCH_DEPTH, BENCH_SIGNATURE
+
+
+class TestBench:
+
+    def test_signature_is_deterministic(self):
+        first = run_bench(2, BENCH_POSITIONS[:4])
+        second = run_bench(2, BENCH_POSITIONS[:4])
+        assert first.signature == second.signature > 0
+        assert [p.bestmove for p in first.positions] == [p.bestmove for p in second.positions]
+
+    def test_signature(self):
+        # if the search or evaluation changed on purpose, update BENCH_SIGNATURE in config.py
+        assert run_bench(BENCH_DEPTH).signature == BENCH_SIGNATURE
+
+    def test_report(self):
+        result = run_bench(2, BENCH_POSITIONS[:2])
+        position = result.positions[0]
+        assert len(position.time_to_depth) == len(position.nodes_per_depth) == 2
+        assert sum(position.nodes_per_depth) == position.nodes
+        assert result.effective_branching_factor > 1
+        assert result.nps > 0
+        data = json.loads(json.dumps(result.to_dict()))
+        assert data["signature"] == result.total_nodes
+        assert len(data["positions"]) == 2
+        assert f"Signature: {result.signature}" in format_bench(result)
+
+    def test_instrumented(self):
+        result = run_bench(2, BENCH_POSITIONS[:2], instrumented=True)
+        assert result.signature == run_bench(2, BENCH_POSITIONS[:2]).signature
+        assert result.counters.evaluations > 0 and result.counters.tt_probes > 0
+        assert sum(result.cutoffs_by_move) > 0
+        assert "Evaluations: " in format_bench(result)
+        assert json.loads(json.dumps(result.to_dict()))["counters"]["move_generations"] > 0
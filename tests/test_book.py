@@ -0,0 +1,89 @@
+import pytest
+import struct
+import time
+import chess
+import chess.polyglot
+import search
+from book import BookSelection, OpeningBook
+from search import next_move
+
+
+def write_book(path, entries) -> str:
+    """
+    Write a Polyglot book with the given (fen, uci move, weight) entries.
+    """
+    rows = []
+    for fen, uci, weight in entries:
+        move = chess.Move.from_uci(uci)
+        raw_move = move.to_square | (move.from_square << 6)
+        rows.append((chess.polyglot.zobrist_hash(chess.Board(fen)), raw_move, weight, 0))
+    with open(path, "wb") as book_file:
+        for row in sorted(rows):
+            book_file.write(struct.pack(">QHHI", *row))
+    return str(path)
+
+
+AFTER_E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+
+
+@pytest.fixture
+def book_path(tmp_path):
+    return write_book(
+        tmp_path / "book.bin",
+        [
+            (chess.STARTING_FEN, "e2e4", 10),
+            (chess.STARTING_FEN, "d2d4", 5),
+            (chess.STARTING_FEN, "g2g4", 0),
+            (AFTER_E4, "c7c5", 1),
+        ],
+    )
+
+
+class TestOpeningBook:
+
+    def test_best_move(self, book_path):
+        book = OpeningBook(book_path, BookSelection.BEST)
+        assert book.probe(chess.Board()) == chess.Move.from_uci("e2e4")
+        assert book.probe(chess.Board(AFTER_E4)) == chess.Move.from_uci("c7c5")
+        assert book.probe(chess.Board("4k3/8/8/8/8/8/8/4K3 w - - 0 1")) is None
+        book.close()
+
+    def test_weighted_choice(self, book_path):
+        book = OpeningBook(book_path, BookSelection.WEIGHTED, seed=1)
+        moves = [book.probe(chess.Board()).uci() for _ in range(300)]
+        # zero weight moves are never played
+        assert set(moves) == {"e2e4", "d2d4"}
+        assert moves.count("e2e4") > moves.count("d2d4")
+        book.close()
+
+    def test_max_ply(self, book_path):
+        book = OpeningBook(book_path, max_ply=1)
+        assert book.probe(chess.Board())
+        assert book.probe(chess.Board(AFTER_E4)) is None
+        book.close()
+
+    def test_next_move_plays_from_book(self, book_path, monkeypatch):
+        monkeypatch.setattr(search, "book", None)
+        monkeypatch.setattr(search.options, "own_book", True)
+        monkeypatch.setattr(search.options, "book_file", book_path)
+        monkeypatch.setattr(search.options, "book_selection", "best")
+        t0 = time.perf_counter()
+        assert next_move(chess.Board(), 5, debug=False) == chess.Move.from_uci("e2e4")
+        assert time.perf_counter() - t0 < 0.1
+        # out of book, the engine searches
+        board = chess.Board("3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1")
+        assert next_move(board, 3, debug=False) == chess.Move.from_uci("g5f7")
+        monkeypatch.setattr(search.options, "own_book", False)
+        assert search.book_move(chess.Board()) is None
+
+    def test_missing_book(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.setattr(search, "book", None)
+        monkeypatch.setattr(search.options, "own_book", True)
+        monkeypatch.setattr(search.options, "book_file", str(tmp_path / "missing.bin"))
+        board = chess.Board("3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1")
+        # reported once, then the engine searches without the book
+        assert next_move(board, 3, debug=False) == chess.Move.from_uci("g5f7")
+        assert capsys.readouterr().out.startswith("info string cannot open book ")
+        assert not search.options.own_book
+        assert next_move(board, 3, debug=False) == chess.Move.from_uci("g5f7")
+        assert "info string" not in capsys.readouterr().out
@@ -1,6 +1,72 @@
 import pytest
+import random
 import chess
-from evaluation import evaluate, count_isolated_pawns, count_doubled_pawns
+from collections import Counter
+from evaluation import (
+    evaluate,
+    count_isolated_pawns,
+    count_doubled_pawns,
+    IncrementalEvaluator,
+    PawnHashTable,
+    EvalHashTable,
+    eval_hash_table,
+    doubled_pawns,
+    isolated_pawns,
+    pawn_zobrist_key,
+)
+from config import (
+    piece_type_to_value_mg,
+    piece_type_to_value_eg,
+    GAME_PHASE_MIN_EG,
+    GAME_PHASE_MAX_MG,
+    GAME_PHASE_RANGE,
+    GAME_PHASE_STEPS,
+)
+from position import Position
+from pst import PstFactory, GamePhase, CompiledPst, PST_SIZE, mirror_pst, pst_index
+
+
+def reference_evaluate(board: chess.Board) -> float:
+    """
+    Square by square tapered evaluation, as evaluate was originally written.
+    """
+    game_phase = sum(piece_type_to_value_mg[piece.piece_type] for piece in board.piece_map().values())
+    game_phase = max(GAME_PHASE_MIN_EG, min(GAME_PHASE_MAX_MG, game_phase))
+    factor_mg = (game_phase - GAME_PHASE_MIN_EG) / GAME_PHASE_RANGE
+    factor_eg = 1 - factor_mg
+    eval = 0.0
+    for square in chess.SQUARES:
+        if piece := board.piece_at(square):
+            piece_type, color = piece.piece_type, piece.color
+            value = factor_mg * (
+                piece_type_to_value_mg[piece_type]
+                + PstFactory.get_pst(piece_type, color, GamePhase.MIDDLEGAME)[square]
+            ) + factor_eg * (
+                piece_type_to_value_eg[piece_type]
+                + PstFactory.get_pst(piece_type, color, GamePhase.ENDGAME)[square]
+            )
+            eval += value if color == chess.WHITE else -value
+    white_pawns = board.pieces(chess.PAWN, chess.WHITE)
+    black_pawns = board.pieces(chess.PAWN, chess.BLACK)
+    eval -= 30 * (count_isolated_pawns(white_pawns) - count_isolated_pawns(black_pawns))
+    eval -= 30 * (count_doubled_pawns(white_pawns) - count_doubled_pawns(black_pawns))
+    return eval
+
+
+def random_games(num_games: int, max_plies: int, seed: int = 0):
+    """
+    Yield boards along reproducible random games.
+    """
+    rng = random.Random(seed)
+    for _ in range(num_games):
+        board = chess.Board()
+        for _ in range(max_plies):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            # prefer captures and promotions so material changes hands often
+            forcing = [m for m in moves if board.is_capture(m) or m.promotion]
+            yield board, rng.choice(forcing if forcing and rng.random() < 0.5 else moves)
 
 
 class TestEvaluation:
@@ -31,3 +97,174 @@ class TestEvaluation:
         assert count_doubled_pawns(square_set) == 0
         square_set = [chess.A2, chess.C3, chess.C4]
         assert count_doubled_pawns(square_set) == 1
+
+
+class TestIncrementalEvaluator:
+
+    def test_matches_evaluate_on_random_games(self):
+        evaluator, positions = None, 0
+        for board, move in random_games(num_games=60, max_plies=120):
+            if not board.move_stack:
+                evaluator = IncrementalEvaluator(board)
+            evaluator.push(board, move)
+            board.push(move)
+            positions += 1
+            assert evaluator.evaluate(board) == evaluate(board)
+            # evaluate rounds down to a whole centipawn
+            assert evaluate(board) == pytest.approx(reference_evaluate(board), abs=1)
+        assert positions > 3000
+
+    def test_pop_restores_scores(self):
+        board = chess.Board("r3k2r/pPppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        evaluator = IncrementalEvaluator(board)
+        before = evaluator.evaluate(board)
+        for move in board.legal_moves:
+            evaluator.push(board, move)
+            board.push(move)
+            assert evaluator.evaluate(board) == evaluate(board)
+            for reply in board.legal_moves:
+                evaluator.push(board, reply)
+                board.push(reply)
+                assert evaluator.evaluate(board) == evaluate(board)
+                board.pop()
+                evaluator.pop()
+            board.pop()
+            evaluator.pop()
+        assert evaluator.evaluate(board) == before
+
+    @pytest.mark.parametrize(
+        "fen, uci",
+        [
+            ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1g1"),
+            ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1c1"),
+            ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8g8"),
+            ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8c8"),
+            ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6"),
+            ("4k3/8/8/8/3Pp3/8/8/4K3 b - d3 0 1", "e4d3"),
+            ("1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1", "a7b8q"),
+            ("4k3/8/8/8/8/8/p7/1R2K3 b - - 0 1", "a2b1n"),
+        ],
+    )
+    def test_special_moves(self, fen, uci):
+        board = chess.Board(fen)
+        evaluator = IncrementalEvaluator(board)
+        evaluator.push(board, chess.Move.from_uci(uci))
+        board.push_uci(uci)
+        assert evaluator.evaluate(board) == evaluate(board)
+
+
+class TestCompiledPst:
+
+    def test_black_tables_mirror_white(self):
+        for phase in GamePhase:
+            for piece_type in chess.PIECE_TYPES:
+                white = PstFactory.get_pst(piece_type, chess.WHITE, phase)
+                black = PstFactory.get_pst(piece_type, chess.BLACK, phase)
+                assert black == mirror_pst(white)
+
+    def test_blended_tables(self):
+        index = pst_index(chess.BLACK, chess.KNIGHT, chess.C6)
+        for step in (0, GAME_PHASE_STEPS // 2, GAME_PHASE_STEPS):
+            assert CompiledPst.blended[step * PST_SIZE + index] == (
+                step * CompiledPst.values_mg[index]
+                + (GAME_PHASE_STEPS - step) * CompiledPst.values_eg[index]
+            )
+
+    def test_register_rebuilds_compiled_tables(self):
+        board = chess.Board("4k3/8/8/8/8/8/8/1N2K3 w - - 0 1")
+        original = PstFactory.get_pst(chess.KNIGHT, chess.WHITE, GamePhase.MIDDLEGAME)
+        before = evaluate(board)
+        with pytest.raises(ValueError):
+            PstFactory.register_pst([0] * 64, chess.KNIGHT, chess.WHITE, GamePhase.MIDDLEGAME)
+        try:
+            boosted = [value + 10 for value in original]
+            PstFactory.register_pst(
+                boosted, chess.KNIGHT, chess.WHITE, GamePhase.MIDDLEGAME, replace=True
+            )
+            assert evaluate(board) != before
+            # cached scores are dropped with the old tables
+            assert evaluate(Position.from_board(board)) == evaluate(board)
+            # evaluate rounds down to a whole centipawn
+            assert evaluate(board) == pytest.approx(reference_evaluate(board), abs=1)
+        finally:
+            PstFactory.register_pst(
+                original, chess.KNIGHT, chess.WHITE, GamePhase.MIDDLEGAME, replace=True
+            )
+        assert evaluate(board) == before
+
+
+def reference_pawn_counts(pawn_squares):
+    """
+    Isolated and doubled pawn counts, square by square.
+    """
+    files = Counter(chess.square_file(square) for square in pawn_squares)
+    isolated = sum(n for f, n in files.items() if not files[f - 1] and not files[f + 1])
+    doubled = sum(min(n - 1, 2) for n in files.values())
+    return isolated, doubled
+
+
+class TestPawnStructure:
+
+    @pytest.mark.parametrize(
+        "squares",
+        [
+            [],
+            [chess.A2, chess.C3, chess.C4],
+            [chess.H2, chess.H3, chess.H4, chess.H5, chess.G7],
+            [chess.A2, chess.B2, chess.E2, chess.E3, chess.E4, chess.G5],
+            list(chess.SquareSet(chess.BB_RANK_2 | chess.BB_RANK_7)),
+        ],
+    )
+    def test_bitboard_counts(self, squares):
+        mask = chess.SquareSet(squares).mask
+        assert (isolated_pawns(mask), doubled_pawns(mask)) == reference_pawn_counts(squares)
+
+    def test_pawn_key_is_incremental(self):
+        evaluator = None
+        for board, move in random_games(num_games=30, max_plies=120, seed=1):
+            if not board.move_stack:
+                evaluator = IncrementalEvaluator(board)
+            evaluator.push(board, move)
+            board.push(move)
+            assert evaluator.pawn_key == pawn_zobrist_key(board)
+
+    def test_pawn_hash_table(self, starting_position):
+        table = PawnHashTable(entries=16)
+        key = pawn_zobrist_key(starting_position)
+        white_pawns = starting_position.pieces_mask(chess.PAWN, chess.WHITE)
+        black_pawns = starting_position.pieces_mask(chess.PAWN, chess.BLACK)
+        assert table.probe(key, white_pawns, black_pawns) == 0
+        assert table.probe(key, white_pawns, black_pawns) == 0
+        assert (table.hits, table.misses) == (1, 1)
+        with pytest.raises(ValueError):
+            PawnHashTable(entries=10)
+
+
+class TestEvalHashTable:
+
+    def test_probe_and_store(self):
+        table = EvalHashTable(entries=16)
+        assert table.probe(0x1234) is None
+        table.store(0x1234, -57)
+        assert table.probe(0x1234) == -57
+        # same slot, different key: always replaced
+        table.store(0x1234 + 16, 12)
+        assert table.probe(0x1234) is None and table.probe(0x1234 + 16) == 12
+        assert (table.hits, table.misses) == (2, 2) and table.hit_rate == 0.5
+        table.clear()
+        assert table.probe(0x1234 + 16) is None and table.hits == 0
+        with pytest.raises(ValueError):
+            EvalHashTable(entries=10)
+
+    def test_cached_scores_match(self):
+        eval_hash_table.clear()
+        for board, move in random_games(num_games=10, max_plies=80, seed=4):
+            if not board.move_stack:
+                position = Position.from_board(board)
+                evaluator = IncrementalEvaluator(position)
+            score = evaluate(board)
+            assert evaluate(position) == evaluator.evaluate(position) == score
+            evaluator.push(position, move)
+            position.push(move)
+            board.push(move)
+        assert eval_hash_table.hits > 0
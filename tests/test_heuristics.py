@@ -0,0 +1,45 @@
+import pytest
+import chess
+from heuristics import KillerMoves, HistoryTable
+from config import HISTORY_MAX
+
+
+class TestKillerMoves:
+
+    def test_two_most_recent_moves_per_ply(self):
+        killers = KillerMoves(max_ply=4)
+        e4, d4, c4 = (chess.Move.from_uci(uci) for uci in ["e2e4", "d2d4", "c2c4"])
+        killers.add(2, e4)
+        killers.add(2, e4)
+        assert killers.get(2) == [e4]
+        killers.add(2, d4)
+        killers.add(2, c4)
+        assert killers.get(2) == [c4, d4]
+        assert killers.get(1) == []
+        # plies beyond the table are ignored
+        killers.add(10, e4)
+        assert killers.get(10) == []
+        killers.clear()
+        assert killers.get(2) == []
+
+
+class TestHistoryTable:
+
+    def test_update_and_age(self):
+        history = HistoryTable()
+        move = chess.Move.from_uci("g1f3")
+        history.update(chess.WHITE, move, 3)
+        history.update(chess.WHITE, move, 2)
+        assert history.score(chess.WHITE, move) == 13
+        assert history.score(chess.BLACK, move) == 0
+        history.age()
+        assert history.score(chess.WHITE, move) == 6
+        history.clear()
+        assert history.score(chess.WHITE, move) == 0
+
+    def test_scores_stay_bounded(self):
+        history = HistoryTable()
+        move = chess.Move.from_uci("g1f3")
+        for _ in range(100):
+            history.update(chess.WHITE, move, 200)
+        assert history.score(chess.WHITE, move) <= HISTORY_MAX
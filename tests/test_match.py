@@ -0,0 +1,131 @@
+import pytest
+import chess
+import chess.pgn
+import io
+import match
+import search
+from match import (
+    EngineConfig,
+    MatchResult,
+    elo_difference,
+    expected_score,
+    log_likelihood_ratio,
+    opening_fens,
+    parse_engine,
+    play_game,
+    run_match,
+    sprt,
+)
+from transposition import SharedTranspositionTable
+
+
+class TestMatchStatistics:
+
+    def test_elo_difference(self):
+        assert elo_difference(0.5) == 0
+        assert elo_difference(0.75) == pytest.approx(190.8, abs=0.1)
+        assert elo_difference(0.25) == pytest.approx(-elo_difference(0.75))
+        assert expected_score(elo_difference(0.6)) == pytest.approx(0.6)
+
+    def test_match_result(self):
+        match = MatchResult()
+        match.add("1-0", first_engine_white=True)
+        match.add("1-0", first_engine_white=False)
+        match.add("1/2-1/2", first_engine_white=True)
+        assert (match.wins, match.draws, match.losses) == (1, 1, 1)
+        assert match.score == 0.5 and match.elo == 0
+        assert match.elo_error > 0
+
+    def test_sprt(self):
+        assert log_likelihood_ratio(0, 0, 0, 0, 5) == 0
+        assert log_likelihood_ratio(30, 40, 30, 0, 5) < 0
+        assert sprt(MatchResult(40, 40, 40)) is None
+        assert sprt(MatchResult(700, 1000, 500)) == "H1"
+        assert sprt(MatchResult(500, 1000, 700)) == "H0"
+
+
+class TestMatch:
+
+    def test_parse_engine(self):
+        defaults = EngineConfig("engine", nodes=500)
+        config = parse_engine("name=base null_move=false futility_margin=150 tc=10+0.1 hash=4", defaults)
+        assert config.name == "base" and config.hash_mb == 4
+        assert not config.options.null_move and config.options.futility_margin == 150
+        assert (config.time, config.increment, config.nodes) == (10.0, 0.1, 500)
+        # the defaults are not modified
+        assert defaults.options.null_move and defaults.time is None
+        assert parse_engine("syzygy_path=none").options.syzygy_path is None
+        with pytest.raises(ValueError):
+            parse_engine("no_such_option=1")
+
+    def test_opening_fens(self, tmp_path):
+        assert len(set(opening_fens())) == len(opening_fens())
+        path = tmp_path / "openings.epd"
+        path.write_text(f"{chess.STARTING_FEN}\n\nrnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - id \"e4\";\n")
+        assert opening_fens(str(path)) == [
+            chess.STARTING_FEN,
+            "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1",
+        ]
+
+    def test_play_game(self):
+        options = search.options
+        white, black = EngineConfig("white", depth=1), EngineConfig("black", nodes=200)
+        game = play_game(1, chess.STARTING_FEN, white, black, max_plies=6)
+        assert (game.result, game.termination, game.plies) == ("1/2-1/2", "adjudication", 6)
+        pgn = chess.pgn.read_game(io.StringIO(game.pgn))
+        assert pgn.headers["White"] == "white" and pgn.headers["Round"] == "1"
+        assert len(list(pgn.mainline_moves())) == 6
+        # the search state of the process is restored
+        assert search.options is options
+
+    def test_play_game_with_threads(self, monkeypatch):
+        engines, allocations = [], []
+        allocate = SharedTranspositionTable._allocate
+
+        class RecordedEngine(match.EngineState):
+            def __init__(self, config):
+                super().__init__(config)
+                engines.append(self)
+
+        def recorded_allocate(table, num_slots):
+            allocations.append(num_slots)
+            allocate(table, num_slots)
+
+        monkeypatch.setattr(match, "EngineState", RecordedEngine)
+        monkeypatch.setattr(SharedTranspositionTable, "_allocate", recorded_allocate)
+        white, black = parse_engine("name=smp depth=2 threads=2"), EngineConfig("black", depth=1)
+        game = play_game(1, chess.STARTING_FEN, white, black, max_plies=4)
+        assert game.plies == 4
+        # one shared table for the whole game, freed at its end
+        assert len(allocations) == 1
+        table = engines[0].transposition_table
+        assert isinstance(table, SharedTranspositionTable) and table._shared_memory is None
+
+    def test_play_game_to_mate(self):
+        game = play_game(1, "7k/8/6K1/8/8/8/8/R7 w - - 0 1", EngineConfig("a", depth=2), EngineConfig("b", depth=2))
+        assert (game.result, game.termination) == ("1-0", "checkmate")
+
+    @pytest.mark.parametrize("concurrency", [1, 2])
+    def test_run_match(self, tmp_path, concurrency):
+        first, second = EngineConfig("first", depth=1), EngineConfig("second", nodes=100)
+        pgn_path = tmp_path / "match.pgn"
+        games = []
+        match = run_match(
+            first,
+            second,
+            4,
+            concurrency=concurrency,
+            pgn_path=str(pgn_path),
+            max_plies=4,
+            on_game=lambda game, _: games.append(game),
+        )
+        assert match.games == 4 and match.draws == 4
+        # each opening is played with both colors
+        assert sorted((game.number, game.white) for game in games) == [
+            (1, "first"),
+            (2, "second"),
+            (3, "first"),
+            (4, "second"),
+        ]
+        with open(pgn_path) as pgn:
+            assert sum(1 for _ in iter(lambda: chess.pgn.read_game(pgn), None)) == 4
@@ -0,0 +1,144 @@
+import pytest
+import chess
+import multiprocessing
+import parallel
+import search
+import time
+from bench import BENCH_POSITIONS
+from parallel import lazy_smp_search, root_split_search
+from time_manager import SearchAborted, SearchLimits
+from transposition import SharedTranspositionTable, Bound
+from config import DEFAULT_DEPTH, MAX_DEPTH
+
+
+def unresponsive_worker(*args) -> None:
+    time.sleep(60)
+
+
+def store_entry(table: SharedTranspositionTable, key: int) -> None:
+    table.store(key, 4, 42, Bound.LOWER, chess.Move.from_uci("e2e4"))
+    table.close()
+
+
+@pytest.fixture()
+def shared_table():
+    table = SharedTranspositionTable(1)
+    yield table
+    table.close()
+
+
+class TestSharedTranspositionTable:
+
+    @pytest.mark.parametrize("start_method", multiprocessing.get_all_start_methods())
+    def test_entries_written_by_a_worker_are_visible(self, start_method):
+        context = multiprocessing.get_context(start_method)
+        shared_table = SharedTranspositionTable(1, context)
+        shared_table.new_search()
+        worker = context.Process(target=store_entry, args=(shared_table, 12345))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+        entry = shared_table.probe(12345)
+        assert entry.depth == 4
+        assert entry.score == 42
+        assert entry.move == chess.Move.from_uci("e2e4")
+        # the worker did not free the memory, and the generation is shared
+        assert shared_table.generation == 1
+        shared_table.close()
+
+    def test_resize_and_clear(self, shared_table):
+        shared_table.store(7, 2, 1, Bound.EXACT, None)
+        shared_table.resize(2)
+        assert shared_table.probe(7) is None
+        shared_table.store(7, 2, 1, Bound.EXACT, None)
+        shared_table.clear()
+        assert shared_table.probe(7) is None
+
+
+class TestLazySmp:
+
+    def test_finds_same_move_as_serial_search(self, monkeypatch):
+        board = chess.Board("3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1")
+        for move in ["f1e1", "d8d7", "e1f1", "d7d8"]:
+            board.push_uci(move)
+        fen = board.fen()
+        monkeypatch.setattr(search, "transposition_table", search.transposition_table)
+        result = lazy_smp_search(board, DEFAULT_DEPTH, None, 2)
+        assert result.move == chess.Move.from_uci("g5f7")
+        assert result.depth == DEFAULT_DEPTH
+        assert result.nodes > 0
+        assert board.fen() == fen
+
+    def test_node_limit_is_shared(self, monkeypatch):
+        monkeypatch.setattr(search, "transposition_table", search.transposition_table)
+        result = lazy_smp_search(chess.Board(), MAX_DEPTH, SearchLimits(nodes=20_000), 2)
+        # the workers stop once they searched that many nodes together, not each
+        assert 20_000 <= result.nodes < 30_000
+
+    def test_unresponsive_workers_are_terminated(self, monkeypatch):
+        monkeypatch.setattr(search, "transposition_table", search.transposition_table)
+        monkeypatch.setattr(parallel, "_search_worker", unresponsive_worker)
+        monkeypatch.setattr(parallel, "WORKER_STOP_TIMEOUT", 0.2)
+        t0 = time.monotonic()
+        with pytest.raises(RuntimeError):
+            lazy_smp_search(chess.Board(), DEFAULT_DEPTH, SearchLimits(movetime=200), 2)
+        assert time.monotonic() - t0 < 10
+        # the table the terminated workers used is replaced
+        assert isinstance(search.transposition_table, SharedTranspositionTable)
+        assert search.transposition_table.probe(0) is None
+
+
+class TestRootSplit:
+
+    @pytest.mark.parametrize("fen", ["3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1", *BENCH_POSITIONS])
+    def test_matches_serial_search(self, fen, monkeypatch):
+        board = chess.Board(fen)
+        search.transposition_table.clear()
+        search.history.clear()
+        # the root split search runs without the window-dependent selective search
+        with monkeypatch.context() as patch:
+            patch.setattr(search, "options", parallel.exact_options(search.options))
+            serial = search.iterative_deepening(board, 4)
+        search.transposition_table.clear()
+        search.history.clear()
+        split = root_split_search(board, 4, 2)
+        assert (split.move, split.score, split.depth) == (serial.move, serial.score, serial.depth)
+        assert board.fen() == fen
+        # the options of this process are left as they were
+        assert search.options.null_move and search.options.late_move_reductions and search.options.futility
+
+    def test_stop_during_first_move(self, monkeypatch):
+        negamax = search.negamax
+
+        def stopped_negamax(board, depth, alpha, beta, color, evaluator, ply):
+            # only the full depth search of the first root move searches depth 3 at ply 1
+            if depth == 3 and ply == 1:
+                search.time_manager.stop()
+                raise SearchAborted
+            return negamax(board, depth, alpha, beta, color, evaluator, ply)
+
+        monkeypatch.setattr(search, "negamax", stopped_negamax)
+        result = root_split_search(chess.Board(), 4, 2)
+        assert result.depth == 3 and result.move in chess.Board().legal_moves
+
+    def test_stop_during_pool_search(self, monkeypatch):
+        negamax = search.negamax
+
+        def stopping_negamax(board, depth, alpha, beta, color, evaluator, ply):
+            score = negamax(board, depth, alpha, beta, color, evaluator, ply)
+            if depth == 3 and ply == 1:
+                search.time_manager.stop()
+            return score
+
+        monkeypatch.setattr(search, "negamax", stopping_negamax)
+        result = root_split_search(chess.Board(), 4, 2)
+        assert result.depth == 3
+        # the pool searches again once the stop is over
+        monkeypatch.setattr(search, "negamax", negamax)
+        assert root_split_search(chess.Board(), 4, 2).depth == 4
+
+    def test_next_move_uses_root_split(self, monkeypatch):
+        monkeypatch.setattr(search.options, "threads", 2)
+        monkeypatch.setattr(search.options, "root_split", True)
+        board = chess.Board("3kr3/8/8/5n2/8/8/2R3K1/8 b - - 0 1")
+        assert search.next_move(board, DEFAULT_DEPTH, debug=False) == chess.Move.from_uci("f5e3")
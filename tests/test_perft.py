@@ -0,0 +1,43 @@
+import pytest
+import chess
+from perft import PERFT_POSITIONS, perft, divide, run_perft, check_reference_positions, format_divide
+from position import Position
+from uci import go
+
+
+class TestPerft:
+
+    @pytest.mark.parametrize("fen, counts", PERFT_POSITIONS)
+    def test_reference_positions(self, fen, counts):
+        for depth, expected in enumerate(counts[:2], 1):
+            assert perft(Position(fen), depth) == expected
+            assert perft(chess.Board(fen), depth) == expected
+
+    def test_divide(self):
+        fen = PERFT_POSITIONS[1][0]
+        counts = divide(Position(fen), 2)
+        assert len(counts) == 48
+        assert sum(counts.values()) == 2039
+        assert counts == divide(chess.Board(fen), 2)
+
+    def test_parallel_matches_serial(self):
+        fen = PERFT_POSITIONS[2][0]
+        serial = run_perft(fen, 3)
+        parallel = run_perft(fen, 3, workers=2)
+        assert parallel.nodes == serial.nodes == 2812
+        assert parallel.divide == serial.divide
+
+    def test_check_reference_positions(self):
+        results = check_reference_positions(max_nodes=3000)
+        assert results
+        assert all(result.nodes == expected for result, expected in results)
+
+    def test_format_divide(self):
+        result = run_perft(chess.STARTING_FEN, 1)
+        lines = format_divide(result).splitlines()
+        assert "e2e4: 1" in lines
+        assert lines[-1] == "Nodes searched: 20"
+
+    def test_uci_go_perft(self, capsys):
+        go("go perft 2", chess.Board())
+        assert "Nodes searched: 400" in capsys.readouterr().out
@@ -0,0 +1,104 @@
+import pytest
+import chess
+import chess.polyglot
+from perft import perft
+from position import Position
+from tests.test_evaluation import random_games
+
+
+class TestPosition:
+
+    @pytest.mark.parametrize(
+        "fen, depth, nodes",
+        [
+            (chess.STARTING_FEN, 3, 8902),
+            ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 2, 2039),
+            ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 3, 2812),
+            ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 3, 9467),
+            ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 2, 1486),
+        ],
+    )
+    def test_perft(self, fen, depth, nodes):
+        position = Position(fen)
+        assert perft(position, depth) == nodes
+        assert position.fen() == fen
+
+    def test_matches_python_chess(self):
+        position, positions = None, 0
+        for board, move in random_games(num_games=20, max_plies=150, seed=3):
+            if not board.move_stack:
+                position = Position.from_board(board)
+            assert list(position.generate_legal_moves()) == list(board.generate_legal_moves())
+            assert list(position.generate_legal_captures()) == list(board.generate_legal_captures())
+            assert position.key == chess.polyglot.zobrist_hash(board)
+            assert position.is_check() == board.is_check()
+            assert position.is_capture(move) == board.is_capture(move)
+            assert position.is_castling(move) == board.is_castling(move)
+            assert position.is_en_passant(move) == board.is_en_passant(move)
+            position.push(move)
+            board.push(move)
+            positions += 1
+        assert positions > 1000
+        assert position.key == position.zobrist_key()
+        assert position.to_board() == board
+
+    def test_pop_restores_position(self):
+        fen = "r3k2r/pPppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+        position = Position(fen)
+        key = position.key
+        for move in position.legal_moves:
+            position.push(move)
+            assert position.key == position.zobrist_key()
+            assert position.pop() == move
+            assert position.key == key
+        assert position.fen() == fen
+
+    def test_is_legal(self):
+        position = Position("r3k2r/8/8/8/8/8/8/R3K1qR w KQkq - 0 1")
+        board = position.to_board()
+        for from_square in chess.SQUARES:
+            for to_square in chess.SQUARES:
+                move = chess.Move(from_square, to_square)
+                assert position.is_legal(move) == board.is_legal(move)
+
+    def test_repetition(self):
+        board = chess.Board()
+        for _ in range(2):
+            for uci in ("g1f3", "g8f6", "f3g1", "f6g8"):
+                board.push_uci(uci)
+        # the repetitions before the conversion count too
+        position = Position.from_board(board)
+        assert position.is_repetition(3)
+        assert not position.is_repetition(4)
+        for uci in ("g1f3", "g8f6", "f3g1", "f6g8") * 2:
+            position.push_uci(uci)
+        assert position.is_repetition(5)
+        outcome = position.outcome()
+        assert outcome and outcome.termination == chess.Termination.FIVEFOLD_REPETITION
+
+    def test_no_repetition_across_null_moves(self):
+        position = Position("4k3/8/8/8/8/8/3Q4/4K3 w - - 0 1")
+        for move in (chess.Move.from_uci("d2d3"), chess.Move.null(), chess.Move.from_uci("d3d2"), chess.Move.null()):
+            position.push(move)
+        assert not position.is_repetition(2)
+        for uci in ("e1f1", "e8f8", "f1e1", "f8e8"):
+            position.push_uci(uci)
+        assert position.is_repetition(2)
+
+    @pytest.mark.parametrize(
+        "fen, termination",
+        [
+            ("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3", chess.Termination.CHECKMATE),
+            ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", chess.Termination.STALEMATE),
+            ("8/8/4k3/8/8/3BK3/8/8 w - - 0 1", chess.Termination.INSUFFICIENT_MATERIAL),
+            ("8/8/4k3/8/8/3RK3/8/8 w - - 150 100", chess.Termination.SEVENTYFIVE_MOVES),
+        ],
+    )
+    def test_outcome(self, fen, termination):
+        outcome = Position(fen).outcome()
+        assert outcome == chess.Board(fen).outcome()
+        assert outcome.termination == termination
+
+    def test_rejects_chess960(self):
+        with pytest.raises(ValueError):
+            Position.from_board(chess.Board(chess960=True))
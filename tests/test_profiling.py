@@ -0,0 +1,59 @@
+import pytest
+import chess
+import pstats
+import search
+from profiling import Counters, format_counters, instrument, profile_call
+
+
+class TestProfiling:
+
+    def search_position(self):
+        search.transposition_table.clear()
+        search.killers.clear()
+        search.history.clear()
+        board = chess.Board("r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4")
+        return search.run_search(board, 3)
+
+    def test_instrument(self):
+        plain = self.search_position()
+        staged_moves = search.staged_moves
+        with instrument() as counters:
+            instrumented = self.search_position()
+        # the search is unchanged, and the plain functions are restored
+        assert (instrumented.move, instrumented.nodes) == (plain.move, plain.nodes)
+        assert search.staged_moves is staged_moves
+        assert "probe" not in vars(search.transposition_table)
+        assert 0 < counters.evaluations <= search.stats.nodes
+        assert 0 < counters.tt_hits <= counters.tt_probes
+        assert counters.move_generations > 0
+        assert set(counters.phase_times) >= {"search", "quiescence", "evaluation", "move generation"}
+        assert counters.phase_times["quiescence"] <= counters.phase_times["search"]
+
+    def test_counters_accumulate(self):
+        counters = Counters()
+        with instrument(counters):
+            self.search_position()
+        evaluations = counters.evaluations
+        with instrument(counters):
+            self.search_position()
+        assert counters.evaluations == 2 * evaluations
+
+    def test_format_counters(self):
+        with instrument() as counters:
+            self.search_position()
+        line = format_counters(counters, search.stats)
+        assert line.startswith(f"nodes {search.stats.nodes} qnodes {search.stats.qnodes} ")
+        assert f"tthits {counters.tt_hits}/{counters.tt_probes}" in line
+        assert " move_generation " in line
+
+    def test_profile_call(self, tmp_path):
+        pstats_path, collapsed_path = tmp_path / "search.pstats", tmp_path / "search.folded"
+        result = profile_call(self.search_position, str(pstats_path), str(collapsed_path), interval=0.0005)
+        assert result.move
+        functions = {function for _, _, function in pstats.Stats(str(pstats_path)).stats}
+        assert "negamax" in functions
+        lines = collapsed_path.read_text().splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) > 0 and ";" in stack
+        assert any("search:negamax" in line for line in lines)
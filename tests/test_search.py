@@ -1,7 +1,25 @@
 import pytest
+import time
 import chess
-from search import next_move
-from config import DEFAULT_DEPTH
+import search
+from search import (
+    next_move,
+    iterative_deepening,
+    negamax,
+    negamax_root,
+    quiescence,
+    score_from_tt,
+    score_to_tt,
+    sort_captures,
+    staged_moves,
+    transposition_table,
+)
+from evaluation import IncrementalEvaluator
+from heuristics import HistoryTable
+from config import DEFAULT_DEPTH, MAX_DEPTH, MATE_EVAL, INFINITY
+from position import Position
+from tablebase import wdl_score
+from time_manager import SearchLimits
 
 
 class TestSearch:
@@ -20,4 +38,235 @@ class TestSearch:
 
     def test_mate_in_one_black(self):
         board = chess.Board("rnbqkbnr/pppp1ppp/8/4p3/6P1/5P2/PPPPP2P/RNBQKBNR b KQkq - 0 2")
-        assert next_move(board, DEFAULT_DEPTH) == chess.Move.from_uci("d8h4")
\ No newline at end of file
+        assert next_move(board, DEFAULT_DEPTH) == chess.Move.from_uci("d8h4")
+
+
+class TestTerminalNodes:
+
+    def test_mate_score_counts_distance(self):
+        # Ra8 mates at once, while other rook moves mate later
+        board = chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        transposition_table.clear()
+        result = iterative_deepening(board, 3)
+        assert result.move == chess.Move.from_uci("a1a8")
+        assert result.score == MATE_EVAL - 1
+
+    @pytest.mark.parametrize(
+        "fen, score",
+        [
+            ("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3", -MATE_EVAL + 1),
+            ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", 0),
+        ],
+    )
+    def test_no_legal_moves(self, fen, score):
+        position = Position(fen)
+        evaluator = IncrementalEvaluator(position)
+        color = 1 if position.turn == chess.WHITE else -1
+        assert negamax(position, 2, -INFINITY, INFINITY, color, evaluator, 1) == score
+
+    @pytest.mark.parametrize(
+        "fen, score",
+        [
+            ("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1", -MATE_EVAL + 1),
+            ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", 0),
+        ],
+    )
+    def test_no_legal_moves_at_the_horizon(self, fen, score, monkeypatch):
+        monkeypatch.setattr(search.options, "quiescence", False)
+        position = Position(fen)
+        evaluator = IncrementalEvaluator(position)
+        assert negamax(position, 0, -INFINITY, INFINITY, -1, evaluator, 1) == score
+
+    def test_repetition_is_a_draw(self):
+        board = chess.Board("4k3/8/8/8/8/8/3Q4/4K3 w - - 0 1")
+        for uci in ("d2d3", "e8f8", "d3d2", "f8e8"):
+            board.push_uci(uci)
+        position = Position.from_board(board)
+        evaluator = IncrementalEvaluator(position)
+        assert negamax(position, 2, -INFINITY, INFINITY, 1, evaluator, 1) == 0
+
+    def test_tt_mate_scores_are_relative_to_the_node(self):
+        assert score_to_tt(MATE_EVAL - 7, 3) == MATE_EVAL - 4
+        assert score_from_tt(score_to_tt(-MATE_EVAL + 7, 3), 5) == -MATE_EVAL + 9
+        assert score_to_tt(250, 3) == score_from_tt(250, 3) == 250
+
+    def test_tt_tablebase_scores_are_relative_to_the_node(self):
+        assert score_to_tt(wdl_score(2, 7), 3) == wdl_score(2, 4)
+        assert score_from_tt(score_to_tt(wdl_score(-2, 7), 3), 5) == wdl_score(-2, 9)
+        assert score_to_tt(wdl_score(0, 7), 3) == 0
+
+
+class TestSelectiveSearch:
+
+    FEN = "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8"
+
+    def search_nodes(self, monkeypatch, **features):
+        for name in ("null_move", "late_move_reductions", "futility"):
+            monkeypatch.setattr(search.options, name, features.get(name, False))
+        transposition_table.clear()
+        search.killers.clear()
+        search.history.clear()
+        iterative_deepening(chess.Board(self.FEN), 4)
+        return search.stats.nodes
+
+    @pytest.mark.parametrize("feature", ["null_move", "late_move_reductions", "futility"])
+    def test_feature_prunes_nodes(self, monkeypatch, feature):
+        full_width = self.search_nodes(monkeypatch)
+        assert self.search_nodes(monkeypatch, **{feature: True}) < full_width
+
+    def test_statistics(self, monkeypatch):
+        self.search_nodes(monkeypatch, null_move=True, late_move_reductions=True, futility=True)
+        assert search.stats.null_move_cutoffs > 0
+        assert search.stats.reduced_moves > 0
+        assert search.stats.futility_prunes > 0
+
+    def test_no_null_move_with_only_pawns(self, monkeypatch):
+        # in pawn endgames passing is often the best move (zugzwang), so the null move proves nothing
+        assert self.search_nodes(monkeypatch, null_move=True) and search.stats.null_move_cutoffs > 0
+        monkeypatch.setattr(self, "FEN", "8/5k2/3p4/1p1P4/1P3K2/8/5P2/8 w - - 0 1")
+        self.search_nodes(monkeypatch, null_move=True)
+        assert search.stats.nodes > 100
+        assert search.stats.null_move_cutoffs == 0
+
+    def test_finds_tactics_with_all_features(self, monkeypatch):
+        for name in ("null_move", "late_move_reductions", "futility"):
+            monkeypatch.setattr(search.options, name, True)
+        transposition_table.clear()
+        assert next_move(chess.Board("3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1"), 4, debug=False) == chess.Move.from_uci("g5f7")
+        transposition_table.clear()
+        board = chess.Board("2Q4r/4prk1/ppp2p1p/8/2qP1R2/2P5/P5PP/5RK1 w - - 4 33")
+        assert next_move(board, 4, debug=False) == chess.Move.from_uci("f4g4")
+
+
+class TestIterativeDeepening:
+
+    def test_completes_every_depth_without_time_limit(self):
+        board = chess.Board("3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1")
+        result = iterative_deepening(board, DEFAULT_DEPTH)
+        assert result.depth == DEFAULT_DEPTH
+        assert result.move == chess.Move.from_uci("g5f7")
+
+    @pytest.mark.parametrize(
+        "fen",
+        ["3q3k/8/8/6N1/8/6P1/8/5K2 w - - 0 1", "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"],
+    )
+    def test_aspiration_windows(self, fen):
+        transposition_table.clear()
+        result = iterative_deepening(chess.Board(fen), 3)
+        assert isinstance(result.score, int)
+        # the same score as a search with the full window
+        transposition_table.clear()
+        position = Position(fen)
+        move, score = negamax_root(position, 3, -INFINITY, INFINITY, 1, IncrementalEvaluator(position))
+        assert score == result.score
+        # a window above the score fails low
+        transposition_table.clear()
+        _, score = negamax_root(position, 3, score + 1, score + 50, 1, IncrementalEvaluator(position))
+        assert score <= result.score + 1
+
+    def test_movetime_is_respected(self):
+        board = chess.Board("r3k2r/pPppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        fen = board.fen()
+        t0 = time.monotonic()
+        result = iterative_deepening(board, MAX_DEPTH, SearchLimits(movetime=300))
+        assert time.monotonic() - t0 < 1.0
+        assert 1 <= result.depth < MAX_DEPTH
+        assert result.move in board.legal_moves
+        # an aborted iteration leaves the board untouched
+        assert board.fen() == fen
+
+    def test_next_move_with_clock(self):
+        board = chess.Board("2Q4r/4prk1/ppp2p1p/8/2qP1R2/2P5/P5PP/5RK1 w - - 4 33")
+        move = next_move(board, MAX_DEPTH, debug=False, limits=SearchLimits(wtime=60_000, btime=60_000))
+        assert move == chess.Move.from_uci("f4g4")
+
+
+class TestQuiescence:
+
+    def test_avoids_horizon_blunder(self, monkeypatch):
+        # the pawn on d5 is defended, taking it loses the queen
+        board = chess.Board("4k3/8/2p5/3p4/8/8/3Q4/4K3 w - - 0 1")
+        transposition_table.clear()
+        monkeypatch.setattr(search.options, "quiescence", False)
+        assert iterative_deepening(board, 1).move == chess.Move.from_uci("d2d5")
+        transposition_table.clear()
+        monkeypatch.setattr(search.options, "quiescence", True)
+        assert iterative_deepening(board, 1).move != chess.Move.from_uci("d2d5")
+
+    def test_stand_pat_in_quiet_position(self, starting_position):
+        evaluator = IncrementalEvaluator(starting_position)
+        static_eval = evaluator.evaluate(starting_position)
+        value = quiescence(starting_position, -INFINITY, INFINITY, 1, evaluator, 10**6)
+        assert value == static_eval
+
+    def test_node_cap(self):
+        board = chess.Board("r3k2r/pPppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        evaluator = IncrementalEvaluator(board)
+        search.stats.qnodes = 0
+        quiescence(board, -INFINITY, INFINITY, 1, evaluator, 10)
+        # nodes in check must search one evasion before giving up
+        assert search.stats.qnodes < 15
+
+    def test_sort_captures(self):
+        board = chess.Board("1n2k3/P7/8/3q4/4P3/8/8/4K3 w - - 0 1")
+        moves = sort_captures(board)
+        assert moves[0] == chess.Move.from_uci("a7a8q")
+        assert set(moves) == {
+            chess.Move.from_uci("a7a8q"),
+            chess.Move.from_uci("a7b8q"),
+            chess.Move.from_uci("a7b8r"),
+            chess.Move.from_uci("a7b8b"),
+            chess.Move.from_uci("a7b8n"),
+            chess.Move.from_uci("e4d5"),
+        }
+
+
+class TestStagedMoves:
+
+    @pytest.mark.parametrize(
+        "fen",
+        [
+            chess.STARTING_FEN,
+            "r3k2r/pPppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+            "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1",
+            "1n2k3/P7/8/3q4/4P3/8/8/4K3 w - - 0 1",
+            "4k3/8/8/8/8/8/3q4/4K3 w - - 0 1",
+        ],
+    )
+    def test_yields_each_legal_move_once(self, fen):
+        board = chess.Board(fen)
+        moves = list(staged_moves(board))
+        assert len(moves) == len(set(moves))
+        assert set(moves) == set(board.legal_moves)
+
+    def test_stage_order(self):
+        board = chess.Board("r3k2r/pPppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        hash_move = chess.Move.from_uci("e1g1")
+        killer = chess.Move.from_uci("a2a3")
+        moves = list(staged_moves(board, hash_move, [killer, chess.Move.from_uci("e2a6")]))
+        assert moves[0] == hash_move
+        assert set(moves) == set(board.legal_moves)
+        num_tactical = len(sort_captures(board))
+        assert all(board.is_capture(move) or move.promotion for move in moves[1 : num_tactical + 1])
+        # the second killer is a capture and is searched with the captures instead
+        assert moves[num_tactical + 1] == killer
+
+    def test_quiets_sorted_by_history(self, starting_position):
+        history = HistoryTable()
+        history.update(chess.WHITE, chess.Move.from_uci("b1c3"), 4)
+        history.update(chess.WHITE, chess.Move.from_uci("g2g3"), 2)
+        moves = list(staged_moves(starting_position, history=history))
+        assert moves[:2] == [chess.Move.from_uci("b1c3"), chess.Move.from_uci("g2g3")]
+
+    def test_cutoff_statistics(self):
+        board = chess.Board("r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4")
+        transposition_table.clear()
+        iterative_deepening(board, 3)
+        assert 0 < search.stats.first_move_cutoffs <= search.stats.cutoffs
+        assert 0 < search.stats.first_move_cutoff_rate <= 1
+        assert sum(search.stats.cutoffs_by_move) == search.stats.cutoffs
+
+    def test_illegal_hash_move_is_skipped(self, starting_position):
+        moves = list(staged_moves(starting_position, chess.Move.from_uci("e2e5")))
+        assert set(moves) == set(starting_position.legal_moves)
+        assert len(moves) == 20
@@ -0,0 +1,149 @@
+import pytest
+import chess
+import chess.syzygy
+import search
+from typing import Dict, Optional
+from config import INFINITY, TB_WIN_SCORE
+from evaluation import IncrementalEvaluator
+from position import Position
+from search import iterative_deepening, run_search, transposition_table
+from tablebase import Tablebase, to_board, wdl_score
+from time_manager import SearchLimits
+
+KQK = "8/8/8/4k3/8/8/8/KQ6 w - - 0 1"
+
+
+class StubTablebase:
+    """
+    Stands in for chess.syzygy.Tablebase with KQvK tables, so no table files are needed: the side with
+    the queen wins, and a bare king against a bare king is a draw. DTZ values are DEFAULT_DTZ,
+    or dtz[board_fen] for the positions set there, with the sign of the WDL value.
+    """
+
+    DEFAULT_DTZ = 10
+
+    def __init__(self) -> None:
+        self.wdl: Dict[str, str] = {}
+        self.dtz: Dict[str, int] = {}
+        self.probes = 0
+
+    def add_directory(self, directory: str) -> None:
+        self.wdl["KQvK"] = directory
+
+    def get_wdl(self, board: chess.Board) -> Optional[int]:
+        self.probes += 1
+        if chess.popcount(board.occupied) > 3 or board.occupied & ~(board.kings | board.queens):
+            return None
+        if not board.queens:
+            return 0
+        return 2 if board.queens & board.occupied_co[board.turn] else -2
+
+    def get_dtz(self, board: chess.Board) -> Optional[int]:
+        wdl = self.get_wdl(board)
+        if wdl is None:
+            return None
+        dtz = self.dtz.get(board.board_fen(), self.DEFAULT_DTZ)
+        return dtz if wdl > 0 else -dtz if wdl < 0 else 0
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture()
+def syzygy(monkeypatch):
+    monkeypatch.setattr(chess.syzygy, "Tablebase", StubTablebase)
+    monkeypatch.setattr(search, "tablebase", None)
+    monkeypatch.setattr(search.options, "syzygy_path", "syzygy")
+    transposition_table.clear()
+
+
+class TestTablebase:
+
+    def test_to_board(self):
+        position = Position("r3k2r/8/8/8/3pP3/8/8/4K2R b Kkq e3 0 1")
+        board = to_board(position)
+        assert board.fen() == position.fen()
+        assert board.castling_rights == position.castling_rights == chess.BB_H1 | chess.BB_A8 | chess.BB_H8
+        assert not board.move_stack
+
+    def test_wdl_score(self):
+        assert wdl_score(2, 3) == TB_WIN_SCORE - 3
+        assert wdl_score(-2, 3) == -TB_WIN_SCORE + 3
+        assert wdl_score(1, 3) == wdl_score(-1, 3) == wdl_score(0, 3) == 0
+
+    def test_probe_wdl(self, syzygy):
+        tablebase = Tablebase("syzygy")
+        assert tablebase.largest == tablebase.max_pieces == 3
+        board = Position(KQK)
+        assert tablebase.can_probe(board)
+        assert tablebase.probe_wdl(board, board.key) == 2
+        board = Position("8/8/8/4k3/8/8/8/KQ6 b - - 0 1")
+        assert tablebase.probe_wdl(board, board.key) == -2
+        # too many pieces, or castling rights
+        assert not tablebase.can_probe(Position("8/8/8/4k3/8/8/1r6/KQ6 w - - 0 1"))
+        assert not tablebase.can_probe(Position("4k3/8/8/8/8/8/8/4K2R w K - 0 1"))
+
+    def test_lru_cache(self, syzygy):
+        tablebase = Tablebase("syzygy", cache_size=2)
+        boards = [Position(fen) for fen in (KQK, "8/8/8/4k3/8/8/8/KR6 w - - 0 1", "8/8/8/4k3/8/8/8/KN6 w - - 0 1")]
+        # positions missing from the tables are cached as None too
+        assert tablebase.probe_wdl(boards[0], boards[0].key) == 2
+        assert tablebase.probe_wdl(boards[1], boards[1].key) is None
+        assert tablebase.probe_wdl(boards[0], boards[0].key) == 2
+        assert (tablebase.hits, tablebase.misses) == (1, 2)
+        assert tablebase.tablebase.probes == 2
+        # the least recently used entry is evicted
+        tablebase.probe_wdl(boards[2], boards[2].key)
+        assert list(tablebase.cache) == [boards[0].key, boards[2].key]
+
+    def test_root_move(self, syzygy):
+        tablebase = Tablebase("syzygy")
+        # the move reaching the lowest DTZ is played, with the WDL value for the side to move
+        board = chess.Board(KQK)
+        board.push_uci("b1b5")
+        tablebase.tablebase.dtz[board.board_fen()] = 1
+        assert tablebase.root_move(Position(KQK)) == (chess.Move.from_uci("b1b5"), 2)
+        # the losing side delays the capture or pawn move the longest
+        board = chess.Board("8/8/8/4k3/8/8/8/KQ6 b - - 0 1")
+        board.push_uci("e5d6")
+        tablebase.tablebase.dtz[board.board_fen()] = 20
+        assert tablebase.root_move(Position("8/8/8/4k3/8/8/8/KQ6 b - - 0 1")) == (chess.Move.from_uci("e5d6"), -2)
+        # not in the tables
+        assert tablebase.root_move(Position("8/8/8/4k3/8/8/1r6/KQ6 w - - 0 1")) is None
+
+    def test_wdl_in_search(self, syzygy):
+        # white captures the rook into a won KQvK, reached at ply 1: the score keeps that distance
+        # through the transposition table, where it is stored relative to the node
+        result = iterative_deepening(chess.Board("8/8/8/4k3/8/8/1r6/KQ6 w - - 0 1"), 3)
+        assert result.move == chess.Move.from_uci("b1b2")
+        assert result.score == TB_WIN_SCORE - 1
+        assert search.stats.tb_hits > 0
+
+    def test_tt_score_relative_to_node(self, syzygy):
+        search.update_tablebase()
+        board = Position("8/8/8/4k3/8/8/1r6/KQ6 w - - 0 1")
+        search.time_manager.start(SearchLimits(), board.turn)
+        # searched at ply 5, the tablebase position is reached at ply 6
+        assert search.negamax(board, 2, -INFINITY, INFINITY, 1, IncrementalEvaluator(board), 5) == TB_WIN_SCORE - 6
+        # and stored one ply from the node
+        entry = transposition_table.probe(board.key)
+        assert entry is not None and entry.score == TB_WIN_SCORE - 1
+
+    def test_dtz_at_root(self, syzygy):
+        result = run_search(chess.Board(KQK), 5)
+        assert result.depth == 0
+        assert result.score == TB_WIN_SCORE
+        board = chess.Board(KQK)
+        board.push(result.move)
+        assert search.tablebase is not None
+        assert search.tablebase.tablebase.get_wdl(board) == -2
+
+    def test_missing_path(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.setattr(search, "tablebase", None)
+        monkeypatch.setattr(search.options, "syzygy_path", str(tmp_path / "missing"))
+        # reported once, then the engine searches without the tablebases
+        assert run_search(chess.Board(KQK), 2).depth == 2
+        assert capsys.readouterr().out.startswith("info string cannot open tablebases ")
+        assert search.options.syzygy_path is None
+        assert run_search(chess.Board(KQK), 2).depth == 2
+        assert "info string" not in capsys.readouterr().out
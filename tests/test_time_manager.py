@@ -0,0 +1,74 @@
+import pytest
+import chess
+from time_manager import TimeManager, SearchLimits
+from config import MOVE_OVERHEAD_MS
+
+
+class TestTimeManager:
+
+    def test_untimed_search_never_stops(self):
+        time_manager = TimeManager()
+        time_manager.start(SearchLimits(depth=5), chess.WHITE)
+        time_manager.can_abort = True
+        assert time_manager.hard_limit is None
+        assert time_manager.can_start_iteration()
+        assert not time_manager.time_up()
+
+    def test_movetime(self):
+        time_manager = TimeManager()
+        time_manager.start(SearchLimits(movetime=1000), chess.BLACK)
+        assert time_manager.hard_limit == pytest.approx((1000 - MOVE_OVERHEAD_MS) / 1000)
+
+    def test_clock_allocation(self):
+        time_manager = TimeManager()
+        limits = SearchLimits(wtime=60_000, btime=1_000, winc=1_000, binc=0)
+        time_manager.start(limits, chess.WHITE)
+        white_hard, white_soft = time_manager.hard_limit, time_manager.soft_limit
+        assert 0 < white_soft < white_hard < 60
+        time_manager.start(limits, chess.BLACK)
+        assert time_manager.hard_limit < white_hard
+        # never plan to use more than the clock has left
+        assert time_manager.hard_limit < 1
+        # with one move to the time control, more of the clock can be used
+        time_manager.start(SearchLimits(wtime=60_000, movestogo=1), chess.WHITE)
+        assert time_manager.hard_limit > white_hard
+
+    def test_stop(self):
+        time_manager = TimeManager()
+        time_manager.start(SearchLimits(), chess.WHITE)
+        time_manager.stop()
+        assert not time_manager.can_start_iteration()
+        # the first iteration always completes
+        assert not time_manager.time_up()
+        time_manager.can_abort = True
+        assert time_manager.time_up()
+
+    def test_ponder_ignores_limits_until_ponderhit(self, monkeypatch):
+        time_manager = TimeManager()
+        time_manager.start(SearchLimits(movetime=100, ponder=True), chess.WHITE)
+        time_manager.can_abort = True
+        monkeypatch.setattr(time_manager, "t0", time_manager.t0 - 10)
+        assert time_manager.can_start_iteration()
+        assert not time_manager.time_up()
+        time_manager.ponderhit()
+        # the budget counts from the ponderhit
+        assert not time_manager.time_up()
+        monkeypatch.setattr(time_manager, "t0", time_manager.t0 - 1)
+        assert time_manager.time_up()
+
+    def test_infinite_until_stopped(self):
+        time_manager = TimeManager()
+        time_manager.start(SearchLimits(wtime=1000, infinite=True), chess.WHITE)
+        time_manager.can_abort = True
+        assert time_manager.hard_limit is None
+        assert not time_manager.time_up()
+        time_manager.stop()
+        assert time_manager.time_up()
+
+    def test_node_limit(self):
+        time_manager = TimeManager()
+        time_manager.start(SearchLimits(nodes=1000), chess.WHITE)
+        time_manager.can_abort = True
+        assert time_manager.can_start_iteration(999) and not time_manager.time_up(999)
+        assert not time_manager.can_start_iteration(1000)
+        assert time_manager.time_up(1000)
@@ -0,0 +1,62 @@
+import pytest
+import chess
+import chess.polyglot
+from transposition import TranspositionTable, Bound, encode_move, decode_move
+
+
+class TestTranspositionTable:
+
+    def test_size_is_bounded(self):
+        table = TranspositionTable(1)
+        assert len(table.keys) * TranspositionTable.SLOT_SIZE_BYTES <= 1024 * 1024
+        assert table.num_buckets & (table.num_buckets - 1) == 0
+        with pytest.raises(ValueError):
+            TranspositionTable(0)
+
+    def test_store_and_probe(self, starting_position):
+        table = TranspositionTable(1)
+        key = chess.polyglot.zobrist_hash(starting_position)
+        assert table.probe(key) is None
+        move = chess.Move.from_uci("e2e4")
+        table.store(key, 3, 125, Bound.LOWER, move)
+        entry = table.probe(key)
+        assert entry.depth == 3
+        assert entry.score == 125
+        assert entry.bound == Bound.LOWER
+        assert entry.move == move
+        table.clear()
+        assert table.probe(key) is None
+
+    def test_replacement_policy(self):
+        table = TranspositionTable(1)
+        # three keys falling into the same bucket
+        deep, shallow, newest = 5, 5 + table.num_buckets, 5 + 2 * table.num_buckets
+        table.store(deep, 6, 1, Bound.EXACT, None)
+        table.store(shallow, 2, 2, Bound.EXACT, None)
+        # the shallower entry goes to the always-replace slot, the deep one survives
+        assert table.probe(deep).depth == 6
+        assert table.probe(shallow).depth == 2
+        table.store(newest, 1, 3, Bound.EXACT, None)
+        assert table.probe(deep).depth == 6
+        assert table.probe(shallow) is None
+        # after a new search starts, the deep entry from the old search can be replaced
+        table.new_search()
+        table.store(shallow, 1, 2, Bound.EXACT, None)
+        assert table.probe(deep) is None
+        assert table.probe(shallow).depth == 1
+
+    def test_hashfull(self):
+        table = TranspositionTable(1)
+        assert table.hashfull() == 0
+        for key in range(table.num_buckets):
+            table.store(key, 1, 0, Bound.EXACT, None)
+        # one slot of each bucket is used
+        assert table.hashfull() == 500
+        table.new_search()
+        assert table.hashfull() == 0
+
+    def test_encode_move(self):
+        for uci in ["e2e4", "a7a8q", "h2h1n", "e1g1"]:
+            move = chess.Move.from_uci(uci)
+            assert decode_move(encode_move(move)) == move
+        assert decode_move(encode_move(None)) is None
@@ -0,0 +1,171 @@
+import pytest
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+import chess
+import search
+from config import MATE_EVAL
+from search import SearchResult
+from time_manager import SearchLimits
+from uci import SearchThread, lazy_import, parse_go, setoption, format_info
+
+
+class TestUci:
+
+    def test_parse_go(self):
+        limits = parse_go("go wtime 300000 btime 290000 winc 2000 binc 2000 movestogo 12")
+        assert (limits.wtime, limits.btime, limits.winc, limits.binc) == (300000, 290000, 2000, 2000)
+        assert limits.movestogo == 12
+        assert limits.is_timed
+        limits = parse_go("go depth 4")
+        assert limits.depth == 4
+        assert not limits.is_timed
+        assert parse_go("go movetime 500").movetime == 500
+        assert parse_go("go infinite").infinite
+        assert parse_go("go nodes 5000").nodes == 5000
+        limits = parse_go("go ponder wtime 1000 btime 1000")
+        assert limits.ponder and limits.wtime == 1000
+
+    def test_selective_search_options(self, monkeypatch):
+        monkeypatch.setattr(search, "options", search.SearchOptions())
+        setoption("setoption name NullMove value false")
+        setoption("setoption name LateMoveReductions value false")
+        setoption("setoption name FutilityMargin value 250")
+        assert not search.options.null_move
+        assert not search.options.late_move_reductions
+        assert search.options.futility and search.options.futility_margin == 250
+
+    def test_invalid_option_value(self, monkeypatch, capsys):
+        monkeypatch.setattr(search, "options", search.SearchOptions())
+        setoption("setoption name Threads value abc")
+        assert capsys.readouterr().out.startswith("info string ")
+        assert search.options.threads == search.SearchOptions().threads
+
+    @pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+    @pytest.mark.parametrize("iterations, bestmove", [(0, "bestmove 0000"), (1, "bestmove e2e4")])
+    def test_failed_search_sends_best_move(self, iterations, bestmove, monkeypatch, capsys):
+        e2e4 = chess.Move.from_uci("e2e4")
+
+        def failing_search(board, depth, limits, on_iteration):
+            for depth in range(1, iterations + 1):
+                on_iteration(SearchResult(e2e4, 35, depth, 20, 0.01, [e2e4]))
+            raise RuntimeError("search failed")
+
+        monkeypatch.setattr(search, "run_search", failing_search)
+        thread = SearchThread(chess.Board(), 4, SearchLimits(depth=4))
+        thread.start()
+        thread.join(10)
+        assert capsys.readouterr().out.splitlines()[-1] == bestmove
+
+    def test_lazy_import_missing_module(self):
+        with pytest.raises(ImportError):
+            lazy_import("no_such_module")
+
+    def test_format_info(self):
+        e2e4, e7e5 = chess.Move.from_uci("e2e4"), chess.Move.from_uci("e7e5")
+        line = format_info(SearchResult(e2e4, 35, 4, 2000, 0.5, [e2e4, e7e5]), 12)
+        assert line == "info depth 4 score cp 35 nodes 2000 nps 4000 time 500 hashfull 12 pv e2e4 e7e5"
+        assert "score mate 2 " in format_info(SearchResult(e2e4, MATE_EVAL - 3, 4, 1, 0.1, [e2e4]), 0)
+        assert "score mate -1 " in format_info(SearchResult(e2e4, -MATE_EVAL + 2, 4, 1, 0.1, [e2e4]), 0)
+
+
+class TestUciLoop:
+
+    def run_engine(self, commands):
+        return subprocess.run(
+            [sys.executable, "uci.py"],
+            input="\n".join(commands) + "\n",
+            capture_output=True,
+            text=True,
+            timeout=60,
+            cwd=Path(__file__).parent.parent,
+        ).stdout.splitlines()
+
+    def test_stop_infinite_search(self):
+        lines = self.run_engine(["position startpos moves e2e4", "go infinite", "isready", "stop", "quit"])
+        assert "readyok" in lines
+        # isready is answered while the search runs, the best move only once it is stopped
+        assert lines.index("readyok") < next(i for i, line in enumerate(lines) if line.startswith("bestmove"))
+        assert any(line.startswith("info depth 1 ") and " pv " in line for line in lines)
+        assert lines[-1].startswith("bestmove ")
+
+    def test_ponderhit(self):
+        lines = self.run_engine(
+            ["position startpos", "go ponder movetime 200", "ponderhit", "isready", "position startpos", "go depth 2", "quit"]
+        )
+        assert len([line for line in lines if line.startswith("bestmove ")]) == 2
+
+    def test_threads(self):
+        # the workers are started while the main thread waits for input
+        process = subprocess.Popen(
+            [sys.executable, "uci.py"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            cwd=Path(__file__).parent.parent,
+        )
+        watchdog = threading.Timer(60, process.kill)
+        watchdog.start()
+        try:
+            process.stdin.write("setoption name Threads value 2\nposition startpos\ngo movetime 1000\n")
+            process.stdin.flush()
+            lines = []
+            while not (lines and lines[-1].startswith("bestmove")):
+                line = process.stdout.readline()
+                assert line, "engine exited without a best move"
+                lines.append(line.strip())
+            assert any(line.startswith("info depth ") for line in lines)
+            process.communicate("quit\n", timeout=30)
+        finally:
+            watchdog.cancel()
+            process.kill()
+
+    def test_no_legal_moves(self):
+        lines = self.run_engine(["position fen 7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", "go depth 2", "quit"])
+        assert lines == ["bestmove 0000"]
+
+
+class TestStartup:
+
+    repo = Path(__file__).parent.parent
+
+    def time_to_line(self, args, commands, expected):
+        """
+        Seconds from starting a process to reading the expected line from it.
+        """
+        t0 = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, *args], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=self.repo
+        )
+        process.stdin.write("\n".join(commands) + "\n")
+        process.stdin.flush()
+        while process.stdout.readline().strip() != expected:
+            pass
+        elapsed = time.perf_counter() - t0
+        process.communicate("quit\n", timeout=60)
+        return elapsed
+
+    def test_uci_does_not_load_engine(self):
+        script = (
+            "import sys, uci; uci.uci(); "
+            "print(*[name for name in ('chess.polyglot', 'position', 'pst', 'evaluation', 'transposition') "
+            "if name in sys.modules])"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, timeout=60, cwd=self.repo
+        ).stdout.splitlines()
+        assert output[-2:] == ["uciok", ""]
+
+    def test_startup_benchmark(self):
+        # median seconds to answer isready, against the time to import the engine
+        ready = statistics.median(self.time_to_line(["uci.py"], ["uci", "isready"], "readyok") for _ in range(3))
+        engine = statistics.median(
+            self.time_to_line(["-c", "import search; print('loaded')"], [], "loaded") for _ in range(3)
+        )
+        print(f"readyok after {ready * 1000:.0f} ms, engine loaded after {engine * 1000:.0f} ms")
+        assert ready < engine
+        lines = TestUciLoop().run_engine(["uci", "isready", "position startpos", "go depth 1", "quit"])
+        assert lines[-1].startswith("bestmove ")
@@ -0,0 +1,142 @@
+import chess
+import time
+from dataclasses import dataclass
+from typing import Optional
+from config import MOVE_OVERHEAD_MS, DEFAULT_MOVES_TO_GO
+
+# ideas
+# time management: https://www.chessprogramming.org/Time_Management
+
+
+class SearchAborted(Exception):
+    """
+    Raised inside the search when the time manager decides the search must stop immediately
+    """
+
+
+@dataclass
+class SearchLimits:
+    """
+    Limits on a search, mirroring the arguments of the uci "go" command. Times are in milliseconds.
+    """
+
+    depth: Optional[int] = None
+    movetime: Optional[int] = None
+    wtime: Optional[int] = None
+    btime: Optional[int] = None
+    winc: int = 0
+    binc: int = 0
+    movestogo: Optional[int] = None
+    # stop once this many nodes have been searched
+    nodes: Optional[int] = None
+    # search until stopped, and search on the opponent's time until a "ponderhit"
+    infinite: bool = False
+    ponder: bool = False
+
+    @property
+    def is_timed(self) -> bool:
+        return self.movetime is not None or self.wtime is not None or self.btime is not None
+
+
+class TimeManager:
+    """
+    Allocates a time budget for a single move and tells the search when to stop.
+
+    Two limits are derived from the search limits:
+    - the soft limit: no new iteration of iterative deepening is started after it has passed,
+      since the next iteration would most likely not complete;
+    - the hard limit: the search is aborted mid-iteration once it has passed.
+
+    While pondering, the limits are not applied: the clock starts when the opponent plays the expected move.
+    A node limit is applied like the hard limit, and also stops iterative deepening.
+    """
+
+    def __init__(self):
+        # optionally set to a multiprocessing.Event or threading.Event by which another process
+        # or thread can stop the search
+        self.stop_event = None
+        # optionally set to a multiprocessing.Value through which the node count of the search
+        # is published to another process, at every check of the limits
+        self.node_counter = None
+        self.start(SearchLimits(), chess.WHITE)
+
+    def start(self, limits: SearchLimits, turn: chess.Color) -> None:
+        """
+        Start the clock for a new search.
+        """
+        self.t0 = time.monotonic()
+        self.stopped = False
+        # the search is only allowed to abort once it has a result to fall back on
+        self.can_abort = False
+        self.soft_limit: Optional[float] = None
+        self.hard_limit: Optional[float] = None
+        self.pondering = limits.ponder
+        self.node_limit = limits.nodes
+
+        if limits.infinite:
+            return
+        if limits.movetime is not None:
+            self.hard_limit = max(limits.movetime - MOVE_OVERHEAD_MS, 1) / 1000
+            self.soft_limit = self.hard_limit
+            return
+
+        time_left = limits.wtime if turn == chess.WHITE else limits.btime
+        if time_left is None:
+            return
+        increment = limits.winc if turn == chess.WHITE else limits.binc
+        moves_to_go = limits.movestogo or DEFAULT_MOVES_TO_GO
+
+        available = max(time_left - MOVE_OVERHEAD_MS, 1)
+        optimum = available / moves_to_go + 0.75 * increment
+        maximum = min(3 * optimum, 0.8 * available)
+        self.hard_limit = maximum / 1000
+        self.soft_limit = min(optimum / 2, maximum) / 1000
+
+    def stop(self) -> None:
+        """
+        Ask the search to stop as soon as possible.
+        """
+        self.stopped = True
+
+    def ponderhit(self) -> None:
+        """
+        The opponent played the move pondered on: apply the limits from now on.
+        """
+        elapsed = self.elapsed()
+        if self.soft_limit is not None:
+            self.soft_limit += elapsed
+        if self.hard_limit is not None:
+            self.hard_limit += elapsed
+        self.pondering = False
+
+    def elapsed(self) -> float:
+        """
+        Seconds since the search started.
+        """
+        return time.monotonic() - self.t0
+
+    def stop_requested(self) -> bool:
+        return self.stopped or (self.stop_event is not None and self.stop_event.is_set())
+
+    def can_start_iteration(self, nodes: int = 0) -> bool:
+        if self.stop_requested() or (self.node_limit is not None and nodes >= self.node_limit):
+            return False
+        return self.pondering or self.soft_limit is None or self.elapsed() < self.soft_limit
+
+    def time_up(self, nodes: int = 0) -> bool:
+        """
+        Whether the current iteration must be aborted, after searching the given number of nodes.
+        """
+        if self.node_counter is not None:
+            self.node_counter.value = nodes
+        if not self.can_abort:
+            return False
+        if self.stop_requested() or (self.node_limit is not None and nodes >= self.node_limit):
+            return True
+        return self.out_of_time()
+
+    def out_of_time(self) -> bool:
+        """
+        Whether the hard limit has passed, whether or not the search may abort yet.
+        """
+        return not self.pondering and self.hard_limit is not None and self.elapsed() >= self.hard_limit
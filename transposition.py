@@ -0,0 +1,314 @@
+import atexit
+import chess
+import multiprocessing
+import os
+import struct
+from enum import IntEnum
+from multiprocessing.context import BaseContext
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, MutableSequence, NamedTuple, Optional, Union
+from config import TT_LOCK_STRIPES
+
+# ideas
+# transposition table: https://www.chessprogramming.org/Transposition_Table
+# two-tier bucket replacement: https://www.chessprogramming.org/Transposition_Table#Two-tier_System
+
+
+class Bound(IntEnum):
+    """
+    How a stored score relates to the true negamax value of the position
+    """
+
+    EXACT = 0
+    LOWER = 1  # failed high, true value >= score
+    UPPER = 2  # failed low, true value <= score
+
+
+class TTEntry(NamedTuple):
+    """
+    Result of a successful transposition table probe
+    """
+
+    depth: int
+    score: int
+    bound: Bound
+    move: Optional[chess.Move]
+
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table keyed on the Zobrist hash of a position.
+
+    Entries are kept in flat typed arrays over a single buffer allocated once from the requested
+    size in megabytes, so memory use does not grow during a game. Each bucket holds two slots:
+    - slot 0 is depth-preferred: only overwritten by a search of at least the same depth,
+      or when its entry is left over from an earlier search;
+    - slot 1 is always-replace: takes every entry that slot 0 rejects.
+    """
+
+    # field name and array type code, laid out one after the other in a single buffer
+    FIELDS = [
+        ("keys", "Q"),
+        ("scores", "i"),
+        ("moves", "H"),
+        ("depths", "b"),
+        ("generations", "B"),
+        ("bounds", "B"),
+    ]
+    # bytes per slot: key (Q) + score (i) + move (H) + depth (b) + generation (B) + bound (B)
+    SLOT_SIZE_BYTES = 8 + 4 + 2 + 1 + 1 + 1
+    SLOTS_PER_BUCKET = 2
+
+    # typed views over the buffer, one per field, set by _map
+    keys: MutableSequence[int]
+    scores: MutableSequence[int]
+    moves: MutableSequence[int]
+    depths: MutableSequence[int]
+    generations: MutableSequence[int]
+    bounds: MutableSequence[int]
+
+    def __init__(self, size_mb: int):
+        self.resize(size_mb)
+
+    def resize(self, size_mb: int) -> None:
+        """
+        Reallocate the table to fit in roughly size_mb megabytes. All entries are lost.
+        The number of buckets is rounded down to a power of two so it can be indexed with a mask.
+        """
+        if size_mb <= 0:
+            raise ValueError(f"Transposition table size must be positive, got {size_mb} MB")
+        bucket_size = self.SLOT_SIZE_BYTES * self.SLOTS_PER_BUCKET
+        max_buckets = max(1, (size_mb * 1024 * 1024) // bucket_size)
+        self.num_buckets = 1 << (max_buckets.bit_length() - 1)
+        self.size_mb = size_mb
+        self._mask = self.num_buckets - 1
+        self._allocate(self.num_buckets * self.SLOTS_PER_BUCKET)
+
+    def _allocate(self, num_slots: int) -> None:
+        self._map(bytearray(num_slots * self.SLOT_SIZE_BYTES), num_slots)
+        # a new buffer is already zeroed, which saves the time of clearing it at startup
+        self._mark_empty()
+
+    def _map(self, buffer: Union[bytearray, memoryview], num_slots: int) -> None:
+        """
+        Create one typed view per field over the buffer holding the table.
+        """
+        self._buffer = memoryview(buffer)
+        self._views: List[memoryview] = [self._buffer]
+        self._offsets = {}
+        offset = 0
+        for name, type_code in self.FIELDS:
+            size = num_slots * struct.calcsize(type_code)
+            view = self._buffer[offset : offset + size].cast(type_code)
+            setattr(self, name, view)
+            self._views.append(view)
+            self._offsets[name] = offset
+            offset += size
+        self.num_slots = num_slots
+
+    def clear(self) -> None:
+        """
+        Remove all entries, e.g. when a new game starts.
+        """
+        self._buffer[:] = bytes(len(self._buffer))
+        self._mark_empty()
+
+    def _mark_empty(self) -> None:
+        # a depth of -1 marks an empty slot
+        offset = self._offsets["depths"]
+        self._buffer[offset : offset + self.num_slots] = b"\xff" * self.num_slots
+        self.generation = 0
+
+    def _release(self) -> None:
+        """
+        Release the views over the buffer, most recent first, so the buffer can be freed.
+        """
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+
+    def new_search(self) -> None:
+        """
+        Age the table so that depth-preferred entries from previous searches can be replaced.
+        """
+        self.generation = (self.generation + 1) & 0xFF
+
+    def hashfull(self) -> int:
+        """
+        How full the table is in permille, as reported by the uci "info hashfull".
+        Estimated from the first 1000 slots, counting only entries written by the current search.
+        """
+        sample = min(1000, self.num_slots)
+        generation = self.generation
+        used = sum(
+            1 for i in range(sample) if self.depths[i] >= 0 and self.generations[i] == generation
+        )
+        return used * 1000 // sample
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        """
+        Look up a position by its Zobrist key. Returns None if it is not stored.
+        """
+        slot = (key & self._mask) * self.SLOTS_PER_BUCKET
+        for i in (slot, slot + 1):
+            if self.keys[i] == key and self.depths[i] >= 0:
+                return TTEntry(
+                    self.depths[i], self.scores[i], Bound(self.bounds[i]), decode_move(self.moves[i])
+                )
+        return None
+
+    def store(
+        self,
+        key: int,
+        depth: int,
+        score: int,
+        bound: Bound,
+        move: Optional[chess.Move],
+    ) -> None:
+        """
+        Store the result of searching a position, using the depth-preferred/always-replace scheme.
+        """
+        slot = (key & self._mask) * self.SLOTS_PER_BUCKET
+        if (
+            self.keys[slot] == key
+            or depth >= self.depths[slot]
+            or self.generations[slot] != self.generation
+        ):
+            i = slot
+        else:
+            i = slot + 1
+        # keep the previous best move if we are overwriting the same position without one
+        if move is None and self.keys[i] == key:
+            encoded_move = self.moves[i]
+        else:
+            encoded_move = encode_move(move)
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.scores[i] = score
+        self.bounds[i] = bound
+        self.moves[i] = encoded_move
+        self.generations[i] = self.generation
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    Transposition table held in multiprocessing shared memory, so that several search processes
+    can read and write the same entries (lazy SMP).
+
+    Writing an entry touches several fields, so buckets are guarded by a fixed number of
+    striped locks: a lock covers every TT_LOCK_STRIPES-th bucket.
+    The generation counter is kept in a header byte after the entries, so it is shared as well.
+
+    The table is passed to worker processes as a multiprocessing.Process argument. The creating
+    process owns the shared memory: only it may resize the table, and it frees the memory on exit.
+    """
+
+    def __init__(self, size_mb: int, context: Optional[BaseContext] = None):
+        self._shared_memory: Optional[SharedMemory] = None
+        self._owner_pid = os.getpid()
+        # the locks must come from the same multiprocessing context as the worker processes
+        context = context or multiprocessing.get_context()
+        self._locks = [context.Lock() for _ in range(TT_LOCK_STRIPES)]
+        super().__init__(size_mb)
+        atexit.register(self.close)
+
+    def _allocate(self, num_slots: int) -> None:
+        self.close()
+        self._shared_memory = SharedMemory(create=True, size=num_slots * self.SLOT_SIZE_BYTES + 1)
+        self._map(self._shared_memory.buf, num_slots)
+        self.clear()
+
+    def _map(self, buffer: Union[bytearray, memoryview], num_slots: int) -> None:
+        super()._map(buffer, num_slots)
+        header_offset = num_slots * self.SLOT_SIZE_BYTES
+        self.header = self._buffer[header_offset : header_offset + 1]
+        self._views.append(self.header)
+
+    @property
+    def is_owner(self) -> bool:
+        return os.getpid() == self._owner_pid
+
+    def close(self) -> None:
+        """
+        Unmap the shared memory from this process, and free it if this process created it.
+        """
+        if self._shared_memory is None:
+            return
+        self._release()
+        self._shared_memory.close()
+        if self.is_owner:
+            self._shared_memory.unlink()
+        self._shared_memory = None
+
+    def __getstate__(self):
+        # sent to spawned worker processes: they attach to the same shared memory and locks
+        return {
+            "name": self._shared_memory.name,
+            "num_slots": self.num_slots,
+            "num_buckets": self.num_buckets,
+            "size_mb": self.size_mb,
+            "locks": self._locks,
+            "owner_pid": self._owner_pid,
+        }
+
+    def __setstate__(self, state) -> None:
+        self.num_buckets = state["num_buckets"]
+        self._mask = self.num_buckets - 1
+        self.size_mb = state["size_mb"]
+        self._locks = state["locks"]
+        self._owner_pid = state["owner_pid"]
+        self._shared_memory = SharedMemory(name=state["name"])
+        self._map(self._shared_memory.buf, state["num_slots"])
+
+    def resize(self, size_mb: int) -> None:
+        if not self.is_owner:
+            raise RuntimeError("Only the process which created a shared transposition table can resize it")
+        super().resize(size_mb)
+
+    def new_search(self) -> None:
+        # worker processes all search on behalf of the same search started by the owner
+        if self.is_owner:
+            super().new_search()
+
+    @property
+    def generation(self) -> int:
+        return self.header[0]
+
+    @generation.setter
+    def generation(self, value: int) -> None:
+        self.header[0] = value
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        with self._locks[(key & self._mask) % TT_LOCK_STRIPES]:
+            return super().probe(key)
+
+    def store(
+        self,
+        key: int,
+        depth: int,
+        score: int,
+        bound: Bound,
+        move: Optional[chess.Move],
+    ) -> None:
+        with self._locks[(key & self._mask) % TT_LOCK_STRIPES]:
+            super().store(key, depth, score, bound, move)
+
+
+def encode_move(move: Optional[chess.Move]) -> int:
+    """
+    Pack a move into 15 bits: from square, to square and promotion piece type. 0 means no move.
+    """
+    if not move:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(encoded_move: int) -> Optional[chess.Move]:
+    """
+    Inverse of encode_move.
+    """
+    if not encoded_move:
+        return None
+    return chess.Move(
+        encoded_move & 0x3F, (encoded_move >> 6) & 0x3F, (encoded_move >> 12) or None
+    )
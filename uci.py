@@ -1,15 +1,64 @@
+from __future__ import annotations
+import importlib.util
 import sys
-import chess
-from typing import List
-from search import next_move
-from config import DEFAULT_DEPTH
+import threading
+from contextlib import nullcontext
+from types import ModuleType
+from typing import TYPE_CHECKING, List, Optional
+from config import (DEFAULT_DEPTH, MAX_DEPTH, MATE_EVAL, TT_SIZE_MB, THREADS, BENCH_DEPTH, UCI_INFO_INTERVAL,
+                    OWN_BOOK, BOOK_FILE, SYZYGY_PATH, SYZYGY_PROBE_LIMIT, ROOT_SPLIT, QUIESCENCE_SEARCH,
+                    NULL_MOVE_PRUNING, NULL_MOVE_REDUCTION, LATE_MOVE_REDUCTIONS, LMR_FULL_DEPTH_MOVES,
+                    FUTILITY_PRUNING, FUTILITY_MARGIN)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Import a module which is only loaded when one of its attributes is first used.
+    Raises ImportError if the module cannot be found.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# The engine is loaded by the first command which needs it, so "uci" and "isready" are answered
+# at once: loading it imports python-chess, compiles the piece square tables and allocates the
+# transposition table. The bench, perft and profiling modules are imported by the commands using them.
+if TYPE_CHECKING:
+    import chess
+    import search
+    import time_manager
+else:
+    chess = lazy_import("chess")
+    search = lazy_import("search")
+    time_manager = lazy_import("time_manager")
+
+# The search started by the last "go" command. The main loop keeps reading commands while it runs.
+# The transposition table, pawn hash table and history are kept between searches and across
+# "position" commands, and only cleared by "ucinewgame".
+searcher: Optional["SearchThread"] = None
+# serializes the lines written by the main loop and the search thread
+output_lock = threading.Lock()
+# set with the Instrument option: searches collect detailed counters, sent as an "info string" after each search
+instrument_search = False
 
 def main():
 
-    board = chess.Board()
+    board = None
 
     while True:
-        command = input()
+        try:
+            command = input()
+        except EOFError:
+            command = "quit"
         command = command.strip()
 
         if command == 'uci':
@@ -19,19 +68,60 @@ def main():
             pass
 
         elif command == 'isready':
-            print('readyok')
+            send('readyok')
         
         elif command == 'quit':
+            stop()
             sys.exit()
 
+        elif command == 'stop':
+            stop()
+
+        elif command == 'ponderhit':
+            ponderhit()
+
         elif command == 'ucinewgame':
-            pass
+            stop()
+            load_engine()
+            search.transposition_table.clear()
+            search.killers.clear()
+            search.history.clear()
+
+        elif command.startswith("setoption"):
+            stop()
+            load_engine()
+            setoption(command)
 
         elif command.startswith("position"):
+            stop()
+            if board is None:
+                board = load_engine()
             position(command, board)
 
         elif command.startswith("go"):
-            go(board)
+            if board is None:
+                board = load_engine()
+            go(command, board)
+
+        elif command.startswith("bench"):
+            stop()
+            load_engine()
+            bench(command)
+
+def load_engine() -> chess.Board:
+    """
+    Load the engine modules, from the main thread before a search thread uses them,
+    and return a board in the starting position.
+    """
+    search.options
+    return chess.Board()
+
+def send(line: str):
+    """
+    Write a line to the GUI. Lines are flushed at once, as the GUI waits for them.
+    """
+    with output_lock:
+        print(line, flush=True)
 
 def uci():
     """
@@ -39,8 +129,71 @@ def uci():
     """
     print("id name Quark")
     print("id author Jesse Wang")
+    print("option name Ponder type check default false")
+    print(f"option name OwnBook type check default {str(OWN_BOOK).lower()}")
+    print(f"option name BookFile type string default {BOOK_FILE or '<empty>'}")
+    print(f"option name SyzygyPath type string default {SYZYGY_PATH or '<empty>'}")
+    print(f"option name SyzygyProbeLimit type spin default {SYZYGY_PROBE_LIMIT} min 0 max 7")
+    print(f"option name Hash type spin default {TT_SIZE_MB} min 1 max 4096")
+    print(f"option name Threads type spin default {THREADS} min 1 max 256")
+    print(f"option name RootSplit type check default {str(ROOT_SPLIT).lower()}")
+    print(f"option name Quiescence type check default {str(QUIESCENCE_SEARCH).lower()}")
+    print(f"option name NullMove type check default {str(NULL_MOVE_PRUNING).lower()}")
+    print(f"option name NullMoveReduction type spin default {NULL_MOVE_REDUCTION} min 1 max 4")
+    print(f"option name LateMoveReductions type check default {str(LATE_MOVE_REDUCTIONS).lower()}")
+    print(f"option name LMRFullDepthMoves type spin default {LMR_FULL_DEPTH_MOVES} min 1 max 64")
+    print(f"option name Futility type check default {str(FUTILITY_PRUNING).lower()}")
+    print(f"option name FutilityMargin type spin default {FUTILITY_MARGIN} min 0 max 1000")
+    print("option name Instrument type check default false")
     print("uciok")
 
+def setoption(command: str):
+    """
+    Respond to the uci command "setoption":
+
+    setoption name <id> [value <x>]
+    """
+    global instrument_search
+    words: List[str] = command.split(" ")
+    if "name" not in words or "value" not in words:
+        return
+    name = " ".join(words[words.index("name") + 1 : words.index("value")])
+    value = " ".join(words[words.index("value") + 1 :])
+
+    try:
+        if name.lower() == "ownbook":
+            search.options.own_book = value.lower() == "true"
+        elif name.lower() == "bookfile":
+            search.options.book_file = value if value and value != "<empty>" else None
+        elif name.lower() == "syzygypath":
+            search.options.syzygy_path = value if value and value != "<empty>" else None
+        elif name.lower() == "syzygyprobelimit":
+            search.options.syzygy_probe_limit = max(0, int(value))
+        elif name.lower() == "hash":
+            search.transposition_table.resize(int(value))
+        elif name.lower() == "threads":
+            search.options.threads = max(1, int(value))
+        elif name.lower() == "rootsplit":
+            search.options.root_split = value.lower() == "true"
+        elif name.lower() == "quiescence":
+            search.options.quiescence = value.lower() == "true"
+        elif name.lower() == "nullmove":
+            search.options.null_move = value.lower() == "true"
+        elif name.lower() == "nullmovereduction":
+            search.options.null_move_reduction = max(1, int(value))
+        elif name.lower() == "latemovereductions":
+            search.options.late_move_reductions = value.lower() == "true"
+        elif name.lower() == "lmrfulldepthmoves":
+            search.options.lmr_full_depth_moves = max(1, int(value))
+        elif name.lower() == "futility":
+            search.options.futility = value.lower() == "true"
+        elif name.lower() == "futilitymargin":
+            search.options.futility_margin = max(0, int(value))
+        elif name.lower() == "instrument":
+            instrument_search = value.lower() == "true"
+    except ValueError:
+        send(f"info string invalid value {value} for option {name}")
+
 def position(command: str, board: chess.Board):
     """
     Response to the uci command "position":
@@ -69,13 +222,175 @@ def position(command: str, board: chess.Board):
             for move in moves:
                 board.push_uci(move)
 
-def go(board: chess.Board):
+def go(command: str, board: chess.Board):
     """
     Respond to the uci command "go"
-    Given the board, return the best move
+    Start searching the board in the background; the best move is sent when the search ends.
+
+    go [wtime <x>] [btime <x>] [winc <x>] [binc <x>] [movestogo <x>] [movetime <x>] [depth <x>] [nodes <x>]
+       [infinite] [ponder]
+    Without time arguments, the search runs to the given depth, or DEFAULT_DEPTH.
+    With infinite or ponder, the search runs until "stop", or with ponder until "ponderhit"
+    after which the time arguments apply.
+
+    go perft <depth> counts the leaf nodes of the move tree instead, split across Threads processes.
+    """
+    global searcher
+    stop()
+    words: List[str] = command.split()
+    if len(words) > 2 and words[1] == "perft":
+        from perft import run_perft, format_divide
+
+        result = run_perft(board.fen(), int(words[2]), workers=search.options.threads)
+        send(format_divide(result))
+        send(f"Nodes/second: {result.nps}")
+        return
+    limits = parse_go(command)
+    if limits.depth:
+        depth = limits.depth
+    elif limits.is_timed or limits.infinite or limits.ponder or limits.nodes:
+        depth = MAX_DEPTH
+    else:
+        depth = DEFAULT_DEPTH
+    searcher = SearchThread(board, depth, limits)
+    searcher.start()
+
+def stop():
+    """
+    Respond to the uci command "stop": end the running search, if any, and wait for its best move.
+    """
+    if searcher is not None:
+        searcher.stop()
+        searcher.join()
+
+def ponderhit():
+    """
+    Respond to the uci command "ponderhit": the opponent played the expected move,
+    so the ponder search goes on as a normal search on the clock.
+    """
+    if searcher is not None:
+        searcher.ponderhit()
+
+class SearchThread(threading.Thread):
+    """
+    Runs the search for a "go" command, sending "info" lines as it goes and "bestmove" when done.
+    A search in infinite or ponder mode sends its best move only once it is stopped or the ponder move is played,
+    even if it ends earlier.
+    """
+
+    def __init__(self, board: chess.Board, depth: int, limits: time_manager.SearchLimits):
+        super().__init__(daemon=True)
+        self.board = board.copy()
+        self.depth = depth
+        self.limits = limits
+        self.stop_event = threading.Event()
+        # set once the best move may be sent
+        self.release = threading.Event()
+        if not (limits.infinite or limits.ponder):
+            self.release.set()
+        self.done = threading.Event()
+        # result of the last completed iteration
+        self.last_iteration: Optional[search.SearchResult] = None
+
+    def run(self):
+        search.time_manager.stop_event = self.stop_event
+        if not any(self.board.generate_legal_moves()):
+            self.done.set()
+            self.release.wait()
+            send("bestmove 0000")
+            return
+        reporter = threading.Thread(target=self.report_progress, daemon=True)
+        reporter.start()
+        # if the search fails, the best move of the last completed iteration is sent, or a null move
+        result = None
+        try:
+            context = nullcontext()
+            if instrument_search:
+                from profiling import instrument, format_counters
+
+                context = instrument()
+            with context as counters:
+                result = search.run_search(self.board, self.depth, self.limits, on_iteration=self.send_info)
+        finally:
+            self.done.set()
+            search.time_manager.stop_event = None
+            if counters:
+                send(f"info string {format_counters(counters, search.stats)}")
+            self.release.wait()
+            result = result or self.last_iteration
+            if result is None:
+                send("bestmove 0000")
+            elif result.pv[1:]:
+                send(f"bestmove {result.move} ponder {result.pv[1]}")
+            else:
+                send(f"bestmove {result.move}")
+
+    def stop(self):
+        self.stop_event.set()
+        self.release.set()
+
+    def ponderhit(self):
+        self.limits.ponder = False
+        search.time_manager.ponderhit()
+        self.release.set()
+
+    def send_info(self, result: search.SearchResult):
+        self.last_iteration = result
+        send(format_info(result, search.transposition_table.hashfull()))
+
+    def report_progress(self):
+        """
+        Send the node count every UCI_INFO_INTERVAL seconds, as iterations get long.
+        """
+        while not self.done.wait(UCI_INFO_INTERVAL):
+            elapsed = search.time_manager.elapsed()
+            nodes = search.stats.nodes
+            send(
+                f"info nodes {nodes} nps {int(nodes / elapsed) if elapsed else 0} time {int(elapsed * 1000)} "
+                f"hashfull {search.transposition_table.hashfull()}"
+            )
+
+def format_info(result: search.SearchResult, hashfull: int) -> str:
+    """
+    The uci "info" line for a completed iteration
+    """
+    if abs(result.score) > search.MATE_THRESHOLD:
+        # mate in moves rather than plies, negative when being mated
+        moves = (MATE_EVAL - abs(result.score) + 1) // 2
+        score = f"mate {moves if result.score > 0 else -moves}"
+    else:
+        score = f"cp {result.score}"
+    nps = int(result.nodes / result.time) if result.time else 0
+    pv = " ".join(move.uci() for move in result.pv or [result.move])
+    return (
+        f"info depth {result.depth} score {score} nodes {result.nodes} nps {nps} "
+        f"time {int(result.time * 1000)} hashfull {hashfull} pv {pv}"
+    )
+
+def bench(command: str):
+    """
+    Respond to the (non-standard) command "bench [depth]" by running the search benchmark
+    """
+    words: List[str] = command.split()
+    from bench import run_bench, format_bench
+
+    depth = int(words[1]) if len(words) > 1 else BENCH_DEPTH
+    send(format_bench(run_bench(depth)))
+
+def parse_go(command: str) -> time_manager.SearchLimits:
+    """
+    Read the search limits from the arguments of the uci command "go"
+    Unknown arguments are ignored.
     """
-    best_move = next_move(board, DEFAULT_DEPTH)
-    print(f"bestmove {best_move}")
+    words: List[str] = command.split()
+    limits = time_manager.SearchLimits(infinite="infinite" in words, ponder="ponder" in words)
+    for name, value in zip(words[1:], words[2:]):
+        if name in ("depth", "nodes", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+            try:
+                setattr(limits, name, int(value))
+            except ValueError:
+                pass
+    return limits
 
 if __name__ == "__main__":
     main()
\ No newline at end of file